@@ -11,6 +11,38 @@ export interface Message {
     sources?: Source[];
 }
 
+interface Job {
+    status: string;
+    result?: { audio_url?: string; suggested_questions?: string[] };
+    error?: string;
+}
+
+// Follows a server job's NDJSON event stream until it completes or fails
+async function followJob(jobId: string): Promise<Job> {
+    const events = await fetch(`/api/jobs/${jobId}/events`);
+    if (!events.body) throw new Error('No response body');
+
+    const reader = events.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let job: Job = { status: 'queued' };
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop() || '';
+
+        for (const line of lines) {
+            if (!line.trim()) continue;
+            job = JSON.parse(line);
+        }
+    }
+    return job;
+}
+
 export function useChat() {
     const [messages, setMessages] = useState<Message[]>([]);
     const [isStreaming, setIsStreaming] = useState(false);
@@ -45,6 +77,20 @@ export function useChat() {
         }
     };
 
+    // Suggested questions come from a job of their own, so uploads don't
+    // wait on the LLM
+    const loadSuggestedQuestions = async (jobId?: string | null) => {
+        if (!jobId) return;
+        try {
+            const job = await followJob(jobId);
+            if (job.status === 'completed' && job.result?.suggested_questions) {
+                setSuggestedQuestions(job.result.suggested_questions);
+            }
+        } catch (error) {
+            console.error('Failed to load suggested questions:', error);
+        }
+    };
+
     const uploadFile = async (file: File) => {
         const formData = new FormData();
         formData.append('files', file);
@@ -63,9 +109,7 @@ export function useChat() {
             const url = URL.createObjectURL(file);
             setCurrentPdfUrl(url);
 
-            if (data.suggested_questions) {
-                setSuggestedQuestions(data.suggested_questions);
-            }
+            loadSuggestedQuestions(data.questions_job_id);
 
             return true;
         } catch (error) {
@@ -88,9 +132,7 @@ export function useChat() {
 
             setCurrentPdfUrl(url);
 
-            if (data.suggested_questions) {
-                setSuggestedQuestions(data.suggested_questions);
-            }
+            loadSuggestedQuestions(data.questions_job_id);
 
             return true;
         } catch (error) {
@@ -108,6 +150,16 @@ export function useChat() {
             const data = await response.json();
             if (data.audio_url) {
                 setAudioUrl(data.audio_url);
+                return;
+            }
+            if (!data.job_id) throw new Error('Audio generation failed');
+
+            // Rendered by a worker: follow the job's progress until it's done
+            const job = await followJob(data.job_id);
+            if (job.status === 'completed' && job.result?.audio_url) {
+                setAudioUrl(job.result.audio_url);
+            } else if (job.status === 'failed') {
+                throw new Error(job.error || 'Audio generation failed');
             }
         } catch (error) {
             console.error('Audio generation error:', error);
@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.endpoints import ingest, chat, utils, audio, models
+from app.api.endpoints import ingest, chat, utils, audio, models, documents, jobs
 from fastapi.staticfiles import StaticFiles
 
 api_router = APIRouter()
@@ -8,3 +8,5 @@ api_router.include_router(chat.router, tags=["chat"])
 api_router.include_router(utils.router, tags=["utils"])
 api_router.include_router(audio.router, tags=["audio"])
 api_router.include_router(models.router, tags=["models"])
+api_router.include_router(documents.router, tags=["documents"])
+api_router.include_router(jobs.router, tags=["jobs"])
@@ -1,64 +1,49 @@
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
-from langchain_ollama import ChatOllama
-from langchain_core.prompts import ChatPromptTemplate
-from app.services.vector_store import vector_store
-from app.core.config import settings
-from gtts import gTTS
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from app.services.audio_summary import AUDIO_DIR, cached_audio, stream_audio_summary
+from app.services.tts import get_tts_backend
+from app.services.document_registry import DEFAULT_TENANT, TENANT_PATTERN
+from app.services.jobs import job_queue
+from app.services.offload import offload
 import os
-import uuid
+from typing import List, Optional
 
 router = APIRouter()
 
 class AudioRequest(BaseModel):
     text: str = None # Optional: generate from specific text
-    # In a real app, we might pass a document ID or filter
+    tenant: str = Field(DEFAULT_TENANT, pattern=TENANT_PATTERN)
+    doc_ids: Optional[List[str]] = None  # Summarize only these documents
 
 @router.post("/audio-summary")
-async def generate_audio_summary():
+async def generate_audio_summary(request: Optional[AudioRequest] = None):
+    request = request or AudioRequest()
     try:
-        # 1. Retrieve context (or use a summary of the whole doc if we had it)
-        # For now, let's retrieve a broad summary based on a generic query
-        retriever = vector_store.as_retriever()
-        docs = retriever.invoke("Summarize the main concepts and key takeaways of this document.")
-        context = "\n\n".join([d.page_content for d in docs])
-        
-        # 2. Generate Script
-        llm = ChatOllama(
-            base_url=settings.OLLAMA_BASE_URL,
-            model=settings.CHAT_MODEL,
-            temperature=0.7
-        )
-        
-        prompt = ChatPromptTemplate.from_template(
-            """You are a podcast host. Create a short, engaging script (max 200 words) summarizing the following content for your listeners. 
-            Keep it conversational and fun.
-            
-            Content:
-            {context}
-            """
-        )
-        
-        chain = prompt | llm
-        response = await chain.ainvoke({"context": context})
-        script = response.content
-        
-        # 3. Generate Audio
-        # gTTS.save is blocking, so we run it in a threadpool to avoid blocking the async event loop
-        from starlette.concurrency import run_in_threadpool
-        
-        tts = gTTS(text=script, lang='en', slow=False)
-        
-        filename = f"summary_{uuid.uuid4()}.mp3"
-        filepath = os.path.join("static", filename)
-        os.makedirs("static", exist_ok=True)
-        
-        await run_in_threadpool(tts.save, filepath)
-        
-        # Return URL (assuming we serve static files)
-        # For now, let's just return the file directly or a path
-        return {"audio_url": f"/static/{filename}", "script": script}
-        
+        # Served straight away when these document versions were already
+        # rendered; otherwise a worker renders it and the client follows
+        # the job (/api/jobs/{job_id} or /api/jobs/{job_id}/events)
+        cached = await offload("store", cached_audio, request.tenant, request.doc_ids)
+        if cached is not None:
+            return {"status": "completed", **cached}
+
+        job_id = await offload("store", job_queue.enqueue, "render_audio", tenant=request.tenant, doc_ids=request.doc_ids)
+        return {"status": "queued", "job_id": job_id}
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/audio-summary/stream")
+async def stream_audio(request: Optional[AudioRequest] = None):
+    # Same summary as /audio-summary, but played while it is being made:
+    # audio is sent sentence by sentence as the script is generated
+    request = request or AudioRequest()
+    backend = get_tts_backend()
+    cached = await offload("store", cached_audio, request.tenant, request.doc_ids)
+    if cached is not None:
+        path = os.path.join(AUDIO_DIR, os.path.basename(cached["audio_url"]))
+        return FileResponse(path, media_type=backend.media_type)
+    return StreamingResponse(
+        stream_audio_summary(request.tenant, request.doc_ids),
+        media_type=backend.media_type
+    )
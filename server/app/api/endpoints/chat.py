@@ -1,24 +1,21 @@
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
-
-from langchain_ollama import ChatOllama
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-
-from langchain_classic.chains.history_aware_retriever import create_history_aware_retriever
-from langchain_classic.chains.retrieval import create_retrieval_chain
-from langchain_classic.chains.combine_documents import create_stuff_documents_chain
-
-from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_community.chat_message_histories import ChatMessageHistory
+from pydantic import BaseModel, Field
 
 from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, HumanMessage
 
-from app.services.vector_store import vector_store
+from app.services.vector_store import get_vector_store
+from app.services.document_registry import DEFAULT_TENANT, TENANT_PATTERN
+from app.services.model_registry import ModelUnavailable, model_registry
+from app.services.offload import offload
+from app.services.metrics import metrics, record_span, span
 from app.core.config import settings
 
 import asyncio
-from typing import AsyncIterable
+import json
+import time
+from typing import AsyncIterable, List, Optional
 
 
 router = APIRouter()
@@ -27,105 +24,159 @@ class ChatRequest(BaseModel):
     message: str
     session_id: str = "default_session"
     model: str = None  # Optional model selection
-
-# Simple in-memory history for now (replace with DB later)
-store = {}
+    # Retrieval scope: the tenant's documents, optionally only these ones
+    tenant: str = Field(DEFAULT_TENANT, pattern=TENANT_PATTERN)
+    doc_ids: Optional[List[str]] = None
 
 def get_session_history(session_id: str):
-    if session_id not in store:
-        store[session_id] = ChatMessageHistory()
-    return store[session_id]
+    from app.services.session_store import get_session_store
+    return get_session_store().get(session_id)
+
+def get_chat_chain(model_name: str):
+    # The first chat imports LangChain, opens the vector store and compiles
+    # the chain (unless the startup warm-up got there first): seconds of
+    # work that stay off the event loop
+    from app.services.chains import get_chain_factory
+    return get_chain_factory().get_chat_chain(model_name)
+
+def session_key(request: ChatRequest) -> str:
+    # Tenants can pick the same session IDs without sharing histories
+    if request.tenant == DEFAULT_TENANT:
+        return request.session_id
+    return f"{request.tenant}/{request.session_id}"
+
+async def replay_cached(entry) -> AsyncIterable[str]:
+    # Same NDJSON shape as a live answer: tokens first, then sources
+    yield json.dumps({"token": entry["answer"]}) + "\n"
+    if entry["sources"]:
+        yield json.dumps({"sources": entry["sources"]}) + "\n"
 
 @router.post("/chat")
 async def chat(request: ChatRequest):
-    retriever = vector_store.as_retriever()
-    
+    started = time.perf_counter()
     # Use selected model or default from settings
     model_name = request.model or settings.CHAT_MODEL
-
-    llm = ChatOllama(
-        base_url=settings.OLLAMA_BASE_URL,
-        model=model_name,
-        temperature=0.7
-    )
-
-    # Contextualize question prompt
-    contextualize_q_system_prompt = """Given a chat history and the latest user question \
-    which might reference context in the chat history, formulate a standalone question \
-    which can be understood without the chat history. Do NOT answer the question, \
-    just reformulate it if needed and otherwise return it as is."""
-    
-    contextualize_q_prompt = ChatPromptTemplate.from_messages([
-        ("system", contextualize_q_system_prompt),
-        MessagesPlaceholder("chat_history"),
-        ("human", "{input}"),
-    ])
-    
-    history_aware_retriever = create_history_aware_retriever(
-        llm, retriever, contextualize_q_prompt
-    )
-
-    # Answer question prompt
-    qa_system_prompt = """You are an assistant for question-answering tasks. \
-    Use the following pieces of retrieved context to answer the question. \
-    If you don't know the answer, just say that you don't know. \
-    Use three sentences maximum and keep the answer concise. \
-    \
-    {context}"""
-    
-    qa_prompt = ChatPromptTemplate.from_messages([
-        ("system", qa_system_prompt),
-        MessagesPlaceholder("chat_history"),
-        ("human", "{input}"),
-    ])
-    
-    question_answer_chain = create_stuff_documents_chain(llm, qa_prompt)
-    
-    rag_chain = create_retrieval_chain(history_aware_retriever, question_answer_chain)
-    
-    conversational_rag_chain = RunnableWithMessageHistory(
-        rag_chain,
-        get_session_history,
-        input_messages_key="input",
-        history_messages_key="chat_history",
-        output_messages_key="answer",
-    )
+    if model_name != settings.CHAT_MODEL:
+        # Checked against the cached tag list before anything is built, so
+        # a typo doesn't compile a chain or reach Ollama
+        try:
+            await model_registry.require_chat_model(model_name)
+        except ModelUnavailable:
+            raise HTTPException(status_code=400, detail=f"Model {model_name!r} is not available; see /api/models")
+        except Exception as e:
+            raise HTTPException(status_code=503, detail=f"Failed to fetch models: {str(e)}")
+    # Keeps the models of recent chats loaded in Ollama
+    model_registry.touch(model_name)
+    model_registry.touch(settings.EMBEDDING_MODEL, embedding=True)
+
+    conversational_rag_chain = await offload("store", get_chat_chain, model_name)
+    vector_store = await offload("store", get_vector_store)
+    session_id = session_key(request)
+    scope = (request.tenant, tuple(sorted(request.doc_ids)) if request.doc_ids is not None else None)
+
+    # Standalone questions (no history yet) can be answered from the
+    # semantic cache if someone asked the same thing of the same documents
+    answer_cache = vector_store.answer_cache
+    history = await offload("store", get_session_history, session_id)
+    question_embedding = None
+    if answer_cache is not None and not history.messages:
+        with span("chat.answer_cache"):
+            cache_version = await offload("store", vector_store.version)
+            question_embedding = await offload("io", answer_cache.embed, request.message)
+            cached = await offload("store", answer_cache.lookup, model_name, question_embedding, cache_version, scope)
+        if cached is not None:
+            # Persisting the turn writes SQLite; keep it off the event loop
+            await offload("store", history.add_messages, [
+                HumanMessage(content=request.message),
+                AIMessage(content=cached["answer"]),
+            ])
+            return StreamingResponse(replay_cached(cached), media_type="application/x-ndjson")
 
     async def generate_response() -> AsyncIterable[str]:
+        from app.services.chains import REWRITE_TAG
+
         sources = []
+        answer = []
+        # Stage timings come from the chain's own events: question rewrite,
+        # retrieval, stuffing the documents into the prompt (retrieval done
+        # until the answer model starts), time to first token, streaming rate
+        marks = {}
+        first_token = last_token = None
         # Use astream_events to capture retrieval and streaming output
         async for event in conversational_rag_chain.astream_events(
             {"input": request.message},
-            config={"configurable": {"session_id": request.session_id}},
+            config={"configurable": {
+                "session_id": session_id,
+                "tenant": request.tenant,
+                "doc_ids": request.doc_ids
+            }},
             version="v2"
         ):
             kind = event["event"]
-            
-            if kind == "on_retriever_end":
+            now = time.perf_counter()
+            rewriting = REWRITE_TAG in event.get("tags", [])
+
+            if kind == "on_chat_model_start" and rewriting:
+                marks["rewrite"] = now
+
+            elif kind == "on_chat_model_end" and rewriting:
+                record_span("chat.rewrite", now - marks.pop("rewrite", now))
+
+            elif kind == "on_chat_model_start":
+                if "retrieved" in marks:
+                    record_span("chat.stuff", now - marks.pop("retrieved"))
+
+            elif kind == "on_retriever_start":
+                marks["retrieve"] = now
+
+            elif kind == "on_retriever_end":
+                record_span("chat.retrieve", now - marks.pop("retrieve", now))
+                marks["retrieved"] = now
                 # Capture retrieved documents
                 # The output of the retriever is a list of Documents
-                if "output" in event and event["output"]:
+                output = event["data"].get("output")
+                if output:
                     sources.extend([
                         {
                             "source": doc.metadata.get("source", "unknown"),
                             "page": doc.metadata.get("page", 0)
                         }
-                        for doc in event["output"]
+                        for doc in output
                         if isinstance(doc, Document)
                     ])
             
             elif kind == "on_chat_model_stream":
+                # Question rewriting is internal, only stream the answer
+                if rewriting:
+                    continue
                 # Stream tokens
                 content = event["data"]["chunk"].content
                 if content:
-                    import json
+                    if first_token is None:
+                        first_token = now
+                        record_span("chat.ttft", now - started)
+                    last_token = now
+                    answer.append(content)
                     yield json.dumps({"token": content}) + "\n"
 
+        if first_token is not None:
+            metrics.inc("documind_chat_tokens_total", len(answer))
+            if last_token > first_token:
+                record_span("chat.generate", last_token - first_token)
+                metrics.observe("documind_chat_tokens_per_second", (len(answer) - 1) / (last_token - first_token))
+
+        # Deduplicate sources based on source and page
+        unique_sources = [dict(t) for t in {tuple(d.items()) for d in sources}]
+
         # Send sources at the end
-        if sources:
-            import json
-            # Deduplicate sources based on source and page
-            unique_sources = [dict(t) for t in {tuple(d.items()) for d in sources}]
+        if unique_sources:
             yield json.dumps({"sources": unique_sources}) + "\n"
 
+        # Only cache if the documents didn't change while we were answering
+        if question_embedding is not None and answer and vector_store.version() == cache_version:
+            answer_cache.store(
+                model_name, request.message, question_embedding, cache_version,
+                "".join(answer), unique_sources, scope
+            )
+
     return StreamingResponse(generate_response(), media_type="application/x-ndjson")
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, HTTPException, Query
+from app.services.document_registry import document_registry, DEFAULT_TENANT, TENANT_PATTERN
+from app.services.jobs import job_queue
+from app.services.offload import offload
+
+router = APIRouter()
+
+@router.get("/documents")
+async def list_documents(tenant: str = Query(DEFAULT_TENANT, pattern=TENANT_PATTERN)):
+    return {"documents": await offload("store", document_registry.list, tenant)}
+
+@router.delete("/documents/{doc_id}")
+async def delete_document(doc_id: str, tenant: str = Query(DEFAULT_TENANT, pattern=TENANT_PATTERN)):
+    # Removed by a job worker, the only process that writes the vectors
+    document = await offload("store", document_registry.get, doc_id)
+    if document is None or document["tenant"] != tenant:
+        raise HTTPException(status_code=404, detail="Document not found")
+    job_id = await offload("store", job_queue.enqueue, "remove_documents", doc_ids=[doc_id], tenant=tenant)
+    return {"message": "Document removal queued", "doc_id": doc_id, "job_id": job_id}
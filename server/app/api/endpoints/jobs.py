@@ -0,0 +1,39 @@
+import asyncio
+import json
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from app.core.config import settings
+from app.services.jobs import job_queue
+from app.services.offload import offload
+
+router = APIRouter()
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await offload("store", job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    # Streams the job as NDJSON, one line each time its status or progress
+    # changes, ending once it has completed or failed
+    job = await offload("store", job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        current, last = job, None
+        while True:
+            state = (current["status"], current["progress"])
+            if state != last:
+                last = state
+                yield json.dumps(current) + "\n"
+            if current["status"] in ("completed", "failed"):
+                return
+            await asyncio.sleep(settings.JOB_POLL_INTERVAL)
+            current = await offload("store", job_queue.get, job_id)
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
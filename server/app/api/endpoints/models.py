@@ -1,23 +1,17 @@
+import asyncio
+
 from fastapi import APIRouter, HTTPException
-import httpx
-from app.core.config import settings
+from app.services.model_registry import model_registry
 
 router = APIRouter()
 
 @router.get("/models")
 async def list_models():
+    # Served from the registry's cached tag list; embedding models are left
+    # out. "loaded" are the models Ollama has in memory, which answer
+    # without a load delay.
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{settings.OLLAMA_BASE_URL}/api/tags")
-            response.raise_for_status()
-            data = response.json()
-            
-            # Extract model names and filter out embedding models
-            models = [
-                model["name"] for model in data.get("models", [])
-                if "embed" not in model["name"] and "nomic" not in model["name"]
-            ]
-            return {"models": models}
-            
+        models, loaded = await asyncio.gather(model_registry.chat_models(), model_registry.loaded_models())
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch models: {str(e)}")
+    return {"models": models, "loaded": loaded}
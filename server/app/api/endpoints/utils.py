@@ -1,9 +1,56 @@
-from fastapi import APIRouter
-from app.services.vector_store import vector_store
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from typing import List, Optional
+from app.services.vector_store import get_vector_store
+from app.services.document_registry import DEFAULT_TENANT, TENANT_PATTERN
+from app.services.jobs import job_queue
+from app.services.offload import loop_monitor, offload
+from app.services.metrics import profiler
 
 router = APIRouter()
 
 @router.delete("/clear")
-async def clear_database():
-    vector_store.clear()
-    return {"message": "Vector database cleared"}
+async def clear_database(
+    tenant: str = Query(DEFAULT_TENANT, pattern=TENANT_PATTERN),
+    doc_ids: Optional[List[str]] = Query(None)
+):
+    # Only ever clears one tenant, or just the given documents of it. Runs
+    # as a job: vectors are only ever written by the job workers.
+    if doc_ids:
+        job_id = await offload("store", job_queue.enqueue, "remove_documents", doc_ids=doc_ids, tenant=tenant)
+        return {"message": "Document removal queued", "doc_ids": doc_ids, "job_id": job_id}
+    job_id = await offload("store", job_queue.enqueue, "clear_tenant", tenant=tenant)
+    return {"message": "Vector database clear queued", "tenant": tenant, "job_id": job_id}
+
+@router.get("/embedding-cache")
+async def embedding_cache_stats():
+    vector_store = await offload("store", get_vector_store)
+    return await offload("store", vector_store.embedding_cache_stats)
+
+@router.get("/retrieval-stats")
+async def retrieval_stats():
+    # Per-stage latencies (embed, dense, sparse, fusion, rerank) for tuning
+    # RERANK_CANDIDATES and the hybrid settings
+    vector_store = await offload("store", get_vector_store)
+    return vector_store.retrieval_stats()
+
+@router.get("/loop-lag")
+async def loop_lag_stats():
+    # How long the event loop is kept from running; stalls past
+    # LOOP_LAG_THRESHOLD_MS are logged with the stack that caused them
+    return loop_monitor.stats()
+
+@router.get("/profile")
+async def sampled_profile(reset: bool = False):
+    # Stacks sampled since startup (or the last reset) in collapsed form,
+    # for flamegraph.pl or speedscope. Needs PROFILER_ENABLED.
+    if not profiler.running:
+        raise HTTPException(status_code=404, detail="Profiler is disabled (PROFILER_ENABLED)")
+    return PlainTextResponse(profiler.collapsed(reset=reset))
+
+@router.get("/answer-cache")
+async def answer_cache_stats():
+    vector_store = await offload("store", get_vector_store)
+    if vector_store.answer_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **vector_store.answer_cache.stats()}
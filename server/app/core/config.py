@@ -7,11 +7,157 @@ class Settings(BaseSettings):
     
     # Vector DB
     CHROMA_PERSIST_DIRECTORY: str = "./chroma_db"
+    # Set to use a Chroma server instead of the local persistent store; needed
+    # when more than one ingestion worker process writes to the collection
+    CHROMA_SERVER_HOST: str = ""
+    CHROMA_SERVER_PORT: int = 8000
+    VECTOR_BACKEND: str = "chroma"  # chroma, mmap, or "module:Class"
+    # mmap backend: int8/float16 vectors in memory-mapped files, searched
+    # through an IVF index once a tenant has VECTOR_INDEX_MIN_ROWS chunks
+    VECTOR_INDEX_DIRECTORY: str = "./vector_index"
+    VECTOR_INDEX_DTYPE: str = "int8"  # int8, or float16: more exact, twice the size, slower
+    VECTOR_INDEX_NPROBE: int = 16  # IVF lists searched per query
+    VECTOR_INDEX_MIN_ROWS: int = 10000
     
     # LLM & Embeddings
     OLLAMA_BASE_URL: str = "http://localhost:11434"
     EMBEDDING_MODEL: str = "nomic-embed-text"
     CHAT_MODEL: str = "qwen3:0.6b"
+    # Model for rewriting follow-ups into standalone questions; empty = chat model
+    REWRITE_MODEL: str = ""
+    REWRITE_CACHE_SIZE: int = 1024
+    # Chat sessions
+    SESSION_MAX_SESSIONS: int = 1000
+    SESSION_TTL_SECONDS: int = 24 * 60 * 60
+    SESSION_HISTORY_TOKENS: int = 1500  # history budget per prompt
+    SESSION_STORE_PATH: str = ""  # SQLite file to persist sessions; empty = memory only
+    SESSION_SUMMARY_MODEL: str = ""  # empty = chat model
+
+    # Retrieval: dense results fused with a local BM25 index
+    RETRIEVAL_K: int = 4
+    # Document-scoped searches up to this many chunks scan them exactly
+    # instead of filtering the tenant's whole HNSW index
+    SCOPED_EXACT_SEARCH_MAX_CHUNKS: int = 1000
+    HYBRID_SEARCH_ENABLED: bool = True
+    HYBRID_CANDIDATES: int = 20  # results taken from each side before fusion
+    HYBRID_RRF_K: int = 60
+    HYBRID_DENSE_WEIGHT: float = 1.0
+    HYBRID_SPARSE_WEIGHT: float = 1.0
+    BM25_K1: float = 1.2
+    BM25_B: float = 0.75
+
+    # Reranking: score RERANK_CANDIDATES retrieved chunks with a cross-encoder
+    # and keep the best RETRIEVAL_K
+    RERANK_ENABLED: bool = False
+    RERANK_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"  # HF repo or local dir
+    RERANK_ONNX_FILE: str = "onnx/model.onnx"
+    RERANK_CANDIDATES: int = 20
+    RERANK_BATCH_SIZE: int = 8
+    RERANK_WORKERS: int = 2
+    RERANK_THREADS: int = 0  # onnxruntime threads per batch; 0 = its default
+    RERANK_MAX_LENGTH: int = 512
+    RERANK_CACHE_SIZE: int = 10000
+
+    # Document summaries, computed once per document version after ingestion
+    # and used by /audio-summary
+    SUMMARY_ENABLED: bool = True
+    SUMMARY_MODEL: str = ""  # empty = chat model
+    SUMMARY_GROUP_TOKENS: int = 3000  # chunk text per map call
+    SUMMARY_MAX_GROUPS: int = 32  # longer documents are sampled evenly
+    SUMMARY_CONCURRENCY: int = 4
+
+    # Audio summaries
+    TTS_BACKEND: str = "gtts"  # gtts (online), espeak (offline), or "module:Class"
+    TTS_LANGUAGE: str = "en"
+    TTS_VOICE: str = ""  # espeak voice; empty = TTS_LANGUAGE
+    TTS_ESPEAK_BINARY: str = "espeak-ng"
+    TTS_STREAM_CONCURRENCY: int = 4  # sentences synthesized at once when streaming
+    AUDIO_CACHE_MAX_MB: int = 500  # rendered files in static/
+    AUDIO_CACHE_MAX_AGE_HOURS: int = 7 * 24
+
+    # Semantic answer cache for repeated /chat questions
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_THRESHOLD: float = 0.95
+    ANSWER_CACHE_MAX_ENTRIES: int = 1000
+    OLLAMA_MAX_CONNECTIONS: int = 32
+    OLLAMA_MAX_KEEPALIVE_CONNECTIONS: int = 16
+
+    # Ollama models: the tag list is cached for /models and the /chat model
+    # check, and models used within MODEL_KEEP_WARM_SECONDS are pinged so
+    # Ollama doesn't unload them between requests
+    MODEL_CATALOG_TTL: int = 60
+    MODEL_KEEP_WARM_SECONDS: int = 30 * 60  # 0 = off
+    MODEL_KEEP_ALIVE_INTERVAL: int = 60  # seconds between checks
+    OLLAMA_KEEP_ALIVE: str = "5m"  # how long each ping keeps a model loaded
+
+    # Embedding requests
+    EMBED_BATCH_SIZE: int = 16
+    EMBED_CONCURRENCY: int = 4
+    EMBED_MAX_PENDING: int = 8
+
+    # Embedding cache
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_PATH: str = "./cache/embeddings.sqlite3"
+    EMBEDDING_CACHE_MAX_MB: int = 512
+
+    # Ingestion
+    INGEST_WORKERS: int = 0  # 0 = one process per CPU core
+    INGEST_PAGES_PER_TASK: int = 8
+    INGEST_BATCH_SIZE: int = 64
+
+    # PDF text extraction
+    EXTRACTION_CACHE_ENABLED: bool = True
+    EXTRACTION_CACHE_PATH: str = "./cache/extraction.sqlite3"
+    EXTRACTION_CACHE_MAX_MB: int = 1024
+    EXTRACTION_REMOVE_BOILERPLATE: bool = True  # repeated headers and footers
+    EXTRACTION_DETECT_TABLES: bool = True  # tables as Markdown
+
+    # Web ingestion: /ingest-url crawls same-site links up to a requested depth
+    CRAWL_MAX_DEPTH: int = 3  # deepest crawl a request may ask for
+    CRAWL_MAX_PAGES: int = 200
+    CRAWL_CONCURRENCY: int = 8
+    CRAWL_TIMEOUT: float = 20.0
+    CRAWL_MAX_BYTES: int = 5 * 1024 * 1024  # longer responses are cut here and never cached
+    CRAWL_USER_AGENT: str = "DocuMind/1.0"
+    CRAWL_CACHE_PATH: str = "./cache/web.sqlite3"
+    CRAWL_CACHE_MAX_MB: int = 256
+    # Responses younger than this are reused without asking the server
+    CRAWL_CACHE_FRESH_SECONDS: int = 300
+
+    # Chunking, measured in tokens of the embedding model
+    CHUNK_TOKENS: int = 256
+    CHUNK_OVERLAP_TOKENS: int = 48
+    # tokenizer.json path or Hugging Face repo of the embedding model's
+    # tokenizer (e.g. nomic-ai/nomic-embed-text-v1.5); empty = estimate
+    CHUNK_TOKENIZER: str = ""
+
+    # Ingestion jobs
+    JOBS_DB_PATH: str = "./cache/jobs.sqlite3"
+    JOB_WORKERS: int = 1  # 0 = run workers separately with `python -m app.worker`
+    JOB_POLL_INTERVAL: float = 0.5
+    JOB_LEASE_SECONDS: int = 60  # a running job is requeued once its worker stops renewing this
+
+    # Blocking work from async endpoints runs in a bounded pool per kind
+    OFFLOAD_STORE_WORKERS: int = 4  # Chroma and SQLite
+    OFFLOAD_IO_WORKERS: int = 4  # files and blocking network clients
+    OFFLOAD_CPU_PROCESSES: int = 1  # PDF and HTML parsing
+    # Log the blocking call's stack when the event loop stalls this long; 0 = off
+    LOOP_LAG_THRESHOLD_MS: int = 100
+
+    # Metrics and tracing: Prometheus histograms on /metrics, gathered from
+    # the API process and the job workers through one SQLite file
+    METRICS_ENABLED: bool = True
+    METRICS_DB_PATH: str = "./cache/metrics.sqlite3"
+    TRACE_SLOW_MS: int = 0  # log the spans of requests slower than this; 0 = off
+    # Sampling profiler of the API process, read from /api/profile
+    PROFILER_ENABLED: bool = False
+    PROFILER_INTERVAL_MS: int = 10
+
+    # LangChain, the vector store and the chat chain load on first use, so
+    # the API starts answering at once. The warm-up loads them in the
+    # background right after startup, and has Ollama load the chat and
+    # embedding models, so the first chat doesn't wait for any of it.
+    WARMUP_ENABLED: bool = True
 
     class Config:
         env_file = ".env"
@@ -1,10 +1,43 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from app.core.config import settings
+from app.services.jobs import WorkerPool
+from app.services.metrics import TracingMiddleware, metrics, profiler
+from app.services import crawler, offload, ollama_client, warmup
+from app.services.model_registry import model_registry
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Ingestion runs in separate worker processes so it can't slow down requests
+    pool = WorkerPool(settings.JOB_WORKERS)
+    pool.start()
+    if settings.LOOP_LAG_THRESHOLD_MS > 0:
+        offload.loop_monitor.start()
+    if settings.PROFILER_ENABLED:
+        profiler.start()
+    # Everything heavy loads on first use; warm it up without holding up startup
+    warmup_task = asyncio.create_task(warmup.warm_up()) if settings.WARMUP_ENABLED else None
+    if settings.MODEL_KEEP_WARM_SECONDS > 0:
+        model_registry.start()
+    yield
+    if warmup_task is not None:
+        warmup_task.cancel()
+    await model_registry.stop()
+    profiler.stop()
+    await offload.loop_monitor.stop()
+    pool.stop()
+    metrics.flush()
+    offload.shutdown()
+    await ollama_client.close()
+    await crawler.close()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
 # Set all CORS enabled origins
@@ -15,10 +48,18 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost, so request times include everything else
+app.add_middleware(TracingMiddleware)
 
 @app.get("/api/health")
 async def health_check():
-    return {"status": "ok", "service": "DocuMind API"}
+    return {"status": "ok", "service": "DocuMind API", "warmup": warmup.status}
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    # Span, request, event loop and job metrics of the API and the workers
+    text = await offload.offload("store", metrics.render)
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
 
 from fastapi.staticfiles import StaticFiles
 import os
@@ -0,0 +1,104 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    # Remembers answers to previous questions and serves them again when a
+    # new question embeds close enough to an old one. Entries belong to one
+    # document-set version (the registry version of the vector store): as
+    # soon as the collection changes through ingestion, a delete or /clear,
+    # the version moves on and every older entry is dropped. Answers are
+    # only shared between requests with the same model and retrieval scope;
+    # max_entries bounds them all together, whatever the number of scopes.
+
+    def __init__(self, service, max_entries: int, threshold: float):
+        self.service = service
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self._version = None
+        # (model, scope) -> (normalized question embeddings matrix, entries)
+        self._entries = {}
+        # Every entry's id -> its (model, scope), least recently used first
+        self._lru = OrderedDict()
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def embed(self, question: str) -> np.ndarray:
+        vector = np.asarray(self.service.embeddings.embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_version(self, version: int):
+        if version != self._version:
+            self._entries = {}
+            self._lru.clear()
+            self._version = version
+
+    def lookup(self, model: str, embedding: np.ndarray, version: int, scope: tuple = ()) -> Optional[dict]:
+        with self._lock:
+            self._check_version(version)
+            matrix, entries = self._entries.get((model, scope), (None, []))
+            if matrix is None or len(entries) == 0:
+                self.misses += 1
+                return None
+
+            scores = matrix @ embedding
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            entry = entries[best]
+            entry["last_used"] = time.time()
+            self._lru.move_to_end(entry["id"])
+            return entry
+
+    def store(self, model: str, question: str, embedding: np.ndarray, version: int,
+              answer: str, sources: List[dict], scope: tuple = ()):
+        with self._lock:
+            self._check_version(version)
+            key = (model, scope)
+            matrix, entries = self._entries.get(key, (None, []))
+            entry_id = next(self._ids)
+            entries = entries + [{
+                "id": entry_id,
+                "question": question,
+                "answer": answer,
+                "sources": sources,
+                "last_used": time.time(),
+            }]
+            rows = [embedding] if matrix is None else [matrix, embedding[None, :]]
+            self._entries[key] = (np.vstack(rows), entries)
+            self._lru[entry_id] = key
+
+            # Evict the least recently used entries, of any scope, once full
+            while len(self._lru) > self.max_entries:
+                self._evict(*self._lru.popitem(last=False))
+
+    def _evict(self, entry_id: int, key: tuple):
+        matrix, entries = self._entries[key]
+        index = next(i for i, entry in enumerate(entries) if entry["id"] == entry_id)
+        if len(entries) == 1:
+            del self._entries[key]
+            return
+        self._entries[key] = (np.delete(matrix, index, axis=0), entries[:index] + entries[index + 1:])
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._lru),
+                "version": self._version,
+                "threshold": self.threshold,
+            }
@@ -0,0 +1,273 @@
+import asyncio
+import hashlib
+import os
+import re
+import time
+import uuid
+from typing import AsyncIterator, List, Optional
+
+from app.core.config import settings
+from app.services.document_registry import document_registry, DEFAULT_TENANT
+from app.services.metrics import record_span, span
+from app.services.offload import offload
+from app.services.ollama_client import get_transport
+from app.services.summaries import stored_summaries
+from app.services.tts import get_tts_backend
+
+AUDIO_DIR = "static"
+
+# End of a sentence: terminal punctuation, optional closing quotes or
+# brackets, then whitespace
+SENTENCE_END_RE = re.compile(r"[.!?]+[\"')\]]*\s+")
+
+SCRIPT_PROMPT = """You are a podcast host. Create a short, engaging script (max 200 words) summarizing the following content for your listeners.
+    Keep it conversational and fun.
+
+    Content:
+    {context}
+    """
+
+
+def version_key(documents) -> str:
+    # Identifies the summarized content: every document at its current
+    # version, plus the model that writes the script
+    versions = sorted(f"{d['doc_id']}:{d['content_hash']}" for d in documents)
+    return hashlib.sha256("\n".join([settings.CHAT_MODEL, *versions]).encode("utf-8")).hexdigest()
+
+
+def summary_context(documents) -> str:
+    # Stored summaries share one script prompt, so each gets an equal part
+    # of the SUMMARY_GROUP_TOKENS budget (about four characters per token)
+    limit = settings.SUMMARY_GROUP_TOKENS * 4 // len(documents)
+    return "\n\n".join(f"{d['source']}:\n{d['summary'][:limit]}" for d in documents)
+
+
+def summarized_documents(tenant: str, doc_ids: Optional[List[str]]) -> List[dict]:
+    if doc_ids is not None:
+        documents = document_registry.scoped(tenant, doc_ids)
+    else:
+        documents = document_registry.list(tenant)
+    return stored_summaries(documents)
+
+
+def audio_filename(key: Optional[str], script: str, backend) -> str:
+    digest = hashlib.sha256(f"{key or ''}\0{backend.name}\0{script}".encode("utf-8")).hexdigest()[:32]
+    return f"summary_{digest}.{backend.extension}"
+
+
+def cached_audio(tenant: str = DEFAULT_TENANT, doc_ids: Optional[List[str]] = None) -> Optional[dict]:
+    # The already rendered summary for these documents at their current
+    # versions, if there is one; cheap enough for the request path
+    summarized = summarized_documents(tenant, doc_ids)
+    if not summarized:
+        return None
+    key = version_key(summarized)
+    script = document_registry.get_script(key)
+    if script is None:
+        return None
+    filename = audio_filename(key, script, get_tts_backend())
+    path = os.path.join(AUDIO_DIR, filename)
+    try:
+        # Touched so eviction treats it as recently used
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return {"audio_url": f"/static/{filename}", "script": script}
+
+
+_script_chain = None
+
+
+def script_chain():
+    # Built once: a new ChatOllama sets up its HTTP clients and TLS context,
+    # which is slow enough to stall the event loop when done per request.
+    # LangChain itself is only imported by the first audio summary.
+    global _script_chain
+    if _script_chain is None:
+        from langchain_core.prompts import ChatPromptTemplate
+        from langchain_ollama import ChatOllama
+
+        llm = ChatOllama(
+            base_url=settings.OLLAMA_BASE_URL,
+            model=settings.CHAT_MODEL,
+            temperature=0.7,
+            async_client_kwargs={"transport": get_transport()}
+        )
+        _script_chain = ChatPromptTemplate.from_template(SCRIPT_PROMPT) | llm
+    return _script_chain
+
+
+def generate_script(context: str) -> str:
+    with span("audio.llm"):
+        return script_chain().invoke({"context": context}).content
+
+
+async def script_context(tenant: str, doc_ids: Optional[List[str]]) -> str:
+    summarized = await offload("store", summarized_documents, tenant, doc_ids)
+    if summarized:
+        return summary_context(summarized)
+    from app.services.vector_store import get_vector_store
+    # The first call opens the store, which takes seconds
+    vector_store = await offload("store", get_vector_store)
+    retriever = vector_store.as_retriever(tenant=tenant, doc_ids=doc_ids)
+    docs = await retriever.ainvoke("Summarize the main concepts and key takeaways of this document.")
+    return "\n\n".join([d.page_content for d in docs])
+
+
+class SentenceSplitter:
+    # Turns a stream of LLM tokens into sentences. Fragments shorter than
+    # min_chars are joined with the next sentence, since every piece costs
+    # a TTS call and clipped one-word clips sound choppy.
+
+    def __init__(self, min_chars: int = 20):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, token: str) -> List[str]:
+        self._buffer += token
+        sentences, start = [], 0
+        for match in SENTENCE_END_RE.finditer(self._buffer):
+            if match.end() - start >= self.min_chars:
+                sentences.append(self._buffer[start:match.end()].strip())
+                start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> List[str]:
+        rest, self._buffer = self._buffer.strip(), ""
+        return [rest] if rest else []
+
+
+async def stream_audio_summary(tenant: str = DEFAULT_TENANT,
+                               doc_ids: Optional[List[str]] = None) -> AsyncIterator[bytes]:
+    # Yields encoded audio while the script is still being written: each
+    # sentence goes to TTS as soon as the LLM finishes it, up to
+    # TTS_STREAM_CONCURRENCY at once, and the audio comes out in order.
+    started = time.perf_counter()
+    backend = get_tts_backend()
+    chain = await offload("io", script_chain)
+    context = await script_context(tenant, doc_ids)
+
+    slots = asyncio.Semaphore(settings.TTS_STREAM_CONCURRENCY)
+    pending: asyncio.Queue = asyncio.Queue()
+
+    async def synthesize(sentence: str) -> bytes:
+        async with slots:
+            with span("audio.tts_sentence"):
+                return await offload("tts", backend.synthesize_bytes, sentence)
+
+    async def produce():
+        splitter = SentenceSplitter()
+        try:
+            with span("audio.llm"):
+                async for chunk in chain.astream({"context": context}):
+                    for sentence in splitter.feed(chunk.content):
+                        await pending.put(asyncio.ensure_future(synthesize(sentence)))
+            for sentence in splitter.flush():
+                await pending.put(asyncio.ensure_future(synthesize(sentence)))
+        finally:
+            await pending.put(None)
+
+    producer = asyncio.ensure_future(produce())
+    first = True
+    try:
+        while True:
+            task = await pending.get()
+            if task is None:
+                break
+            chunk = backend.stream_chunk(await task, first)
+            if first:
+                record_span("audio.first_audio", time.perf_counter() - started)
+            yield chunk
+            first = False
+        # Surface LLM errors; the stream ends early either way
+        await producer
+    finally:
+        # Client went away or something failed: stop generating
+        producer.cancel()
+        while not pending.empty():
+            task = pending.get_nowait()
+            if task is not None:
+                task.cancel()
+
+
+def render_audio_summary(tenant: str = DEFAULT_TENANT, doc_ids: Optional[List[str]] = None,
+                         progress=None) -> dict:
+    # Job handler behind /audio-summary. The script comes from the summaries
+    # stored at ingestion and is generated once per set of document versions;
+    # the audio file is named after those versions and the script, so it is
+    # only rendered once too.
+    progress = progress or (lambda **_: None)
+    backend = get_tts_backend()
+
+    progress(stage="script")
+    summarized = summarized_documents(tenant, doc_ids)
+    if summarized:
+        key = version_key(summarized)
+        script = document_registry.get_script(key)
+        if script is None:
+            script = generate_script(summary_context(summarized))
+            document_registry.save_script(key, tenant, script)
+    else:
+        # Summaries not computed yet (or disabled): fall back to retrieval
+        from app.services.vector_store import get_vector_store
+        key = None
+        retriever = get_vector_store().as_retriever(tenant=tenant, doc_ids=doc_ids)
+        docs = retriever.invoke("Summarize the main concepts and key takeaways of this document.")
+        script = generate_script("\n\n".join([d.page_content for d in docs]))
+
+    filename = audio_filename(key, script, backend)
+    path = os.path.join(AUDIO_DIR, filename)
+    os.makedirs(AUDIO_DIR, exist_ok=True)
+    if os.path.exists(path):
+        os.utime(path)
+    else:
+        progress(stage="speech", script_chars=len(script))
+        # Written under a temporary name so a request never serves a partial file
+        partial = f"{path}.{uuid.uuid4().hex}.part"
+        try:
+            with span("audio.tts"):
+                backend.synthesize(script, partial)
+            os.replace(partial, path)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+        evict_audio(AUDIO_DIR, settings.AUDIO_CACHE_MAX_MB * 1024 * 1024,
+                    settings.AUDIO_CACHE_MAX_AGE_HOURS * 3600, keep=path)
+
+    progress(stage="done")
+    return {"audio_url": f"/static/{filename}", "script": script}
+
+
+def evict_audio(directory: str, max_bytes: int, max_age: float, keep: Optional[str] = None) -> int:
+    # Removes summary audio not used for max_age seconds, then the least
+    # recently used files until the rest fit in max_bytes. Returns the
+    # number of files removed.
+    now = time.time()
+    files = []
+    for entry in os.scandir(directory):
+        if not entry.name.startswith("summary_") or not entry.is_file():
+            continue
+        stat = entry.stat()
+        # Leftovers of renders that died halfway; live ones are minutes old at most
+        if entry.name.endswith(".part"):
+            if now - stat.st_mtime > 3600:
+                files.append((0.0, 0, entry.path))
+            continue
+        files.append((stat.st_mtime, stat.st_size, entry.path))
+
+    files.sort()
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for mtime, size, path in files:
+        if path == keep:
+            continue
+        if now - mtime <= max_age and total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
@@ -0,0 +1,223 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from langchain_ollama import ChatOllama
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import ConfigurableField, RunnableBranch, RunnableLambda
+
+from langchain_classic.chains.retrieval import create_retrieval_chain
+from langchain_classic.chains.combine_documents import create_stuff_documents_chain
+
+from langchain_core.runnables.history import RunnableWithMessageHistory
+
+from app.services.vector_store import get_vector_store
+from app.services.session_store import get_session_history
+from app.services.ollama_client import get_transport
+from app.core.config import settings
+
+# Contextualize question prompt
+contextualize_q_system_prompt = """Given a chat history and the latest user question \
+which might reference context in the chat history, formulate a standalone question \
+which can be understood without the chat history. Do NOT answer the question, \
+just reformulate it if needed and otherwise return it as is."""
+
+contextualize_q_prompt = ChatPromptTemplate.from_messages([
+    ("system", contextualize_q_system_prompt),
+    MessagesPlaceholder("chat_history"),
+    ("human", "{input}"),
+])
+
+# Answer question prompt
+qa_system_prompt = """You are an assistant for question-answering tasks. \
+Use the following pieces of retrieved context to answer the question. \
+If you don't know the answer, just say that you don't know. \
+Use three sentences maximum and keep the answer concise. \
+\
+{context}"""
+
+qa_prompt = ChatPromptTemplate.from_messages([
+    ("system", qa_system_prompt),
+    MessagesPlaceholder("chat_history"),
+    ("human", "{input}"),
+])
+
+
+# Folds old turns into the running conversation summary
+summary_prompt = ChatPromptTemplate.from_messages([
+    ("system", """Summarize the conversation below in a few sentences, keeping \
+names, numbers and facts the user may refer back to. Extend the existing summary \
+if there is one.
+
+Existing summary: {summary}"""),
+    MessagesPlaceholder("messages"),
+    ("human", "Write the updated summary."),
+])
+
+# Runs tagged with this are internal (question rewriting) and their tokens
+# must not be streamed to the client as part of the answer
+REWRITE_TAG = "rewrite"
+
+
+def history_digest(messages) -> str:
+    payload = json.dumps([(m.type, m.content) for m in messages], default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RewriteCache:
+    # Small LRU of standalone questions keyed by (model, history, question)
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+
+class ChainFactory:
+    # Builds the conversational RAG chain once per model name and hands out
+    # the same compiled chain to every request. Chains are stateless: the
+    # session comes in through the run config, and the retriever looks up
+    # the vector store at query time, so sharing them is safe.
+
+    def __init__(
+        self,
+        get_session_history,
+        rewrite_model: str = None,
+        rewrite_fast_path: bool = True,
+        rewrite_cache_size: int = None
+    ):
+        self.get_session_history = get_session_history
+        self.rewrite_model = rewrite_model if rewrite_model is not None else settings.REWRITE_MODEL
+        self.rewrite_fast_path = rewrite_fast_path
+        self.rewrite_cache = RewriteCache(
+            rewrite_cache_size if rewrite_cache_size is not None else settings.REWRITE_CACHE_SIZE
+        )
+        self._llms = {}
+        self._chains = {}
+        self._lock = threading.RLock()
+
+    def get_llm(self, model_name: str, temperature: float = 0.7) -> ChatOllama:
+        key = (model_name, temperature)
+        llm = self._llms.get(key)
+        if llm is None:
+            with self._lock:
+                llm = self._llms.get(key)
+                if llm is None:
+                    llm = ChatOllama(
+                        base_url=settings.OLLAMA_BASE_URL,
+                        model=model_name,
+                        temperature=temperature,
+                        async_client_kwargs={"transport": get_transport()}
+                    )
+                    self._llms[key] = llm
+        return llm
+
+    def get_chat_chain(self, model_name: str) -> RunnableWithMessageHistory:
+        chain = self._chains.get(model_name)
+        if chain is None:
+            with self._lock:
+                chain = self._chains.get(model_name)
+                if chain is None:
+                    chain = self._build_chat_chain(model_name)
+                    self._chains[model_name] = chain
+        return chain
+
+    def summarize(self, summary: str, messages) -> str:
+        llm = self.get_llm(settings.SESSION_SUMMARY_MODEL or settings.CHAT_MODEL, temperature=0)
+        chain = summary_prompt | llm | StrOutputParser()
+        return chain.invoke({"summary": summary or "(none)", "messages": messages})
+
+    def _build_history_aware_retriever(self, model_name: str, retriever):
+        # Same contract as create_history_aware_retriever, but the rewrite
+        # can run on a smaller dedicated model and its output is cached, so
+        # the extra LLM round-trip is only paid once per (history, question)
+        rewrite_model = self.rewrite_model or model_name
+        rewrite_chain = (
+            contextualize_q_prompt
+            | self.get_llm(rewrite_model, temperature=0)
+            | StrOutputParser()
+        ).with_config(run_name="rewrite_question", tags=[REWRITE_TAG])
+
+        def cache_key(inputs):
+            return (rewrite_model, history_digest(inputs["chat_history"]), inputs["input"])
+
+        def rewrite(inputs):
+            key = cache_key(inputs)
+            question = self.rewrite_cache.get(key)
+            if question is None:
+                question = rewrite_chain.invoke(inputs)
+                self.rewrite_cache.put(key, question)
+            return question
+
+        async def arewrite(inputs):
+            key = cache_key(inputs)
+            question = self.rewrite_cache.get(key)
+            if question is None:
+                question = await rewrite_chain.ainvoke(inputs)
+                self.rewrite_cache.put(key, question)
+            return question
+
+        rewrite_and_retrieve = RunnableLambda(rewrite, afunc=arewrite) | retriever
+        if not self.rewrite_fast_path:
+            return rewrite_and_retrieve.with_config(run_name="chat_retriever_chain")
+
+        # With no history there is nothing to resolve, so skip the LLM call
+        return RunnableBranch(
+            (
+                lambda x: not x.get("chat_history"),
+                (lambda x: x["input"]) | retriever,
+            ),
+            rewrite_and_retrieve,
+        ).with_config(run_name="chat_retriever_chain")
+
+    def _build_chat_chain(self, model_name: str) -> RunnableWithMessageHistory:
+        llm = self.get_llm(model_name)
+        # The chain is shared by every request, so the retrieval scope comes
+        # in through the run config: {"configurable": {"tenant", "doc_ids"}}
+        retriever = get_vector_store().as_retriever().configurable_fields(
+            tenant=ConfigurableField(id="tenant"),
+            doc_ids=ConfigurableField(id="doc_ids")
+        )
+
+        history_aware_retriever = self._build_history_aware_retriever(model_name, retriever)
+        question_answer_chain = create_stuff_documents_chain(llm, qa_prompt)
+        rag_chain = create_retrieval_chain(history_aware_retriever, question_answer_chain)
+
+        return RunnableWithMessageHistory(
+            rag_chain,
+            self.get_session_history,
+            input_messages_key="input",
+            history_messages_key="chat_history",
+            output_messages_key="answer",
+        )
+
+
+_chain_factory = None
+_chain_factory_lock = threading.Lock()
+
+
+def get_chain_factory() -> ChainFactory:
+    # Compiled chains are cached per model and shared across requests
+    global _chain_factory
+    with _chain_factory_lock:
+        if _chain_factory is None:
+            _chain_factory = ChainFactory(get_session_history)
+    return _chain_factory
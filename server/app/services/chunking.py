@@ -0,0 +1,242 @@
+import re
+import time
+from bisect import bisect_left, bisect_right
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.core.config import settings
+from app.services.metrics import record_span
+from app.services.tokens import TokenCounter, get_token_counter
+
+PARAGRAPH_RE = re.compile(r"\n\s*\n")
+# Sentence ends: terminal punctuation, optional closing quotes/brackets,
+# whitespace, then something that can start a sentence
+SENTENCE_RE = re.compile(r"(?<=[.!?])[\"')\]]*\s+(?=[\"'(\[]?[A-Z0-9])")
+HEADING_RE = re.compile(
+    r"^(?:#{1,6}\s|\d+(?:\.\d+)*\.?\s+\S|(?:chapter|section|part|appendix|article)\s+[\w.]+)",
+    re.IGNORECASE,
+)
+TERMINAL = tuple(".!?:;\"')]”’")
+HEADING_NOT_END = tuple(".!?,;:")
+# A chunk is closed at a paragraph end instead of mid-paragraph if it still
+# holds at least this share of the token budget
+MIN_FILL = 0.5
+# Units packed per round; keeps memory flat for very long documents
+WINDOW_UNITS = 4096
+
+
+class Paragraph(NamedTuple):
+    text: str
+    page_start: Optional[int]
+    page_end: Optional[int]
+
+
+def is_heading(text: str) -> bool:
+    # Short single line without closing punctuation that is numbered,
+    # marked up, or written in capitals / title case
+    if len(text) > 100 or "\n" in text or text.endswith(HEADING_NOT_END):
+        return False
+    if HEADING_RE.match(text):
+        return True
+    words = text.split()
+    if not words or len(words) > 12:
+        return False
+    if text.isupper() and len(text) > 3:
+        return True
+    capitalized = sum(1 for word in words if word[:1].isupper() or not word[:1].isalpha())
+    return len(words) > 1 and capitalized / len(words) >= 0.75
+
+
+def _continues(previous: str, text: str) -> bool:
+    # The paragraph carries on from the previous page
+    return previous.endswith("-") or (not previous.endswith(TERMINAL) and text[:1].islower())
+
+
+def iter_paragraphs(pages: Iterable[Tuple[Optional[int], str]]) -> Iterator[Paragraph]:
+    # Paragraphs across all pages in order, with the page(s) each one is on.
+    # A paragraph cut by a page break is joined back into one.
+    carry = None
+    for page_num, text in pages:
+        paragraphs = [p.strip() for p in PARAGRAPH_RE.split(text) if p.strip()]
+        if not paragraphs:
+            continue
+        if carry is not None and _continues(carry.text, paragraphs[0]) and not is_heading(paragraphs[0]):
+            joined = carry.text[:-1] + paragraphs[0] if carry.text.endswith("-") else f"{carry.text} {paragraphs[0]}"
+            carry = Paragraph(joined, carry.page_start, page_num)
+            paragraphs = paragraphs[1:]
+            if not paragraphs:
+                continue
+        if carry is not None:
+            yield carry
+        for paragraph in paragraphs[:-1]:
+            yield Paragraph(paragraph, page_num, page_num)
+        carry = Paragraph(paragraphs[-1], page_num, page_num)
+    if carry is not None:
+        yield carry
+
+
+class TextChunker:
+    # Splits documents into chunks of at most `chunk_tokens` tokens, counted
+    # with the embedding model's tokenizer when one is configured. Chunks are
+    # built from sentences and end at paragraph boundaries where possible; a
+    # heading always starts a new chunk and is kept as its "section". Page
+    # breaks don't split paragraphs, and each chunk records the pages it spans.
+    #
+    # Boundaries are found by binary search over cumulative token counts, so
+    # the per-chunk work doesn't depend on how many sentences it holds.
+
+    def __init__(self, chunk_tokens: int = 256, overlap_tokens: int = 48,
+                 counter: Optional[TokenCounter] = None):
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = min(overlap_tokens, chunk_tokens // 2)
+        self.counter = counter or get_token_counter()
+
+    @staticmethod
+    def _units(paragraphs: Iterable[Paragraph]):
+        # (text, paragraph index, paragraph, is heading, ends paragraph) per
+        # sentence. Sentences keep their trailing whitespace, so a paragraph
+        # is put back together by concatenation, line breaks and all.
+        for index, paragraph in enumerate(paragraphs):
+            text = paragraph.text
+            if is_heading(text):
+                yield text, index, paragraph, True, True
+                continue
+            start = 0
+            for match in SENTENCE_RE.finditer(text):
+                yield text[start:match.end()], index, paragraph, False, False
+                start = match.end()
+            yield text[start:], index, paragraph, False, True
+
+    def _split_long(self, units: list, tokens: np.ndarray):
+        # Sentences longer than the whole budget are cut at word boundaries
+        for unit, count in zip(units, tokens):
+            if count <= self.chunk_tokens:
+                yield unit
+                continue
+            text, index, paragraph, heading, paragraph_end = unit
+            words = text.split()
+            step = max(1, int(self.chunk_tokens * len(words) / count * 0.9))
+            for start in range(0, len(words), step):
+                last = start + step >= len(words)
+                yield " ".join(words[start:start + step]) + " ", index, paragraph, heading, paragraph_end and last
+
+    def _next_start(self, cumulative: list, heading_positions: list, start: int, end: int) -> int:
+        # The next chunk repeats the trailing sentences that fit in
+        # overlap_tokens, but never reaches back past a heading
+        next_start = bisect_left(cumulative, cumulative[end] - self.overlap_tokens)
+        next_start = min(max(next_start, start + 1), end)
+        h = bisect_left(heading_positions, next_start)
+        if h < len(heading_positions) and heading_positions[h] <= end:
+            return end
+        return next_start
+
+    def _ranges(self, tokens: np.ndarray, headings: np.ndarray, paragraph_ends: np.ndarray,
+                final: bool) -> Tuple[List[Tuple[int, int]], int]:
+        # (start, end) unit ranges of each chunk, and where the next one
+        # starts. Unless `final`, a range that runs to the end of the units
+        # is left for the next round: more units may still join it.
+        # Scalar lookups go through bisect on plain lists, which is much
+        # cheaper per call than numpy's searchsorted
+        n = len(tokens)
+        cumulative = np.concatenate(([0], np.cumsum(tokens))).tolist()
+        heading_positions = np.flatnonzero(headings).tolist()
+        # Token offset of every paragraph end, for picking a closing point
+        paragraph_offsets = (np.flatnonzero(paragraph_ends) + 1).tolist()
+        min_fill = self.chunk_tokens * MIN_FILL
+        ranges = []
+        start = 0
+        while start < n:
+            end = bisect_right(cumulative, cumulative[start] + self.chunk_tokens) - 1
+            end = min(max(end, start + 1), n)
+            if end == n and not final:
+                break
+
+            h = bisect_right(heading_positions, start)
+            if h < len(heading_positions) and heading_positions[h] < end:
+                # A heading starts a new chunk
+                end = heading_positions[h]
+            elif end < n and not paragraph_ends[end - 1]:
+                # Close at the last paragraph end that still fills the chunk
+                p = bisect_right(paragraph_offsets, end) - 1
+                if p >= 0 and cumulative[paragraph_offsets[p]] - cumulative[start] >= min_fill:
+                    end = paragraph_offsets[p]
+            ranges.append((start, end))
+            if end >= n:
+                return ranges, n
+            start = self._next_start(cumulative, heading_positions, start, end)
+        return ranges, start
+
+    @staticmethod
+    def _chunk(units: list, start: int, end: int, section: Optional[str]):
+        parts, pages = [], []
+        for i in range(start, end):
+            text, index, paragraph, heading, _ = units[i]
+            if heading:
+                section = text
+            if parts and units[i - 1][1] == index:
+                parts[-1] += text
+            else:
+                parts.append(text)
+            pages.extend(page for page in (paragraph.page_start, paragraph.page_end) if page is not None)
+        text = "\n\n".join(part.strip() for part in parts)
+        return text, min(pages, default=None), max(pages, default=None), section
+
+    def split_pages(self, pages: Iterable[Tuple[Optional[int], str]]
+                    ) -> Iterator[Tuple[str, Optional[int], Optional[int], Optional[str]]]:
+        # (text, first page, last page, section) per chunk. Pages are
+        # (page_num, text) in order, with page_num None for unpaged text.
+        units, tokens = [], np.zeros(0, dtype=np.int64)
+        section = None
+        source = self._units(iter_paragraphs(pages))
+        while True:
+            batch = [unit for _, unit in zip(range(WINDOW_UNITS), source)]
+            # Timed from here: getting the batch includes extracting its pages
+            began = time.perf_counter()
+            final = not batch
+            counts = self.counter.count_many([unit[0] for unit in batch])
+            if (counts > self.chunk_tokens).any():
+                batch = list(self._split_long(batch, counts))
+                counts = self.counter.count_many([unit[0] for unit in batch])
+            units.extend(batch)
+            tokens = np.concatenate((tokens, counts))
+            if not units:
+                return
+
+            headings = np.fromiter((unit[3] for unit in units), dtype=bool, count=len(units))
+            paragraph_ends = np.fromiter((unit[4] for unit in units), dtype=bool, count=len(units))
+            ranges, next_start = self._ranges(tokens, headings, paragraph_ends, final)
+            chunks = []
+            for start, end in ranges:
+                chunk = self._chunk(units, start, end, section)
+                section = chunk[3]
+                if chunk[0]:
+                    chunks.append(chunk)
+            record_span("ingest.chunk", time.perf_counter() - began)
+            yield from chunks
+            if final:
+                return
+            # Only the units the next chunk starts from are kept
+            units, tokens = units[next_start:], tokens[next_start:]
+
+    def split_documents(self, pages: Iterable[Tuple[Optional[int], str]], metadata: dict) -> Iterator[Document]:
+        for text, page_start, page_end, section in self.split_pages(pages):
+            chunk_metadata = dict(metadata)
+            if page_start is not None:
+                # "page" is 1-based, like the citations shown to users
+                chunk_metadata["page"] = page_start + 1
+                chunk_metadata["page_end"] = page_end + 1
+            if section:
+                chunk_metadata["section"] = section
+            yield Document(page_content=text, metadata=chunk_metadata)
+
+
+_chunker = None
+
+
+def get_chunker() -> TextChunker:
+    global _chunker
+    if _chunker is None:
+        _chunker = TextChunker(settings.CHUNK_TOKENS, settings.CHUNK_OVERLAP_TOKENS)
+    return _chunker
@@ -0,0 +1,307 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import List, NamedTuple, Optional
+from urllib.parse import urldefrag, urljoin, urlparse
+
+import httpx
+
+from app.core.config import settings
+
+HEADING_TAGS = ("h1", "h2", "h3", "h4", "h5", "h6")
+BLOCK_TAGS = HEADING_TAGS + ("p", "li", "pre", "blockquote", "dt", "dd", "figcaption", "tr")
+SKIP_TAGS = ("script", "style", "noscript", "nav", "header", "footer", "aside", "form", "svg")
+# Links to these are never pages worth crawling
+SKIP_EXTENSIONS = (
+    ".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp", ".ico", ".css", ".js", ".json", ".xml",
+    ".zip", ".gz", ".tar", ".mp3", ".mp4", ".woff", ".woff2", ".ttf", ".pdf",
+)
+
+
+class Response(NamedTuple):
+    url: str
+    status: int
+    content_type: str
+    body: bytes
+    # "network" (downloaded), "truncated" (downloaded, but cut off at
+    # CRAWL_MAX_BYTES), "revalidated" (304 from the server) or "fresh"
+    # (cached recently enough that no request was made)
+    source: str
+
+
+class WebPage(NamedTuple):
+    url: str
+    title: str
+    text: str
+    depth: int
+
+
+class ResponseCache:
+    # HTTP responses on local disk, keyed by URL, with their validators
+    # (ETag, Last-Modified) so a repeat fetch is a conditional request that
+    # usually comes back 304 with no body. Shared by the API process and the
+    # ingestion workers. Least recently used entries are evicted past max_bytes.
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " url TEXT PRIMARY KEY,"
+            " status INTEGER NOT NULL,"
+            " content_type TEXT NOT NULL,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " body BLOB NOT NULL,"
+            " fetched_at REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+
+    def get(self, url: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM responses WHERE url = ?", (url,)).fetchone()
+            if row is not None:
+                self._conn.execute("UPDATE responses SET last_used = ? WHERE url = ?", (time.time(), url))
+        return dict(row) if row else None
+
+    def put(self, url: str, status: int, content_type: str, etag: Optional[str],
+            last_modified: Optional[str], body: bytes):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, status, content_type, etag, last_modified, body, now, now),
+            )
+            self._evict()
+
+    def touch(self, url: str):
+        # Revalidated by the server: fresh again from now
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE responses SET fetched_at = ?, last_used = ? WHERE url = ?", (now, now, url)
+            )
+
+    def _evict(self):
+        total, count = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(body)), 0), COUNT(*) FROM responses"
+        ).fetchone()
+        if total <= self.max_bytes or count == 0:
+            return
+        # Drop the oldest rows, plus a 10% margin so we don't evict on every put
+        average = total / count
+        to_remove = int((total - self.max_bytes * 0.9) / average) + 1
+        self._conn.execute(
+            "DELETE FROM responses WHERE url IN"
+            " (SELECT url FROM responses ORDER BY last_used LIMIT ?)",
+            (to_remove,),
+        )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+
+_cache = None
+_client = None
+
+
+def get_response_cache() -> ResponseCache:
+    global _cache
+    if _cache is None:
+        _cache = ResponseCache(settings.CRAWL_CACHE_PATH, settings.CRAWL_CACHE_MAX_MB * 1024 * 1024)
+    return _cache
+
+
+def new_web_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        follow_redirects=True,
+        timeout=httpx.Timeout(settings.CRAWL_TIMEOUT),
+        headers={"User-Agent": settings.CRAWL_USER_AGENT},
+        limits=httpx.Limits(
+            max_connections=settings.CRAWL_CONCURRENCY * 2,
+            max_keepalive_connections=settings.CRAWL_CONCURRENCY,
+        ),
+    )
+
+
+def get_web_client() -> httpx.AsyncClient:
+    # One connection pool for the API process's outbound web requests.
+    # Code running its own event loop (ingestion jobs) uses new_web_client.
+    global _client
+    if _client is None:
+        _client = new_web_client()
+    return _client
+
+
+async def close():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+    _client = None
+
+
+async def fetch(client: httpx.AsyncClient, url: str, cache: Optional[ResponseCache] = None) -> Response:
+    # GET through the response cache. Recently fetched URLs are served
+    # without a request; older ones are revalidated with If-None-Match /
+    # If-Modified-Since and only downloaded again when they changed.
+    cache = cache or get_response_cache()
+    cached = cache.get(url)
+    if cached is not None and time.time() - cached["fetched_at"] < settings.CRAWL_CACHE_FRESH_SECONDS:
+        return Response(url, cached["status"], cached["content_type"], cached["body"], "fresh")
+
+    headers = {}
+    if cached is not None:
+        if cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    async with client.stream("GET", url, headers=headers) as response:
+        if response.status_code == 304 and cached is not None:
+            cache.touch(url)
+            return Response(url, cached["status"], cached["content_type"], cached["body"], "revalidated")
+        response.raise_for_status()
+        body, truncated = await read_capped(response, settings.CRAWL_MAX_BYTES)
+
+    content_type = response.headers.get("content-type", "")
+    if truncated:
+        # Never cached: a later fetch must not take the cut body for the page
+        return Response(str(response.url), response.status_code, content_type, body, "truncated")
+    cache.put(
+        url,
+        response.status_code,
+        content_type,
+        response.headers.get("etag"),
+        response.headers.get("last-modified"),
+        body,
+    )
+    return Response(str(response.url), response.status_code, content_type, body, "network")
+
+
+async def read_capped(response: httpx.Response, max_bytes: int):
+    # (body, truncated): the streamed body, cut off at max_bytes rather than
+    # held in memory whole, however large the server says (or doesn't say)
+    # it is
+    body = bytearray()
+    async for block in response.aiter_bytes():
+        body += block
+        if len(body) > max_bytes:
+            return bytes(body[:max_bytes]), True
+    return bytes(body), False
+
+
+def html_to_page(url: str, html: bytes, depth: int = 0):
+    # (WebPage, links): readable text with one paragraph per block element
+    # and headings marked with "#", so the chunker sees the page structure
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.get_text(strip=True) if soup.title else url
+    links = [a["href"] for a in soup.find_all("a", href=True)]
+    for tag in soup.find_all(SKIP_TAGS):
+        tag.decompose()
+
+    root = soup.find("main") or soup.find("article") or soup.body or soup
+    blocks = []
+    for tag in root.find_all(BLOCK_TAGS):
+        # Innermost blocks only, so nested lists aren't repeated
+        if tag.find(BLOCK_TAGS):
+            continue
+        if tag.name == "pre":
+            text = tag.get_text().strip("\n")
+        else:
+            text = " ".join(tag.get_text(" ").split())
+        if not text:
+            continue
+        if tag.name in HEADING_TAGS:
+            text = "#" * int(tag.name[1]) + " " + text
+        elif tag.name == "li":
+            text = "- " + text
+        elif tag.name == "tr":
+            text = "| " + " | ".join(" ".join(cell.get_text(" ").split()) for cell in tag.find_all(["td", "th"])) + " |"
+        blocks.append(text)
+
+    text = "\n\n".join(blocks) if blocks else " ".join(root.get_text(" ").split())
+    return WebPage(url, title, text, depth), links
+
+
+def _in_scope(url: str, root: str) -> bool:
+    # Same site, and under the directory of the URL the crawl started from
+    parsed, start = urlparse(url), urlparse(root)
+    if parsed.scheme not in ("http", "https") or parsed.netloc != start.netloc:
+        return False
+    if parsed.path.lower().endswith(SKIP_EXTENSIONS):
+        return False
+    prefix = start.path.rsplit("/", 1)[0] + "/"
+    return (parsed.path or "/").startswith(prefix) or parsed.path == start.path
+
+
+async def crawl(url: str, depth: int = 0, max_pages: Optional[int] = None,
+                client: Optional[httpx.AsyncClient] = None, progress=None) -> List[WebPage]:
+    # Breadth-first crawl from `url`, following same-site links up to
+    # `depth` hops, with at most CRAWL_CONCURRENCY requests in flight.
+    # Pages that fail to load or aren't HTML are skipped; the start page
+    # failing is an error.
+    max_pages = max_pages or settings.CRAWL_MAX_PAGES
+    own_client = client is None
+    client = client or new_web_client()
+    slots = asyncio.Semaphore(settings.CRAWL_CONCURRENCY)
+    start = urldefrag(url)[0]
+    seen = {start}
+    pages = []
+
+    async def visit(page_url: str, page_depth: int):
+        async with slots:
+            response = await fetch(client, page_url)
+        is_html = "html" in response.content_type or (
+            not response.content_type and response.body.lstrip().startswith(b"<")
+        )
+        if not is_html:
+            return None, []
+        return html_to_page(response.url, response.body, page_depth)
+
+    try:
+        frontier = [start]
+        for level in range(depth + 1):
+            results = await asyncio.gather(
+                *(visit(page_url, level) for page_url in frontier),
+                return_exceptions=True,
+            )
+            next_frontier = []
+            for page_url, result in zip(frontier, results):
+                if isinstance(result, BaseException):
+                    if page_url == start:
+                        raise result
+                    continue
+                page, links = result
+                if page is None:
+                    continue
+                pages.append(page)
+                for link in links:
+                    link = urldefrag(urljoin(page.url, link))[0]
+                    if link not in seen and _in_scope(link, start) and len(seen) < max_pages:
+                        seen.add(link)
+                        next_frontier.append(link)
+            if progress is not None:
+                progress(pages_fetched=len(pages), pages_found=len(seen))
+            frontier = next_frontier
+            if not frontier:
+                break
+        return pages
+    finally:
+        if own_client:
+            await client.aclose()
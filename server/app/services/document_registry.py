@@ -0,0 +1,225 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, Optional
+
+from app.core.config import settings
+
+# Every document belongs to one tenant; requests that name none use this one
+DEFAULT_TENANT = "default"
+# Tenant names end up in collection and file names
+TENANT_PATTERN = r"^[a-z0-9](?:[a-z0-9_-]{0,62}[a-z0-9])?$"
+
+
+class DocumentRegistry:
+    # Tracks every ingested document: its source, the content hash of the
+    # version that is currently indexed, and the IDs of its chunks in the
+    # vector store. Lets ingestion skip unchanged documents, upsert only the
+    # chunks that changed, and delete one document's vectors on its own.
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " doc_id TEXT PRIMARY KEY,"
+            " source TEXT NOT NULL,"
+            " content_hash TEXT NOT NULL,"
+            " chunk_count INTEGER NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " tenant TEXT NOT NULL DEFAULT 'default')"
+        )
+        columns = [row["name"] for row in self._conn.execute("PRAGMA table_info(documents)")]
+        if "tenant" not in columns:
+            # Registries from before tenants: everything belongs to the default one
+            self._conn.execute("ALTER TABLE documents ADD COLUMN tenant TEXT NOT NULL DEFAULT 'default'")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS documents_content_hash ON documents (content_hash)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS documents_tenant ON documents (tenant)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " chunk_id TEXT PRIMARY KEY,"
+            " doc_id TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_doc_id ON chunks (doc_id)")
+        # Summaries are precomputed per document version (content_hash);
+        # scripts are the audio-summary scripts generated from them
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            " doc_id TEXT PRIMARY KEY,"
+            " content_hash TEXT NOT NULL,"
+            " summary TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS scripts ("
+            " key TEXT PRIMARY KEY,"
+            " tenant TEXT NOT NULL,"
+            " script TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._conn.execute("INSERT OR IGNORE INTO meta VALUES ('version', 0)")
+
+    @staticmethod
+    def doc_id_for(source: str, tenant: str = DEFAULT_TENANT) -> str:
+        # The default tenant keeps the IDs documents had before tenants existed
+        key = source if tenant == DEFAULT_TENANT else f"{tenant}\0{source}"
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def chunk_id_for(doc_id: str, text: str, page=None) -> str:
+        # Content-addressed, so an unchanged chunk keeps its ID across versions
+        digest = hashlib.sha256(f"{page}\0{text}".encode("utf-8")).hexdigest()[:24]
+        return f"{doc_id}-{digest}"
+
+    def version(self) -> int:
+        # Bumped on every change to the indexed document set, from any process
+        with self._lock:
+            return self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def _bump_version(self):
+        self._conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+
+    def get(self, doc_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+        return dict(row) if row else None
+
+    def is_current(self, doc_id: str, content_hash: str) -> bool:
+        document = self.get(doc_id)
+        return document is not None and document["content_hash"] == content_hash
+
+    def list(self, tenant: Optional[str] = None) -> List[dict]:
+        with self._lock:
+            if tenant is None:
+                rows = self._conn.execute("SELECT * FROM documents ORDER BY updated_at DESC").fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT * FROM documents WHERE tenant = ? ORDER BY updated_at DESC", (tenant,)
+                ).fetchall()
+        return [dict(row) for row in rows]
+
+    def chunk_ids(self, doc_id: str) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT chunk_id FROM chunks WHERE doc_id = ?", (doc_id,)).fetchall()
+        return [row["chunk_id"] for row in rows]
+
+    def scoped(self, tenant: str, doc_ids: Iterable[str]) -> List[dict]:
+        # The given documents, ignoring any that aren't the tenant's
+        doc_ids = list(doc_ids)
+        documents = []
+        with self._lock:
+            for i in range(0, len(doc_ids), 500):
+                part = doc_ids[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT * FROM documents WHERE tenant = ? AND doc_id IN ({placeholders})",
+                    [tenant, *part],
+                ).fetchall()
+                documents.extend(dict(row) for row in rows)
+        return documents
+
+    def save(self, doc_id: str, source: str, content_hash: str, chunk_ids: Iterable[str],
+             tenant: str = DEFAULT_TENANT):
+        chunk_ids = list(chunk_ids)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO chunks VALUES (?, ?)",
+                    [(chunk_id, doc_id) for chunk_id in chunk_ids],
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO documents"
+                    " (doc_id, source, content_hash, chunk_count, updated_at, tenant)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (doc_id, source, content_hash, len(chunk_ids), time.time(), tenant),
+                )
+                self._bump_version()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get_summary(self, doc_id: str) -> Optional[dict]:
+        # Only the summary of the version that is currently indexed
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summaries.* FROM summaries JOIN documents USING (doc_id, content_hash)"
+                " WHERE summaries.doc_id = ?",
+                (doc_id,),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def save_summary(self, doc_id: str, content_hash: str, summary: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?)",
+                (doc_id, content_hash, summary, time.time()),
+            )
+
+    def get_script(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT script FROM scripts WHERE key = ?", (key,)).fetchone()
+        return row["script"] if row else None
+
+    def save_script(self, key: str, tenant: str, script: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO scripts VALUES (?, ?, ?, ?)",
+                (key, tenant, script, time.time()),
+            )
+
+    def remove(self, doc_id: str) -> List[str]:
+        chunk_ids = self.chunk_ids(doc_id)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+                self._conn.execute("DELETE FROM summaries WHERE doc_id = ?", (doc_id,))
+                self._conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+                self._bump_version()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return chunk_ids
+
+    def clear(self, tenant: Optional[str] = None):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                if tenant is None:
+                    self._conn.execute("DELETE FROM chunks")
+                    self._conn.execute("DELETE FROM summaries")
+                    self._conn.execute("DELETE FROM scripts")
+                    self._conn.execute("DELETE FROM documents")
+                else:
+                    for table in ("chunks", "summaries"):
+                        self._conn.execute(
+                            f"DELETE FROM {table} WHERE doc_id IN (SELECT doc_id FROM documents WHERE tenant = ?)",
+                            (tenant,),
+                        )
+                    self._conn.execute("DELETE FROM scripts WHERE tenant = ?", (tenant,))
+                    self._conn.execute("DELETE FROM documents WHERE tenant = ?", (tenant,))
+                self._bump_version()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+
+document_registry = DocumentRegistry(
+    os.path.join(settings.CHROMA_PERSIST_DIRECTORY, "documents.sqlite3")
+)
@@ -0,0 +1,205 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+
+class EmbeddingCache:
+    # Content-addressed store of embedding vectors on local disk. Rows are
+    # keyed by sha256(model, text), vectors are packed float32 blobs and the
+    # least recently used rows are evicted once the file grows past max_bytes.
+    # Hit/miss counters live in the same database so every process sharing
+    # the cache (API and ingestion workers) reports into one set of totals.
+    # Lookups only read: their counters and last-used times are kept in
+    # memory and written every FLUSH_SECONDS (or with the next put), so query
+    # embeddings don't queue for SQLite's write lock behind ingestion.
+
+    FLUSH_SECONDS = 5.0
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._pending_counts = {}
+        self._pending_used = {}
+        self._flushed = time.monotonic()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._conn.execute("INSERT OR IGNORE INTO stats VALUES ('hits', 0), ('misses', 0), ('evictions', 0)")
+        # Running total of the vector bytes, kept by every put and eviction;
+        # computed here once for caches created before it existed
+        self._conn.execute(
+            "INSERT OR IGNORE INTO stats SELECT 'bytes', COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        )
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        if not keys:
+            return []
+
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(unique_keys), 500):
+                part = unique_keys[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part
+                ).fetchall()
+                found.update(rows)
+
+            now = time.time()
+            self._pending_used.update((key, now) for key in found)
+            hits = sum(1 for key in keys if key in found)
+            self._count(hits=hits, misses=len(keys) - hits)
+            if time.monotonic() - self._flushed >= self.FLUSH_SECONDS:
+                self._conn.execute("BEGIN")
+                self._flush()
+                self._conn.execute("COMMIT")
+
+        return [array("f", found[key]).tolist() if key in found else None for key in keys]
+
+    def put_many(self, model: str, keys: List[str], vectors: List[List[float]]):
+        if not keys:
+            return
+
+        now = time.time()
+        rows = [(key, model, array("f", vector).tobytes(), now) for key, vector in zip(keys, vectors)]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            # Rows being replaced no longer count towards the total
+            replaced = 0
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                replaced += self._conn.execute(
+                    f"SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings WHERE key IN ({placeholders})", part
+                ).fetchone()[0]
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            self._count(bytes=sum(len(row[2]) for row in rows) - replaced)
+            self._flush()
+            self._evict()
+            self._conn.execute("COMMIT")
+
+    def _evict(self):
+        total = self._conn.execute("SELECT value FROM stats WHERE name = 'bytes'").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # Drop the oldest rows, plus a 10% margin so we don't evict on every put
+        excess = total - self.max_bytes * 0.9
+        removed, doomed = 0, []
+        for key, size in self._conn.execute(
+            "SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used"
+        ):
+            if removed >= excess:
+                break
+            doomed.append((key,))
+            removed += size
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", doomed)
+        self._count(evictions=len(doomed), bytes=-removed)
+        self._flush()
+
+    def _count(self, **counters):
+        for name, value in counters.items():
+            if value:
+                self._pending_counts[name] = self._pending_counts.get(name, 0) + value
+
+    def _flush(self):
+        # Writes the counters and last-used times gathered since the last
+        # flush; called inside a transaction, with the lock held
+        if self._pending_used:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._pending_used.items()],
+            )
+        self._conn.executemany(
+            "UPDATE stats SET value = value + ? WHERE name = ?",
+            [(value, name) for name, value in self._pending_counts.items()],
+        )
+        self._pending_used, self._pending_counts = {}, {}
+        self._flushed = time.monotonic()
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._flush()
+            self._conn.execute("COMMIT")
+            counters = dict(self._conn.execute("SELECT name, value FROM stats").fetchall())
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+        size = counters.pop("bytes")
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            **counters,
+            "hit_rate": counters["hits"] / lookups if lookups else 0.0,
+            "entries": entries,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.execute("UPDATE stats SET value = 0")
+            self._pending_used, self._pending_counts = {}, {}
+
+
+class CachedEmbeddings(Embeddings):
+    # Drop-in Embeddings wrapper: looks every text up in the cache first and
+    # only sends the misses (deduplicated) to the underlying model.
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, model: str):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [EmbeddingCache.make_key(self.model, text) for text in texts]
+        vectors = self.cache.get_many(keys)
+
+        missing = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None and key not in missing:
+                missing[key] = text
+
+        if missing:
+            new_vectors = self.embeddings.embed_documents(list(missing.values()))
+            self.cache.put_many(self.model, list(missing.keys()), new_vectors)
+            computed = dict(zip(missing.keys(), new_vectors))
+            vectors = [vector if vector is not None else computed[key] for key, vector in zip(keys, vectors)]
+
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        # Separate namespace: some models embed queries differently from documents
+        key = EmbeddingCache.make_key(f"{self.model}:query", text)
+        vector = self.cache.get_many([key])[0]
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put_many(self.model, [key], [vector])
+        return vector
@@ -0,0 +1,46 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+
+class EmbeddingWorker(Embeddings):
+    # Splits embedding work into fixed-size batches and keeps up to
+    # `concurrency` requests in flight against the embedding endpoint.
+    # At most `max_pending` batches may be queued or running at once;
+    # submit() blocks past that, which is what pushes back on the ingestion
+    # producer instead of letting it run ahead and buffer chunks in memory.
+
+    def __init__(self, embeddings: Embeddings, batch_size: int, concurrency: int, max_pending: int):
+        self.embeddings = embeddings
+        self.batch_size = max(1, batch_size)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, concurrency),
+            thread_name_prefix="embedding-worker",
+        )
+        self._slots = threading.BoundedSemaphore(max(max_pending, concurrency, 1))
+
+    def submit(self, texts: List[str]) -> Future:
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(self.embeddings.embed_documents, texts)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        futures = [
+            self.submit(texts[i:i + self.batch_size])
+            for i in range(0, len(texts), self.batch_size)
+        ]
+        return [vector for future in futures for vector in future.result()]
+
+    def embed_query(self, text: str) -> List[float]:
+        # Queries are latency sensitive; don't queue them behind ingestion
+        return self.embeddings.embed_query(text)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,316 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import fitz  # PyMuPDF
+
+from app.core.config import settings
+
+# Part of every cache key; bump when extraction output changes so cached
+# pages from older versions are never reused
+EXTRACTOR_VERSION = 1
+
+# Top and bottom share of the page where running headers and footers live
+EDGE_MARGIN = 0.08
+# Headers and footers are learned from this many pages spread over the file,
+# and must repeat on at least this share of them
+BOILERPLATE_SAMPLE_PAGES = 16
+BOILERPLATE_MIN_SHARE = 0.5
+# find_tables costs ~100 ms a page, so it only runs on pages with at least
+# this many ruling lines or rectangles
+TABLE_MIN_RULINGS = 6
+# Cached pages are read this many at a time, so a long document's text is
+# never all in memory at once
+CACHE_READ_PAGES = 64
+
+BULLET_RE = re.compile(r"^\s*(?:[-*•·▪]|\d+[.)])\s")
+DIGITS_RE = re.compile(r"\d+")
+SPACE_RE = re.compile(r"\s+")
+
+
+def hash_file(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def normalize_line(text: str) -> str:
+    # Page numbers and dates change from page to page; the rest of a
+    # running header doesn't
+    return SPACE_RE.sub(" ", DIGITS_RE.sub("#", text)).strip().lower()
+
+
+def join_lines(text: str) -> str:
+    # A text block is one paragraph laid out in lines: rejoin the lines,
+    # undoing hyphenation, but keep list items on their own lines
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if not lines:
+        return ""
+    out = lines[0]
+    for line in lines[1:]:
+        if BULLET_RE.match(line):
+            out += "\n" + line
+        elif out.endswith("-") and line[:1].islower():
+            out = out[:-1] + line
+        else:
+            out += " " + line
+    return out
+
+
+def _edge_blocks(page) -> List[Tuple[tuple, bool]]:
+    # Text blocks, each flagged when it sits in the header or footer zone
+    height = page.rect.height
+    top, bottom = height * EDGE_MARGIN, height * (1 - EDGE_MARGIN)
+    return [
+        (block, block[3] <= top or block[1] >= bottom)
+        for block in page.get_text("blocks", sort=True)
+        if block[6] == 0
+    ]
+
+
+def detect_boilerplate(doc) -> List[str]:
+    # Normalized text of header/footer blocks that repeat across the file
+    count = doc.page_count
+    if count < 3:
+        return []
+    sample = min(count, BOILERPLATE_SAMPLE_PAGES)
+    pages = sorted({round(i * (count - 1) / max(1, sample - 1)) for i in range(sample)})
+
+    seen = Counter()
+    for page_num in pages:
+        seen.update({
+            normalize_line(block[4])
+            for block, at_edge in _edge_blocks(doc[page_num])
+            if at_edge and block[4].strip()
+        })
+    needed = max(2, BOILERPLATE_MIN_SHARE * len(pages))
+    return sorted(text for text, n in seen.items() if n >= needed)
+
+
+def _tables(page) -> list:
+    # Only looks where the ruling lines are, which is several times faster
+    # than analysing the whole page
+    rulings = 0
+    area = fitz.Rect()
+    for drawing in page.get_drawings():
+        for item in drawing["items"]:
+            if item[0] in ("l", "re"):
+                rulings += 1
+                area |= drawing["rect"]
+                break
+    if rulings < TABLE_MIN_RULINGS:
+        return []
+    return [table for table in page.find_tables(clip=area).tables if table.row_count > 1]
+
+
+def extract_page(page, boilerplate: Sequence[str] = (), detect_tables: bool = True) -> str:
+    # Page text in reading order, one paragraph per text block. Repeated
+    # headers/footers are dropped and tables come out as Markdown in place
+    # of their cell-by-cell text.
+    boilerplate = set(boilerplate)
+    tables = _tables(page) if detect_tables else []
+    table_rects = [fitz.Rect(table.bbox) for table in tables]
+    pending = sorted(zip((rect.y0 for rect in table_rects), range(len(tables))))
+
+    parts = []
+    for block, at_edge in _edge_blocks(page):
+        if at_edge and normalize_line(block[4]) in boilerplate:
+            continue
+        center = fitz.Point((block[0] + block[2]) / 2, (block[1] + block[3]) / 2)
+        if any(center in rect for rect in table_rects):
+            continue
+        while pending and pending[0][0] <= block[1]:
+            parts.append(tables[pending.pop(0)[1]].to_markdown().strip())
+        text = join_lines(block[4])
+        if text:
+            parts.append(text)
+    parts.extend(tables[i].to_markdown().strip() for _, i in pending)
+    return "\n\n".join(parts)
+
+
+def extract_page_range(file_path: str, start: int, end: int, boilerplate: Sequence[str] = (),
+                       detect_tables: bool = True) -> List[Tuple[int, str]]:
+    with fitz.open(file_path) as doc:
+        return [
+            (page_num, extract_page(doc[page_num], boilerplate, detect_tables))
+            for page_num in range(start, end)
+        ]
+
+
+class PageCache:
+    # Extracted page text on local disk, keyed by (file hash, page), so a
+    # file is parsed once no matter how many times it is sampled, ingested
+    # or re-ingested. Also keeps what was learned about each file as a whole
+    # (page count, headers/footers). Least recently used files are evicted
+    # once the cache grows past max_bytes.
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " file_key TEXT PRIMARY KEY,"
+            " page_count INTEGER NOT NULL,"
+            " boilerplate TEXT NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " file_key TEXT NOT NULL,"
+            " page INTEGER NOT NULL,"
+            " text TEXT NOT NULL,"
+            " PRIMARY KEY (file_key, page))"
+        )
+
+    @staticmethod
+    def file_key(file_hash: str) -> str:
+        # The extraction options change the text, so pages extracted under
+        # other settings are never served
+        options = f"b{int(settings.EXTRACTION_REMOVE_BOILERPLATE)}t{int(settings.EXTRACTION_DETECT_TABLES)}"
+        return f"{EXTRACTOR_VERSION}:{options}:{file_hash}"
+
+    def get_file(self, file_hash: str) -> Optional[Tuple[int, List[str]]]:
+        key = self.file_key(file_hash)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT page_count, boilerplate FROM files WHERE file_key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE files SET last_used = ? WHERE file_key = ?", (time.time(), key))
+        return row[0], json.loads(row[1])
+
+    def put_file(self, file_hash: str, page_count: int, boilerplate: List[str]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                (self.file_key(file_hash), page_count, json.dumps(boilerplate), time.time()),
+            )
+            self._evict()
+
+    def cached_pages(self, file_hash: str) -> Set[int]:
+        # Numbers of the file's pages in the cache, without their text
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT page FROM pages WHERE file_key = ?", (self.file_key(file_hash),)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def get_pages(self, file_hash: str, start: int, end: int) -> Dict[int, str]:
+        # The cached pages of the file in [start, end)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT page, text FROM pages WHERE file_key = ? AND page >= ? AND page < ?",
+                (self.file_key(file_hash), start, end)
+            ).fetchall()
+        return dict(rows)
+
+    def put_pages(self, file_hash: str, pages: List[Tuple[int, str]]):
+        if not pages:
+            return
+        key = self.file_key(file_hash)
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?)",
+                [(key, page_num, text) for page_num, text in pages],
+            )
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(LENGTH(text)), 0) FROM pages").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        self._conn.execute("BEGIN")
+        try:
+            # Pages whose file row is gone (evicted while they were still
+            # being written) go first; nothing would ever evict them later
+            orphaned = "FROM pages WHERE file_key NOT IN (SELECT file_key FROM files)"
+            total -= self._conn.execute(f"SELECT COALESCE(SUM(LENGTH(text)), 0) {orphaned}").fetchone()[0]
+            self._conn.execute(f"DELETE {orphaned}")
+
+            # Then whole files, least recently used first, down to 90%
+            for key, size in self._conn.execute(
+                "SELECT files.file_key, COALESCE(SUM(LENGTH(pages.text)), 0) FROM files"
+                " LEFT JOIN pages USING (file_key) GROUP BY files.file_key ORDER BY files.last_used"
+            ).fetchall():
+                if total <= self.max_bytes * 0.9:
+                    break
+                self._conn.execute("DELETE FROM pages WHERE file_key = ?", (key,))
+                self._conn.execute("DELETE FROM files WHERE file_key = ?", (key,))
+                total -= size
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+
+_page_cache = None
+_page_cache_lock = threading.Lock()
+
+
+def get_page_cache() -> Optional[PageCache]:
+    # Opened on first use, so page-extraction worker processes never open it
+    global _page_cache
+    if not settings.EXTRACTION_CACHE_ENABLED:
+        return None
+    with _page_cache_lock:
+        if _page_cache is None:
+            _page_cache = PageCache(settings.EXTRACTION_CACHE_PATH, settings.EXTRACTION_CACHE_MAX_MB * 1024 * 1024)
+    return _page_cache
+
+
+def analyze(file_path: str, file_hash: str) -> Tuple[int, List[str]]:
+    # (page count, header/footer signatures) of a file, computed once
+    cache = get_page_cache()
+    info = cache.get_file(file_hash) if cache is not None else None
+    if info is not None:
+        return info
+    with fitz.open(file_path) as doc:
+        page_count = doc.page_count
+        boilerplate = detect_boilerplate(doc) if settings.EXTRACTION_REMOVE_BOILERPLATE else []
+    if cache is not None:
+        cache.put_file(file_hash, page_count, boilerplate)
+    return page_count, boilerplate
+
+
+def sample_text(file_path: str, file_hash: Optional[str] = None, max_chars: int = 2000) -> str:
+    # The first max_chars of the file's text, extracting only as many pages
+    # as that takes. Pages extracted here are cached for the ingestion job.
+    file_hash = file_hash or hash_file(file_path)
+    page_count, boilerplate = analyze(file_path, file_hash)
+    cache = get_page_cache()
+
+    parts, size, extracted = [], 0, []
+    cached, cached_end = {}, 0
+    with fitz.open(file_path) as doc:
+        for page_num in range(page_count):
+            if cache is not None and page_num >= cached_end:
+                cached_end = page_num + CACHE_READ_PAGES
+                cached = cache.get_pages(file_hash, page_num, cached_end)
+            text = cached.get(page_num)
+            if text is None:
+                text = extract_page(doc[page_num], boilerplate, settings.EXTRACTION_DETECT_TABLES)
+                extracted.append((page_num, text))
+            parts.append(text)
+            size += len(text) + 2
+            if size >= max_chars:
+                break
+    if cache is not None:
+        cache.put_pages(file_hash, extracted)
+    return "\n\n".join(parts)[:max_chars]
@@ -0,0 +1,97 @@
+import hashlib
+from itertools import islice
+from typing import Iterable, Iterator, List
+
+from langchain_core.documents import Document
+
+from app.core.config import settings
+from app.services.document_registry import document_registry, DEFAULT_TENANT
+from app.services.vector_store import get_vector_store
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def index_document(source: str, content_hash: str, documents: Iterable[Document], progress=None,
+                   tenant: str = DEFAULT_TENANT) -> dict:
+    # Upserts one document into the tenant's vector store. Chunks get
+    # content-addressed IDs, so only chunks that are new in this version are
+    # embedded and written; chunks that disappeared since the last version
+    # are deleted.
+    doc_id = document_registry.doc_id_for(source, tenant)
+    if document_registry.is_current(doc_id, content_hash):
+        return {"doc_id": doc_id, "status": "unchanged", "added": 0, "removed": 0}
+
+    existing = set(document_registry.chunk_ids(doc_id))
+    seen = set()
+    added = 0
+
+    def iter_new_chunks():
+        nonlocal added
+        for doc in documents:
+            doc.id = document_registry.chunk_id_for(doc_id, doc.page_content, doc.metadata.get("page"))
+            doc.metadata["doc_id"] = doc_id
+            if doc.id in seen:
+                continue
+            seen.add(doc.id)
+            if doc.id not in existing:
+                added += 1
+                yield doc
+
+    embedded = 0
+
+    def on_write(count):
+        nonlocal embedded
+        embedded += count
+        if progress is not None:
+            progress(chunks_embedded=embedded)
+
+    get_vector_store().add_document_batches(
+        batched(iter_new_chunks(), settings.INGEST_BATCH_SIZE),
+        on_write=on_write,
+        tenant=tenant
+    )
+
+    stale = existing - seen
+    if stale:
+        get_vector_store().delete(list(stale), tenant=tenant)
+
+    document_registry.save(doc_id, source, content_hash, seen, tenant=tenant)
+    result = {"doc_id": doc_id, "status": "indexed", "added": added, "removed": len(stale)}
+    if settings.SUMMARY_ENABLED:
+        # Summarized in its own job so the document is searchable right away
+        from app.services.jobs import job_queue
+        result["summary_job_id"] = job_queue.enqueue("summarize_document", doc_id=doc_id, tenant=tenant)
+    return result
+
+
+def remove_document(doc_id: str, tenant: str = DEFAULT_TENANT) -> bool:
+    document = document_registry.get(doc_id)
+    if document is None or document["tenant"] != tenant:
+        return False
+    chunk_ids = document_registry.remove(doc_id)
+    if chunk_ids:
+        get_vector_store().delete(chunk_ids, tenant=tenant)
+    return True
+
+
+def remove_documents(doc_ids: List[str], tenant: str = DEFAULT_TENANT, progress=None) -> dict:
+    # Job handler: vector writes only ever happen in the job workers, so a
+    # local Chroma store has a single writing process
+    return {"removed": [doc_id for doc_id in doc_ids if remove_document(doc_id, tenant)]}
+
+
+def clear_tenant(tenant: str = DEFAULT_TENANT, progress=None) -> dict:
+    # Job handler for /api/clear without doc_ids
+    get_vector_store().clear(tenant)
+    return {"tenant": tenant}
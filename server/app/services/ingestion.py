@@ -0,0 +1,79 @@
+import asyncio
+import os
+from typing import Callable, Optional
+
+from app.services.chunking import get_chunker
+from app.services.crawler import crawl
+from app.services.pdf_pipeline import iter_page_texts, page_count
+from app.services.document_registry import document_registry, DEFAULT_TENANT
+from app.services.extraction import hash_file
+from app.services.indexing import index_document, hash_text
+
+# Called with partial progress updates, e.g. {"pages_done": 12}
+ProgressCallback = Callable[..., None]
+
+
+def _noop(**progress):
+    pass
+
+
+def process_pdf(
+    file_path: str,
+    filename: str,
+    content_hash: Optional[str] = None,
+    progress: Optional[ProgressCallback] = None,
+    tenant: str = DEFAULT_TENANT
+):
+    progress = progress or _noop
+    try:
+        # An unchanged re-upload costs one hash and nothing else; uploads
+        # arrive with the hash already computed while they were streamed in
+        content_hash = content_hash or hash_file(file_path)
+        doc_id = document_registry.doc_id_for(filename, tenant)
+        if document_registry.is_current(doc_id, content_hash):
+            return {"doc_id": doc_id, "status": "unchanged"}
+
+        progress(pages_total=page_count(file_path, content_hash))
+
+        # Pages are extracted across the process pool and chunked as they
+        # arrive, so only one batch of chunks is held in memory at a time
+        def iter_pages():
+            for page_num, page_text in iter_page_texts(file_path, content_hash):
+                yield page_num, page_text
+                progress(pages_done=page_num + 1)
+
+        documents = get_chunker().split_documents(iter_pages(), {"source": filename})
+        return index_document(filename, content_hash, documents, progress=progress, tenant=tenant)
+    finally:
+        # Clean up temp file
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+
+def process_web_content(url: str, depth: int = 0, max_pages: Optional[int] = None,
+                        progress: Optional[ProgressCallback] = None, tenant: str = DEFAULT_TENANT):
+    # Crawls `url` (and same-site pages up to `depth` links away) and indexes
+    # every page as its own document, so a re-crawl only re-embeds the pages
+    # that changed. Responses come from the shared HTTP cache when they can.
+    progress = progress or _noop
+    pages = asyncio.run(crawl(url, depth=depth, max_pages=max_pages, progress=progress))
+    progress(pages_total=len(pages))
+
+    documents = []
+    embedded = 0
+
+    def page_progress(chunks_embedded):
+        progress(chunks_embedded=embedded + chunks_embedded)
+
+    for i, page in enumerate(pages):
+        if page.text:
+            metadata = {"source": page.url, "title": page.title}
+            splits = get_chunker().split_documents([(None, page.text)], metadata)
+            result = index_document(page.url, hash_text(page.text), splits, progress=page_progress, tenant=tenant)
+            embedded += result.get("added", 0)
+            documents.append({"url": page.url, **result})
+        progress(pages_done=i + 1)
+
+    if len(documents) == 1:
+        return documents[0]
+    return {"status": "indexed", "pages": len(documents), "documents": documents}
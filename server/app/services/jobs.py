@@ -0,0 +1,304 @@
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from app.core.config import settings
+from app.services.metrics import metrics, span
+
+logger = logging.getLogger(__name__)
+
+# Held by the one worker allowed to write a local Chroma store
+WRITER_LOCK_FILE = "writer.lock"
+
+# Job kind -> "module:function". Handlers are imported inside the worker
+# process, so the API process never loads the ingestion stack for them.
+# A handler is called with the job payload as keyword arguments plus a
+# `progress` callback, and returns a JSON-serialisable result.
+JOB_HANDLERS = {
+    "ingest_pdf": "app.services.ingestion:process_pdf",
+    "ingest_url": "app.services.ingestion:process_web_content",
+    "suggest_questions": "app.services.questions:suggest_questions",
+    "summarize_document": "app.services.summaries:summarize_document",
+    "render_audio": "app.services.audio_summary:render_audio_summary",
+    "remove_documents": "app.services.indexing:remove_documents",
+    "clear_tenant": "app.services.indexing:clear_tenant",
+}
+
+
+class JobQueue:
+    # Durable job queue in a local SQLite file, shared by the API process
+    # (which enqueues and reads status) and the worker processes (which
+    # claim jobs and report progress). A running job holds a lease that its
+    # worker renews while it works; jobs whose lease ran out (the worker
+    # died, on whichever host) are put back in the queue by any worker.
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " progress TEXT NOT NULL DEFAULT '{}',"
+            " result TEXT,"
+            " error TEXT,"
+            " worker_pid INTEGER,"
+            " created_at REAL NOT NULL,"
+            " started_at REAL,"
+            " finished_at REAL,"
+            " lease_until REAL)"
+        )
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "lease_until" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN lease_until REAL")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+
+    def enqueue(self, kind: str, **payload) -> str:
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, payload, status, created_at) VALUES (?, ?, ?, 'queued', ?)",
+                (job_id, kind, json.dumps(payload), time.time()),
+            )
+        return job_id
+
+    def claim(self) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE jobs SET status = 'running', worker_pid = ?, started_at = ?, lease_until = ?"
+                " WHERE id = (SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1)"
+                " AND status = 'queued'"
+                " RETURNING *",
+                (os.getpid(), now, now + settings.JOB_LEASE_SECONDS),
+            ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def renew(self, job_id: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = 'running'",
+                (time.time() + settings.JOB_LEASE_SECONDS, job_id),
+            )
+
+    def update_progress(self, job_id: str, progress: dict):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET progress = ? WHERE id = ?",
+                (json.dumps(progress), job_id),
+            )
+
+    def complete(self, job_id: str, result=None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'completed', result = ?, finished_at = ? WHERE id = ?",
+                (json.dumps(result), time.time(), job_id),
+            )
+
+    def fail(self, job_id: str, error: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                (error, time.time(), job_id),
+            )
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def requeue_expired(self) -> int:
+        # Running jobs whose worker stopped renewing the lease; those from
+        # before leases existed have none and are requeued too
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', worker_pid = NULL, started_at = NULL, lease_until = NULL"
+                " WHERE status = 'running' AND (lease_until IS NULL OR lease_until < ?)",
+                (time.time(),),
+            )
+        return cursor.rowcount
+
+    @staticmethod
+    def _to_dict(row) -> dict:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["progress"] = json.loads(job["progress"] or "{}")
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+
+class ProgressReporter:
+    # Collects progress updates from a handler and writes them to the queue
+    # at most every `interval` seconds, adding throughput figures.
+
+    def __init__(self, queue: JobQueue, job_id: str, interval: float = 0.5):
+        self.queue = queue
+        self.job_id = job_id
+        self.interval = interval
+        self.state = {}
+        self._started = time.monotonic()
+        self._last_flush = 0.0
+
+    def __call__(self, **progress):
+        self.state.update(progress)
+        if time.monotonic() - self._last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        elapsed = time.monotonic() - self._started
+        self.state["elapsed_seconds"] = round(elapsed, 3)
+        if "chunks_embedded" in self.state and elapsed > 0:
+            self.state["chunks_per_second"] = round(self.state["chunks_embedded"] / elapsed, 2)
+        if "pages_done" in self.state and elapsed > 0:
+            self.state["pages_per_second"] = round(self.state["pages_done"] / elapsed, 2)
+        self.queue.update_progress(self.job_id, self.state)
+        self._last_flush = time.monotonic()
+
+
+def _resolve_handler(kind: str):
+    module_name, function_name = JOB_HANDLERS[kind].split(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def _keep_lease(queue: JobQueue, job_id: str, done: threading.Event):
+    while not done.wait(settings.JOB_LEASE_SECONDS / 3):
+        try:
+            queue.renew(job_id)
+        except Exception:
+            logger.exception("Renewing the lease of job %s failed", job_id)
+
+
+def run_job(queue: JobQueue, job: dict):
+    reporter = ProgressReporter(queue, job["id"])
+    status = "completed"
+    done = threading.Event()
+    threading.Thread(target=_keep_lease, args=(queue, job["id"], done), daemon=True).start()
+    try:
+        handler = _resolve_handler(job["kind"])
+        with span(f"job.{job['kind']}"):
+            result = handler(**job["payload"], progress=reporter)
+        reporter.flush()
+        queue.complete(job["id"], result)
+    except Exception as e:
+        logger.exception("Job %s (%s) failed", job["id"], job["kind"])
+        status = "failed"
+        reporter.flush()
+        queue.fail(job["id"], f"{type(e).__name__}: {e}")
+    finally:
+        done.set()
+        # The worker's spans reach /metrics through the shared metrics file
+        metrics.inc("documind_jobs_total", kind=job["kind"], status=status)
+        try:
+            metrics.flush()
+        except Exception:
+            logger.exception("Flushing metrics failed")
+
+
+def _writer_lock(stop_event=None):
+    # With a local Chroma store, only the worker holding this lock runs
+    # jobs; any other (e.g. `python -m app.worker` next to an API that
+    # starts its own) waits as a standby until the holder exits
+    if fcntl is None or settings.VECTOR_BACKEND != "chroma" or settings.CHROMA_SERVER_HOST:
+        return None
+    os.makedirs(settings.CHROMA_PERSIST_DIRECTORY, exist_ok=True)
+    lock = open(os.path.join(settings.CHROMA_PERSIST_DIRECTORY, WRITER_LOCK_FILE), "a")
+    waiting = False
+    while stop_event is None or not stop_event.is_set():
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return lock
+        except BlockingIOError:
+            if not waiting:
+                logger.info("Another worker writes the local Chroma store; standing by")
+                waiting = True
+            time.sleep(settings.JOB_POLL_INTERVAL)
+    lock.close()
+    return None
+
+
+def worker_loop(stop_event=None):
+    # Entry point of a worker process: claim jobs until told to stop.
+    # Ctrl+C is left to the parent, which shuts workers down via stop_event.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(level=logging.INFO)
+    writer_lock = _writer_lock(stop_event)
+    queue = JobQueue(settings.JOBS_DB_PATH)
+    checked = None
+    while stop_event is None or not stop_event.is_set():
+        if checked is None or time.monotonic() - checked >= settings.JOB_LEASE_SECONDS:
+            checked = time.monotonic()
+            if queue.requeue_expired():
+                logger.info("Requeued jobs whose worker stopped renewing their lease")
+        job = queue.claim()
+        if job is None:
+            time.sleep(settings.JOB_POLL_INTERVAL)
+            continue
+        run_job(queue, job)
+    if writer_lock is not None:
+        writer_lock.close()
+
+
+class WorkerPool:
+    def __init__(self, size: int):
+        self.size = size
+        self._context = multiprocessing.get_context("spawn")
+        self._stop_event = self._context.Event()
+        self._processes = []
+
+    def start(self):
+        # A local Chroma store takes one writing process at a time; every
+        # vector write runs in a job, so one worker keeps it that way
+        if self.size > 1 and settings.VECTOR_BACKEND == "chroma" and not settings.CHROMA_SERVER_HOST:
+            raise RuntimeError(
+                "More than one job worker needs a Chroma server (CHROMA_SERVER_HOST) "
+                "or VECTOR_BACKEND=mmap; a local Chroma store has a single writer"
+            )
+        # Recovering jobs is left to the workers, wherever they run: the
+        # API with JOB_WORKERS=0 has none and never touches running jobs
+        for i in range(self.size):
+            # Not daemonic: workers run their own page-extraction pool
+            process = self._context.Process(
+                target=worker_loop,
+                args=(self._stop_event,),
+                name=f"documind-job-worker-{i}",
+            )
+            process.start()
+            self._processes.append(process)
+
+    def stop(self, timeout: float = 10.0):
+        self._stop_event.set()
+        deadline = time.monotonic() + timeout
+        for process in self._processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self._processes = []
+
+
+job_queue = JobQueue(settings.JOBS_DB_PATH)
@@ -0,0 +1,336 @@
+import bisect
+import contextvars
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    "documind_span_seconds": (
+        "histogram", "Time spent in each stage of chat, retrieval, ingestion and audio.", LATENCY_BUCKETS
+    ),
+    "documind_http_request_seconds": (
+        "histogram", "HTTP request time, until the last byte of the response.", LATENCY_BUCKETS
+    ),
+    "documind_event_loop_lag_seconds": (
+        "histogram", "How late the API event loop wakes up from a short sleep.", LATENCY_BUCKETS
+    ),
+    "documind_chat_tokens_per_second": (
+        "histogram", "Answer streaming rate of /chat, after the first token.", RATE_BUCKETS
+    ),
+    "documind_chat_tokens_total": ("counter", "Answer chunks streamed by /chat.", None),
+    "documind_jobs_total": ("counter", "Background jobs finished, by kind and status.", None),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class MetricsRegistry:
+    # Prometheus-style counters and histograms shared by the API process and
+    # the job workers. Each process collects into memory and flushes what it
+    # gathered into one SQLite file (a scrape flushes the API process, a
+    # worker flushes after every job), where values from all processes are
+    # added up. Totals are cumulative across restarts, like a counter that
+    # never resets.
+
+    def __init__(self, path: str, enabled: bool = True):
+        self.path = path
+        self.enabled = enabled
+        self._pending: Dict[Tuple[str, Labels], list] = {}
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # Opened on first flush, so processes that only record never do
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS metrics ("
+                " name TEXT NOT NULL,"
+                " labels TEXT NOT NULL,"
+                " buckets TEXT NOT NULL,"
+                " sum REAL NOT NULL,"
+                " count REAL NOT NULL,"
+                " PRIMARY KEY (name, labels))"
+            )
+        return self._conn
+
+    def observe(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None:
+                entry = self._pending[key] = [[0] * len(buckets), 0.0, 0]
+            i = bisect.bisect_left(buckets, value)
+            if i < len(buckets):
+                entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def inc(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None:
+                entry = self._pending[key] = [[], 0.0, 0]
+            entry[1] += value
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        conn = self._connect()
+        with self._lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for (name, labels), (counts, total, count) in pending.items():
+                    labels_json = json.dumps(labels)
+                    row = conn.execute(
+                        "SELECT buckets, sum, count FROM metrics WHERE name = ? AND labels = ?",
+                        (name, labels_json),
+                    ).fetchone()
+                    if row is not None:
+                        counts = [a + b for a, b in zip(json.loads(row[0]), counts)] or counts
+                        total += row[1]
+                        count += row[2]
+                    conn.execute(
+                        "INSERT OR REPLACE INTO metrics VALUES (?, ?, ?, ?, ?)",
+                        (name, labels_json, json.dumps(counts), total, count),
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def render(self) -> str:
+        # Prometheus text exposition format, for /metrics
+        self.flush()
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT name, labels, buckets, sum, count FROM metrics ORDER BY name, labels"
+            ).fetchall()
+
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for row_name, labels_json, counts_json, total, count in rows:
+                if row_name != name:
+                    continue
+                labels = [tuple(pair) for pair in json.loads(labels_json)]
+                if kind == "counter":
+                    lines.append(f"{name}{_labels(labels)} {_number(total)}")
+                    continue
+                cumulative = 0
+                for bound, n in zip(buckets, json.loads(counts_json)):
+                    cumulative += n
+                    lines.append(f"{name}_bucket{_labels(labels + [('le', _number(bound))])} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(labels + [('le', '+Inf')])} {_number(count)}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+                lines.append(f"{name}_count{_labels(labels)} {_number(count)}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self._pending = {}
+            self._connect().execute("DELETE FROM metrics")
+
+
+def _labels(labels) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        key + '="' + value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for key, value in labels
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+metrics = MetricsRegistry(settings.METRICS_DB_PATH, enabled=settings.METRICS_ENABLED)
+
+
+class Trace:
+    # The spans of one request, in the order they finished, each with its
+    # offset from the start of the request
+    def __init__(self, name: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.start = time.perf_counter()
+        self.spans: List[Tuple[str, float, float]] = []
+
+    def add(self, name: str, seconds: float):
+        offset = time.perf_counter() - self.start - seconds
+        self.spans.append((name, offset, seconds))
+
+    def describe(self) -> str:
+        return ", ".join(f"{name} {seconds * 1000:.1f} ms @{offset * 1000:.0f}" for name, offset, seconds in self.spans)
+
+
+current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("current_trace", default=None)
+
+
+def record_span(name: str, seconds: float):
+    metrics.observe("documind_span_seconds", seconds, span=name)
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(name, seconds)
+
+
+@contextmanager
+def span(name: str):
+    # with span("ingest.embed"): ...
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - start)
+
+
+class TracingMiddleware:
+    # Gives every HTTP request a trace that the spans recorded while serving
+    # it are added to, returns its ID in X-Trace-Id, and records the request
+    # time (streamed bodies included) per route. Requests slower than
+    # TRACE_SLOW_MS are logged with their spans.
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not metrics.enabled:
+            return await self.app(scope, receive, send)
+
+        trace = Trace(f"{scope['method']} {scope['path']}")
+        token = current_trace.set(trace)
+        status = 500
+
+        async def send_with_trace_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-trace-id", trace.id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        finally:
+            current_trace.reset(token)
+            seconds = time.perf_counter() - trace.start
+            route = _route_label(scope)
+            metrics.observe(
+                "documind_http_request_seconds", seconds, method=scope["method"], route=route, status=status
+            )
+            if settings.TRACE_SLOW_MS and seconds * 1000 >= settings.TRACE_SLOW_MS:
+                logger.warning("Slow request %s (%.0f ms, trace %s): %s",
+                               trace.name, seconds * 1000, trace.id, trace.describe() or "no spans")
+
+
+def _route_label(scope) -> str:
+    # The path with its parameters put back as "{name}", so one label per
+    # route rather than per URL. Built from the request path because the
+    # matched route's own path doesn't include the router prefix.
+    if scope.get("route") is None:
+        return "unmatched"
+    segments = scope["path"].split("/")
+    for name, value in scope.get("path_params", {}).items():
+        value = str(value)
+        for i in range(len(segments) - 1, -1, -1):
+            if segments[i] == value:
+                segments[i] = "{" + name + "}"
+                break
+    return "/".join(segments)
+
+
+class SamplingProfiler:
+    # Samples the stack of every thread each `interval` seconds and counts
+    # them in collapsed form ("thread;outer;...;inner count"), the input of
+    # flamegraph.pl and speedscope. Cheap enough to leave running: the cost
+    # is one stack walk per thread per sample.
+
+    def __init__(self, interval: float = 0.01, max_stacks: int = 20000):
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.samples = 0
+        self._stacks = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own = threading.get_ident()
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            frames.append(names.get(ident, str(ident)))
+            stacks.append(";".join(reversed(frames)))
+        with self._lock:
+            self.samples += 1
+            for stack in stacks:
+                if stack in self._stacks or len(self._stacks) < self.max_stacks:
+                    self._stacks[stack] += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def collapsed(self, reset: bool = False) -> str:
+        with self._lock:
+            # A copy: the sampler thread keeps adding to the live counter
+            stacks = self._stacks.copy()
+            if reset:
+                self._stacks = Counter()
+                self.samples = 0
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+profiler = SamplingProfiler(interval=settings.PROFILER_INTERVAL_MS / 1000)
@@ -0,0 +1,690 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.services.vector_backends import VectorBackend, collection_name
+
+try:
+    import fcntl
+except ImportError:  # Windows: only one process may write
+    fcntl = None
+
+BLOCK_ROWS = 16384  # rows decoded to float32 at a time
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 32
+LISTS_PER_SQRT_ROWS = 2  # IVF lists: this many times the square root of the rows
+DTYPES = ("int8", "float16")
+# Every process with a generation mapped holds a shared lock on this file in
+# its directory; an old generation is only removed once none does
+READERS_FILE = "readers.lock"
+
+
+def _encode(matrix: np.ndarray, dtype: str):
+    # int8: each row scaled so its largest component maps to 127; float16:
+    # stored as is. Returns the codes, the per-row scales and the squared
+    # norms of the vectors the codes decode to.
+    if dtype == "int8":
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    else:
+        scales = np.ones(len(matrix), dtype=np.float32)
+        codes = matrix.astype(np.float16)
+    decoded = codes.astype(np.float32) * scales[:, None]
+    return codes, scales.astype(np.float32), np.einsum("ij,ij->i", decoded, decoded)
+
+
+def _distances(codes, scales, norms, queries):
+    # Squared L2 from each row to each query, less the queries' own norms,
+    # which don't change the ranking: (rows, queries)
+    dots = codes.astype(np.float32) @ queries.T
+    dots *= scales[:, None]
+    return norms[:, None] - 2 * dots
+
+
+def _nearest(matrix, centroids):
+    centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+    nearest = np.empty(len(matrix), dtype=np.int32)
+    for start in range(0, len(matrix), BLOCK_ROWS):
+        block = matrix[start:start + BLOCK_ROWS]
+        nearest[start:start + len(block)] = np.argmin(centroid_norms[None, :] - 2 * (block @ centroids.T), axis=1)
+    return nearest
+
+
+def _kmeans(matrix, lists, rng):
+    centroids = matrix[rng.choice(len(matrix), lists, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assigned = _nearest(matrix, centroids)
+        counts = np.bincount(assigned, minlength=lists)
+        order = np.argsort(assigned, kind="stable")
+        starts = np.searchsorted(assigned[order], np.arange(lists))
+        filled = counts > 0
+        centroids[filled] = np.add.reduceat(matrix[order], starts[filled], axis=0) / counts[filled, None]
+        # Empty lists start over from a random vector
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = matrix[rng.choice(len(matrix), len(empty), replace=False)]
+    return centroids.astype(np.float32)
+
+
+def _memmap(path, dtype, shape):
+    if shape[0] == 0:
+        return np.zeros(shape, dtype=dtype)
+    # A plain ndarray view: slicing a np.memmap costs more than the read
+    return np.asarray(np.memmap(path, dtype=dtype, mode="r", shape=shape))
+
+
+class _Candidates:
+    # The nearest rows seen so far for each query
+    def __init__(self, queries: int, k: int):
+        self.k = k
+        self.rows = [[] for _ in range(queries)]
+        self.distances = [[] for _ in range(queries)]
+
+    def add(self, query: int, rows: np.ndarray, distances: np.ndarray):
+        if len(distances) > self.k:
+            top = np.argpartition(distances, self.k - 1)[:self.k]
+            rows, distances = rows[top], distances[top]
+        self.rows[query].append(rows)
+        self.distances[query].append(distances)
+
+    def result(self, query: int) -> np.ndarray:
+        if not self.rows[query]:
+            return np.empty(0, dtype=np.int64)
+        rows = np.concatenate(self.rows[query])
+        distances = np.concatenate(self.distances[query])
+        keep = np.isfinite(distances)
+        rows, distances = rows[keep], distances[keep]
+        order = np.argsort(distances, kind="stable")[:self.k]
+        return rows[order]
+
+
+class _Tenant:
+    # One tenant's index as of the manifest it was opened with.
+    #
+    # Rows are appended to flat files in a generation directory (codes,
+    # per-row scales and norms, document numbers, deletion flags); SQLite
+    # maps chunk IDs to rows and holds their text and metadata. Rows up to
+    # index["rows"] are also in an IVF index: k-means centroids and a copy of
+    # their codes sorted by nearest centroid, so a query reads a few
+    # contiguous lists. Newer rows are scanned exactly until the next
+    # rebuild. Everything is memory-mapped, so opening costs the same for a
+    # thousand chunks as for millions.
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self.conn = None
+        self._held = None
+        self.rows = 0
+        self.index = None
+        self.manifest = None
+        path = os.path.join(directory, "manifest.json")
+        if os.path.exists(path):
+            with open(path) as f:
+                self.manifest = json.load(f)
+            self._map()
+
+    @property
+    def generation_dir(self):
+        return os.path.join(self.directory, f"gen-{self.manifest['generation']}")
+
+    def _path(self, name):
+        return os.path.join(self.generation_dir, name)
+
+    def _hold(self):
+        # Shared lock on the mapped generation, taken before mapping it and
+        # kept until this object is closed or dropped (closing the file
+        # releases it), so a writer never removes files a search is reading
+        held = self._held
+        if held is not None and held[0] == self.manifest["generation"]:
+            return
+        lock = open(self._path(READERS_FILE), "a")
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_SH)
+        self._held = (self.manifest["generation"], lock)
+        if held is not None:
+            held[1].close()
+
+    def _map(self):
+        self._hold()
+        manifest = self.manifest
+        rows, dim = manifest["rows"], manifest["dim"]
+        self.rows, self.dim, self.dtype = rows, dim, manifest["dtype"]
+        self.codes = _memmap(self._path("codes.bin"), self.dtype, (rows, dim))
+        self.scales = _memmap(self._path("scales.f32"), np.float32, (rows,))
+        self.norms = _memmap(self._path("norms.f32"), np.float32, (rows,))
+        self.docs = _memmap(self._path("docs.i32"), np.int32, (rows,))
+        self.deleted = _memmap(self._path("deleted.u8"), np.uint8, (rows,))
+
+        self.index = manifest.get("index")
+        if self.index is not None:
+            prefix = self._path(f"index-{self.index['id']}")
+            load = lambda name: np.asarray(np.load(f"{prefix}.{name}.npy", mmap_mode="r"))
+            self.centroids = load("centroids")
+            self.centroid_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+            self.offsets = load("offsets")
+            self.list_rows = load("rows")
+            self.list_codes = load("codes")
+            self.list_scales = load("scales")
+            self.list_norms = load("norms")
+
+        if self.conn is None:
+            self.conn = sqlite3.connect(self._path("chunks.sqlite3"), check_same_thread=False, isolation_level=None)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                " row INTEGER PRIMARY KEY,"
+                " id TEXT NOT NULL UNIQUE,"
+                " text TEXT NOT NULL,"
+                " metadata TEXT NOT NULL)"
+            )
+            self.conn.execute("CREATE TABLE IF NOT EXISTS docs (num INTEGER PRIMARY KEY, doc_id TEXT NOT NULL UNIQUE)")
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        if self._held is not None:
+            self._held[1].close()
+            self._held = None
+
+    def _select(self, sql, values):
+        # sql has one "{}" for a list of placeholders
+        results = []
+        with self._lock:
+            for i in range(0, len(values), 5000):
+                part = values[i:i + 5000]
+                results.extend(self.conn.execute(sql.format(",".join("?" * len(part))), part).fetchall())
+        return results
+
+    # Reading
+
+    def count(self) -> int:
+        if self.manifest is None:
+            return 0
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def documents(self, rows) -> List[Document]:
+        found = {
+            row: Document(id=chunk_id, page_content=text, metadata=json.loads(metadata))
+            for row, chunk_id, text, metadata in self._select(
+                "SELECT row, id, text, metadata FROM chunks WHERE row IN ({})", [int(row) for row in rows]
+            )
+        }
+        return [found[int(row)] for row in rows if int(row) in found]
+
+    def rows_for(self, ids) -> dict:
+        if self.manifest is None:
+            return {}
+        return dict(self._select("SELECT id, row FROM chunks WHERE id IN ({})", list(ids)))
+
+    def vectors(self, rows) -> np.ndarray:
+        rows = np.asarray(rows, dtype=np.int64)
+        return self.codes[rows].astype(np.float32) * self.scales[rows][:, None]
+
+    def doc_numbers(self, doc_ids) -> np.ndarray:
+        if self.manifest is None:
+            return np.empty(0, dtype=np.int32)
+        found = self._select("SELECT num FROM docs WHERE doc_id IN ({})", list(doc_ids))
+        return np.asarray([num for num, in found], dtype=np.int32)
+
+    def search(self, queries: np.ndarray, k: int, nprobe: int, doc_filter: Optional[np.ndarray] = None):
+        # Row numbers of the k nearest live rows for each query
+        candidates = _Candidates(len(queries), k)
+        if self.manifest is None or self.rows == 0:
+            return [candidates.result(q) for q in range(len(queries))]
+
+        def masked(rows, distances):
+            hidden = self.deleted[rows] != 0
+            if doc_filter is not None:
+                hidden |= ~np.isin(self.docs[rows], doc_filter)
+            distances[hidden] = np.inf
+            return distances
+
+        tail_start = 0
+        if self.index is not None:
+            tail_start = self.index["rows"]
+            self._search_lists(queries, nprobe, candidates, masked)
+        self._scan(queries, np.arange(len(queries)), tail_start, self.rows, candidates, masked)
+        results = [candidates.result(q) for q in range(len(queries))]
+
+        if doc_filter is not None and self.index is not None:
+            # The probed lists can hold too few chunks of the documents asked
+            # for; look at every row for those queries instead
+            short = [q for q in range(len(queries)) if len(results[q]) < k]
+            if short:
+                retry = _Candidates(len(short), k)
+                self._scan(queries[short], np.arange(len(short)), 0, self.rows, retry, masked)
+                for i, q in enumerate(short):
+                    results[q] = retry.result(i)
+        return results
+
+    def _search_lists(self, queries, nprobe, candidates, masked):
+        probes = min(nprobe, len(self.centroids))
+        distances = self.centroid_norms[None, :] - 2 * (queries @ self.centroids.T)
+        nearest = np.argpartition(distances, probes - 1, axis=1)[:, :probes].ravel()
+        owners = np.repeat(np.arange(len(queries)), probes)
+        # Each list is read once for every query that probes it
+        order = np.argsort(nearest, kind="stable")
+        nearest, owners = nearest[order], owners[order]
+        bounds = np.flatnonzero(np.diff(nearest)) + 1
+        for lists, asking in zip(np.split(nearest, bounds), np.split(owners, bounds)):
+            lo, hi = int(self.offsets[lists[0]]), int(self.offsets[lists[0] + 1])
+            for start in range(lo, hi, BLOCK_ROWS):
+                stop = min(hi, start + BLOCK_ROWS)
+                rows = np.asarray(self.list_rows[start:stop])
+                block = _distances(
+                    self.list_codes[start:stop], self.list_scales[start:stop], self.list_norms[start:stop],
+                    queries[asking]
+                )
+                block = masked(rows, block)
+                for column, query in enumerate(asking):
+                    candidates.add(query, rows, block[:, column])
+
+    def _scan(self, queries, owners, start, stop, candidates, masked):
+        for begin in range(start, stop, BLOCK_ROWS):
+            end = min(stop, begin + BLOCK_ROWS)
+            rows = np.arange(begin, end)
+            block = _distances(self.codes[begin:end], self.scales[begin:end], self.norms[begin:end], queries)
+            block = masked(rows, block)
+            for column, query in enumerate(owners):
+                candidates.add(int(query), rows, block[:, column])
+
+    # Writing; callers hold the tenant's write lock
+
+    def _write_manifest(self):
+        path = os.path.join(self.directory, "manifest.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(path + ".tmp", path)
+        self._map()
+
+    def _files(self):
+        return (
+            ("codes.bin", self.dtype), ("scales.f32", np.float32), ("norms.f32", np.float32),
+            ("docs.i32", np.int32), ("deleted.u8", np.uint8),
+        )
+
+    def _generations(self):
+        return [int(name[4:]) for name in os.listdir(self.directory) if name.startswith("gen-")]
+
+    def create(self, dim: int, dtype: str):
+        # Numbered past any generation a dropped index left for its readers
+        generation = max(self._generations(), default=-1) + 1
+        self.manifest = {"generation": generation, "dim": dim, "dtype": dtype, "rows": 0, "index": None, "deleted": 0}
+        os.makedirs(self.generation_dir, exist_ok=True)
+        self.dtype = dtype
+        for name, _ in self._files():
+            open(self._path(name), "wb").close()
+        self._write_manifest()
+
+    def _repair(self):
+        # An interrupted write can leave rows past the manifest; drop them
+        itemsize = {"codes.bin": self.dim * np.dtype(self.dtype).itemsize}
+        for name, dtype in self._files():
+            size = self.rows * itemsize.get(name, np.dtype(dtype).itemsize)
+            if os.path.getsize(self._path(name)) != size:
+                os.truncate(self._path(name), size)
+        with self._lock:
+            self.conn.execute("DELETE FROM chunks WHERE row >= ?", (self.rows,))
+
+    def deleted_count(self) -> int:
+        # Tombstoned rows, kept in the manifest so maintain() doesn't count
+        # the flags on every write; counted once for indexes that predate it
+        if "deleted" not in self.manifest:
+            self.manifest["deleted"] = int(np.count_nonzero(self.deleted)) if self.rows else 0
+        return self.manifest["deleted"]
+
+    def tombstone(self, rows):
+        # Live rows only (those still in chunks); the caller writes the
+        # manifest with the new count
+        if not rows:
+            return
+        with open(self._path("deleted.u8"), "r+b") as f:
+            for row in sorted(rows):
+                f.seek(row)
+                f.write(b"\x01")
+        self._select("DELETE FROM chunks WHERE row IN ({})", [int(row) for row in rows])
+        self.manifest["deleted"] = self.deleted_count() + len(rows)
+
+    def remove(self, ids):
+        rows = list(self.rows_for(ids).values())
+        self.tombstone(rows)
+        if rows:
+            self._write_manifest()
+
+    def append(self, ids, matrix, texts, metadatas):
+        self._repair()
+        self.tombstone(list(self.rows_for(ids).values()))
+
+        doc_ids = [metadata.get("doc_id") for metadata in metadatas]
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO docs (doc_id) VALUES (?)", [(d,) for d in set(doc_ids) if d is not None]
+            )
+        numbers = dict(self._select("SELECT doc_id, num FROM docs WHERE doc_id IN ({})",
+                                    [d for d in set(doc_ids) if d is not None]))
+        codes, scales, norms = _encode(matrix, self.dtype)
+        columns = {
+            "codes.bin": codes, "scales.f32": scales, "norms.f32": norms.astype(np.float32),
+            "docs.i32": np.asarray([numbers.get(d, -1) for d in doc_ids], dtype=np.int32),
+            "deleted.u8": np.zeros(len(ids), dtype=np.uint8),
+        }
+        for name, values in columns.items():
+            with open(self._path(name), "ab") as f:
+                f.write(np.ascontiguousarray(values).tobytes())
+
+        first = self.rows
+        with self._lock:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                "INSERT INTO chunks VALUES (?, ?, ?, ?)",
+                [(first + i, chunk_id, text, json.dumps(metadata))
+                 for i, (chunk_id, text, metadata) in enumerate(zip(ids, texts, metadatas))]
+            )
+            self.conn.execute("COMMIT")
+        self.manifest["rows"] = first + len(ids)
+        self._write_manifest()
+
+    def maintain(self, min_rows: int):
+        # Keeps the IVF index worth probing as rows come and go: trained once
+        # there are min_rows live rows, retrained after they have grown four
+        # times over, rebuilt once the exactly-scanned tail passes 2% of the
+        # index, and the files compacted once most rows are deleted
+        deleted = self.deleted_count()
+        live = self.rows - deleted
+        if deleted > live and self.rows >= min_rows:
+            self._compact()
+        index = self.index
+        if live < min_rows:
+            if index is not None:
+                self._set_index(None)
+            return
+        if index is None or live > 4 * index["trained"]:
+            self._build_index(retrain=True)
+        elif self.rows - index["rows"] > max(1000, index["rows"] // 50):
+            self._build_index(retrain=False)
+
+    def _set_index(self, index):
+        old = self.index
+        self.manifest["index"] = index
+        self._write_manifest()
+        if old is not None:
+            for name in ("centroids", "offsets", "rows", "codes", "scales", "norms"):
+                try:
+                    os.remove(self._path(f"index-{old['id']}.{name}.npy"))
+                except FileNotFoundError:
+                    pass
+
+    def _build_index(self, retrain: bool):
+        rng = np.random.default_rng(self.rows)
+        live_rows = np.flatnonzero(np.asarray(self.deleted) == 0)
+        if retrain:
+            lists = max(1, int(round(LISTS_PER_SQRT_ROWS * np.sqrt(len(live_rows)))))
+            sample = np.sort(rng.choice(live_rows, min(len(live_rows), lists * KMEANS_SAMPLE_PER_LIST), replace=False))
+            centroids = _kmeans(self.vectors(sample), lists, rng)
+            rows, assigned = live_rows, np.empty(len(live_rows), dtype=np.int32)
+            trained = len(live_rows)
+            start = 0
+        else:
+            # Only the tail is new; what is already in lists stays there
+            centroids = np.asarray(self.centroids)
+            lists = len(centroids)
+            indexed = np.asarray(self.list_rows)
+            indexed_lists = np.repeat(np.arange(lists, dtype=np.int32), np.diff(self.offsets))
+            keep = np.asarray(self.deleted)[indexed] == 0
+            tail = live_rows[live_rows >= self.index["rows"]]
+            rows = np.concatenate([indexed[keep], tail])
+            assigned = np.concatenate([indexed_lists[keep], np.empty(len(tail), dtype=np.int32)])
+            trained = self.index["trained"]
+            start = int(np.count_nonzero(keep))
+        for begin in range(start, len(rows), BLOCK_ROWS):
+            end = min(len(rows), begin + BLOCK_ROWS)
+            assigned[begin:end] = _nearest(self.vectors(rows[begin:end]), centroids)
+
+        order = np.lexsort((rows, assigned))
+        rows, assigned = rows[order], assigned[order]
+        index_id = (self.index["id"] + 1) if self.index is not None else 0
+        prefix = self._path(f"index-{index_id}")
+        np.save(f"{prefix}.centroids.npy", centroids)
+        np.save(f"{prefix}.offsets.npy", np.searchsorted(assigned, np.arange(lists + 1)).astype(np.int64))
+        np.save(f"{prefix}.rows.npy", rows.astype(np.int64))
+        outputs = {
+            "codes": (self.codes, (len(rows), self.dim)),
+            "scales": (self.scales, (len(rows),)),
+            "norms": (self.norms, (len(rows),)),
+        }
+        for name, (source, shape) in outputs.items():
+            target = np.lib.format.open_memmap(f"{prefix}.{name}.npy", mode="w+", dtype=source.dtype, shape=shape)
+            for begin in range(0, len(rows), BLOCK_ROWS):
+                target[begin:begin + BLOCK_ROWS] = source[rows[begin:begin + BLOCK_ROWS]]
+            target.flush()
+            del target
+        self._set_index({"id": index_id, "rows": self.rows, "lists": lists, "trained": trained})
+
+    def _compact(self):
+        # Copies the live rows into a new generation, numbered from zero
+        live = np.flatnonzero(np.asarray(self.deleted) == 0)
+        old_conn = self.conn
+        generation = self.manifest["generation"] + 1
+        new_dir = os.path.join(self.directory, f"gen-{generation}")
+        os.makedirs(new_dir, exist_ok=True)
+
+        sources = {"codes.bin": self.codes, "scales.f32": self.scales, "norms.f32": self.norms,
+                   "docs.i32": self.docs}
+        for name, source in sources.items():
+            with open(os.path.join(new_dir, name), "wb") as f:
+                for begin in range(0, len(live), BLOCK_ROWS):
+                    f.write(np.ascontiguousarray(source[live[begin:begin + BLOCK_ROWS]]).tobytes())
+        with open(os.path.join(new_dir, "deleted.u8"), "wb") as f:
+            f.write(bytes(len(live)))
+
+        conn = sqlite3.connect(os.path.join(new_dir, "chunks.sqlite3"), isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE chunks (row INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE,"
+            " text TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        conn.execute("CREATE TABLE docs (num INTEGER PRIMARY KEY, doc_id TEXT NOT NULL UNIQUE)")
+        conn.execute("BEGIN")
+        with self._lock:
+            conn.executemany("INSERT INTO docs VALUES (?, ?)", old_conn.execute("SELECT num, doc_id FROM docs"))
+            last = -1
+            while True:
+                page = old_conn.execute(
+                    "SELECT row, id, text, metadata FROM chunks WHERE row > ? ORDER BY row LIMIT 5000", (last,)
+                ).fetchall()
+                if not page:
+                    break
+                renumbered = np.searchsorted(live, [row for row, *_ in page])
+                conn.executemany(
+                    "INSERT INTO chunks VALUES (?, ?, ?, ?)",
+                    [(int(new), *rest) for new, (_, *rest) in zip(renumbered, page)]
+                )
+                last = page[-1][0]
+        conn.execute("COMMIT")
+        conn.close()
+
+        self.close()
+        self.manifest = {
+            **self.manifest, "generation": generation, "rows": len(live), "index": None, "deleted": 0
+        }
+        self._write_manifest()
+        # Searches still on the old generation keep it until they reopen;
+        # whichever write comes after that removes it
+        self.sweep()
+
+    def retire(self):
+        # Drops the whole index: without a manifest, new readers find it
+        # empty; the generations go as soon as no search has them mapped
+        self.close()
+        os.remove(os.path.join(self.directory, "manifest.json"))
+        self.manifest = None
+        self.sweep()
+
+    def sweep(self):
+        # Removes older generations (all of them once the index is retired)
+        # that no process has mapped any more
+        current = self.manifest["generation"] if self.manifest is not None else None
+        for generation in self._generations():
+            if current is not None and generation >= current:
+                continue
+            path = os.path.join(self.directory, f"gen-{generation}")
+            try:
+                lock = open(os.path.join(path, READERS_FILE), "a")
+            except FileNotFoundError:
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            with lock:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue
+                shutil.rmtree(path, ignore_errors=True)
+
+
+class MmapVectorBackend(VectorBackend):
+    # Embeddings stored as int8 (or float16) in memory-mapped files, with an
+    # IVF index once a tenant is large enough to need one; see _Tenant.
+    # Searches take a batch of queries and run on numpy, which releases the
+    # GIL, so parallel queries from the offload threads run side by side.
+    # Several processes can write: each write holds the tenant's lock file.
+    name = "mmap"
+
+    def __init__(self, directory: str, dtype: str = "int8", nprobe: int = 16, min_rows: int = 10000):
+        if dtype not in DTYPES:
+            raise ValueError(f"VECTOR_INDEX_DTYPE must be one of {', '.join(DTYPES)}, not {dtype!r}")
+        self.directory = directory
+        self.dtype = dtype
+        self.nprobe = nprobe
+        self.min_rows = min_rows
+        self._tenants = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _directory(self, tenant):
+        return os.path.join(self.directory, collection_name(tenant))
+
+    def _tenant(self, tenant) -> _Tenant:
+        with self._lock:
+            index = self._tenants.get(tenant)
+            if index is not None:
+                return index
+            for attempt in range(3):
+                try:
+                    index = _Tenant(self._directory(tenant))
+                    break
+                except (FileNotFoundError, sqlite3.OperationalError):
+                    # A writer replaced the files between reading the
+                    # manifest and mapping them; the new manifest is there
+                    if attempt == 2:
+                        raise
+            self._tenants[tenant] = index
+            return index
+
+    @contextmanager
+    def _writing(self, tenant):
+        directory = self._directory(tenant)
+        os.makedirs(directory, exist_ok=True)
+        with self._write_lock, open(os.path.join(directory, "lock"), "a+") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            # Opened under the lock: sees what other processes wrote last
+            writer = _Tenant(directory)
+            try:
+                writer.sweep()
+                yield writer
+            finally:
+                writer.close()
+                with self._lock:
+                    self._tenants.pop(tenant, None)
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def upsert(self, tenant, ids, embeddings, texts, metadatas):
+        # Last one wins when an ID repeats within the batch
+        latest = {chunk_id: i for i, chunk_id in enumerate(ids)}
+        keep = sorted(latest.values())
+        ids = [ids[i] for i in keep]
+        matrix = np.asarray(embeddings, dtype=np.float32)[keep]
+        texts = [texts[i] for i in keep]
+        metadatas = [metadatas[i] or {} for i in keep]
+        with self._writing(tenant) as writer:
+            if writer.manifest is None:
+                writer.create(matrix.shape[1], self.dtype)
+            elif writer.dim != matrix.shape[1]:
+                raise ValueError(f"Embeddings have {matrix.shape[1]} dimensions; this index has {writer.dim}")
+            writer.append(ids, matrix, texts, metadatas)
+            writer.maintain(self.min_rows)
+
+    def delete(self, tenant, ids):
+        with self._writing(tenant) as writer:
+            if writer.manifest is None:
+                return
+            writer.remove(ids)
+            writer.maintain(self.min_rows)
+
+    def query(self, tenant, embeddings, k, doc_ids=None):
+        index = self._tenant(tenant)
+        queries = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+        doc_filter = None
+        if doc_ids is not None:
+            doc_filter = index.doc_numbers(doc_ids)
+            if not len(doc_filter):
+                return [[] for _ in range(len(queries))]
+        return [index.documents(rows) for rows in index.search(queries, k, self.nprobe, doc_filter)]
+
+    def get(self, tenant, ids):
+        index = self._tenant(tenant)
+        rows = index.rows_for(ids)
+        return index.documents([rows[chunk_id] for chunk_id in ids if chunk_id in rows])
+
+    def get_embeddings(self, tenant, ids):
+        index = self._tenant(tenant)
+        rows = index.rows_for(ids)
+        # Rows written after this process last opened the index aren't mapped
+        found = [chunk_id for chunk_id in ids if rows.get(chunk_id, index.rows) < index.rows]
+        if not found:
+            return [], []
+        return found, index.vectors([rows[chunk_id] for chunk_id in found])
+
+    def iter_chunks(self, tenant, batch_size=5000):
+        index = self._tenant(tenant)
+        if index.manifest is None:
+            return
+        last = -1
+        while True:
+            with index._lock:
+                page = index.conn.execute(
+                    "SELECT row, id, text, metadata FROM chunks WHERE row > ? ORDER BY row LIMIT ?",
+                    (last, batch_size)
+                ).fetchall()
+            if not page:
+                return
+            yield [row[1] for row in page], [row[2] for row in page], [json.loads(row[3]) for row in page]
+            last = page[-1][0]
+
+    def count(self, tenant):
+        return self._tenant(tenant).count()
+
+    def drop(self, tenant):
+        # Goes through the generations' reader locks like compaction does,
+        # so searches still running on the old files finish undisturbed
+        with self._writing(tenant) as writer:
+            if writer.manifest is not None:
+                writer.retire()
+
+    def reopen(self):
+        with self._lock:
+            self._tenants = {}
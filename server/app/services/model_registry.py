@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.ollama_client import get_http_client
+
+logger = logging.getLogger(__name__)
+
+# Loaded models change on their own (Ollama unloads idle ones), so /api/ps
+# is only reused briefly
+LOADED_TTL = 5.0
+# A model missing from the cached tag list refetches it, at most this often,
+# in case it was pulled since
+MISS_REFRESH_SECONDS = 5.0
+
+
+def model_key(name: str) -> str:
+    # "llama3" and "llama3:latest" are the same model to Ollama
+    return name if ":" in name else f"{name}:latest"
+
+
+def is_embedding_model(name: str) -> bool:
+    return "embed" in name or "nomic" in name
+
+
+class ModelUnavailable(Exception):
+    pass
+
+
+class CoalescedCache:
+    # One value fetched from upstream and reused for `ttl` seconds. Callers
+    # that arrive while it's being fetched wait for that same request rather
+    # than sending their own.
+
+    def __init__(self, fetch, ttl: float):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.value = None
+        self.fetches = 0
+        self._fetched = None
+        self._pending = None
+
+    def age(self) -> float:
+        return float("inf") if self._fetched is None else time.monotonic() - self._fetched
+
+    def invalidate(self):
+        self._fetched = None
+
+    async def get(self, max_age: Optional[float] = None):
+        if self.age() < (self.ttl if max_age is None else max_age):
+            return self.value
+        if self._pending is None:
+            self._pending = asyncio.ensure_future(self._refresh())
+        # A caller that gives up doesn't cancel the fetch for the others
+        return await asyncio.shield(self._pending)
+
+    async def _refresh(self):
+        try:
+            self.fetches += 1
+            self.value = await self.fetch()
+            self._fetched = time.monotonic()
+            return self.value
+        finally:
+            self._pending = None
+
+
+def _expires_in(entry: Optional[dict]) -> Optional[float]:
+    # Seconds until Ollama unloads a loaded model; None if it isn't loaded
+    if entry is None:
+        return None
+    try:
+        expires = datetime.fromisoformat(entry["expires_at"].replace("Z", "+00:00"))
+        return (expires - datetime.now(timezone.utc)).total_seconds()
+    except (KeyError, AttributeError, TypeError, ValueError):
+        return 0.0
+
+
+class ModelRegistry:
+    # What Ollama can serve (/api/tags) and what it has loaded (/api/ps),
+    # cached and shared by every request. Models used within `keep_warm`
+    # seconds are checked every `interval` seconds and pinged with
+    # `keep_alive` when Ollama would otherwise unload them before the next
+    # check, so switching back to a model doesn't pay for loading it again.
+
+    def __init__(self, catalog_ttl: float, keep_warm: float, interval: float, keep_alive: str):
+        self.catalog = CoalescedCache(self._fetch_catalog, catalog_ttl)
+        self.loaded = CoalescedCache(self._fetch_loaded, min(catalog_ttl, LOADED_TTL))
+        self.keep_warm = keep_warm
+        self.interval = interval
+        self.keep_alive = keep_alive
+        self.pings = 0
+        # model -> (last used, embedding model)
+        self._used: Dict[str, Tuple[float, bool]] = {}
+        self._task = None
+
+    async def _fetch_catalog(self) -> Dict[str, dict]:
+        response = await get_http_client().get("/api/tags")
+        response.raise_for_status()
+        return {model_key(model["name"]): model for model in response.json().get("models", [])}
+
+    async def _fetch_loaded(self) -> Dict[str, dict]:
+        response = await get_http_client().get("/api/ps")
+        response.raise_for_status()
+        return {model_key(model["name"]): model for model in response.json().get("models", [])}
+
+    async def chat_models(self) -> List[str]:
+        catalog = await self.catalog.get()
+        return [model["name"] for model in catalog.values() if not is_embedding_model(model["name"])]
+
+    async def loaded_models(self) -> List[str]:
+        try:
+            loaded = await self.loaded.get()
+        except Exception as e:
+            # Older Ollama versions have no /api/ps
+            logger.debug("Could not list loaded models: %s", e)
+            return []
+        return sorted(model["name"] for model in loaded.values())
+
+    async def require_chat_model(self, name: str):
+        # Raises ModelUnavailable unless Ollama has the model and can chat
+        # with it; errors reaching Ollama propagate
+        key = model_key(name)
+        catalog = await self.catalog.get()
+        if key not in catalog:
+            catalog = await self.catalog.get(max_age=MISS_REFRESH_SECONDS)
+        if key not in catalog or is_embedding_model(key):
+            raise ModelUnavailable(name)
+
+    def touch(self, name: str, embedding: bool = False):
+        self._used[model_key(name)] = (time.monotonic(), embedding)
+
+    async def ping(self, name: str, embedding: bool = False):
+        # Loads the model if it isn't, and keeps it loaded for keep_alive
+        if embedding:
+            payload = {"model": name, "input": "keep-alive", "keep_alive": self.keep_alive}
+            response = await get_http_client().post("/api/embed", json=payload)
+        else:
+            payload = {"model": name, "keep_alive": self.keep_alive}
+            response = await get_http_client().post("/api/generate", json=payload)
+        response.raise_for_status()
+        self.pings += 1
+        self.loaded.invalidate()
+
+    async def load(self, name: str, embedding: bool = False):
+        # Loads a model now and keeps it warm as if it had just been used
+        self.touch(name, embedding)
+        await self.ping(name, embedding)
+
+    async def keep_warm_once(self):
+        now = time.monotonic()
+        recent = {}
+        for name, (used, embedding) in list(self._used.items()):
+            if now - used <= self.keep_warm:
+                recent[name] = embedding
+            else:
+                self._used.pop(name, None)
+        if not recent:
+            return
+
+        try:
+            loaded = await self.loaded.get(max_age=0)
+        except Exception as e:
+            # Without /api/ps every recent model gets its ping
+            logger.debug("Could not list loaded models: %s", e)
+            loaded = {}
+        for name, embedding in recent.items():
+            remaining = _expires_in(loaded.get(name))
+            if remaining is not None and remaining > 2 * self.interval:
+                continue
+            try:
+                await self.ping(name, embedding)
+            except Exception as e:
+                logger.warning("Keep-alive ping for %s failed: %s", name, e)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.keep_warm_once()
+            except Exception as e:
+                logger.warning("Keeping models warm failed: %s", e)
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+
+model_registry = ModelRegistry(
+    catalog_ttl=settings.MODEL_CATALOG_TTL,
+    keep_warm=settings.MODEL_KEEP_WARM_SECONDS,
+    interval=settings.MODEL_KEEP_ALIVE_INTERVAL,
+    keep_alive=settings.OLLAMA_KEEP_ALIVE
+)
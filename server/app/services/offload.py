@@ -0,0 +1,157 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import multiprocessing
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from app.core.config import settings
+from app.services.metrics import metrics
+from app.services.timings import StageTimings
+
+logger = logging.getLogger(__name__)
+
+# Blocking work called from async code runs in a bounded pool per kind of
+# work, so one kind can't take the threads another needs (a burst of
+# uploads can't hold up chat retrieval):
+#   store: Chroma, the SQLite registries and caches
+#   io:    files, and client libraries that block on the network
+#   cpu:   parsing (PDF, HTML); worker processes, so it doesn't hold the GIL
+#   tts:   speech synthesis
+WORKLOADS = ("store", "io", "cpu", "tts")
+
+_executors = {}
+_lock = threading.Lock()
+
+
+def _workers(workload: str) -> int:
+    return {
+        "store": settings.OFFLOAD_STORE_WORKERS,
+        "io": settings.OFFLOAD_IO_WORKERS,
+        "cpu": settings.OFFLOAD_CPU_PROCESSES,
+        "tts": settings.TTS_STREAM_CONCURRENCY,
+    }[workload]
+
+
+def get_executor(workload: str) -> Executor:
+    if workload not in WORKLOADS:
+        raise ValueError(f"Unknown workload {workload!r}; expected one of {', '.join(WORKLOADS)}")
+    with _lock:
+        executor = _executors.get(workload)
+        if executor is None:
+            workers = max(1, _workers(workload))
+            if workload == "cpu":
+                # spawn, like the PDF extraction pool: the workers don't
+                # inherit the server's threads. Functions and arguments
+                # sent here must be picklable (module-level functions).
+                executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            else:
+                executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"offload-{workload}")
+            _executors[workload] = executor
+    return executor
+
+
+async def offload(workload: str, func, *args, **kwargs):
+    # await offload("store", vector_store.clear, tenant)
+    loop = asyncio.get_running_loop()
+    call = functools.partial(func, *args, **kwargs)
+    if workload != "cpu":
+        # Threads see the caller's context, so spans land in its request trace
+        call = functools.partial(contextvars.copy_context().run, call)
+    return await loop.run_in_executor(get_executor(workload), call)
+
+
+def shutdown():
+    with _lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+class LoopLagMonitor:
+    # Measures how late the event loop wakes up from a short sleep: the
+    # overshoot is time some callback spent blocking it. A watchdog thread
+    # logs the loop thread's stack when the loop hasn't run for `threshold`
+    # seconds, which names the call that is blocking it.
+
+    def __init__(self, interval: float = 0.05, threshold: float = 0.1):
+        self.interval = interval
+        self.threshold = threshold
+        self.timings = StageTimings()
+        self.stalls = 0
+        self.max_lag = 0.0
+        self._beat = time.monotonic()
+        self._task = None
+        self._thread = None
+        self._loop_thread = None
+        self._stop = threading.Event()
+
+    async def _tick(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self._beat = now = time.monotonic()
+            lag = max(0.0, now - start - self.interval)
+            self.timings.record("loop_lag", lag)
+            metrics.observe("documind_event_loop_lag_seconds", lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.threshold:
+                self.stalls += 1
+
+    def _watch(self):
+        reported = False
+        while not self._stop.wait(self.interval):
+            blocked = time.monotonic() - self._beat - self.interval
+            if blocked < self.threshold:
+                reported = False
+                continue
+            if reported:
+                continue
+            # Once per stall: the stack at the moment it was caught
+            reported = True
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "unavailable\n"
+            logger.warning("Event loop blocked for %.0f ms so far, in:\n%s", blocked * 1000, stack)
+
+    def start(self):
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._tick())
+        self._thread = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    def reset(self):
+        self.timings = StageTimings()
+        self.stalls = 0
+        self.max_lag = 0.0
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self._task is not None,
+            "threshold_ms": self.threshold * 1000,
+            "stalls": self.stalls,
+            "max_lag_ms": round(self.max_lag * 1000, 3),
+            **self.timings.stats().get("loop_lag", {}),
+        }
+
+
+loop_monitor = LoopLagMonitor(threshold=settings.LOOP_LAG_THRESHOLD_MS / 1000)
@@ -0,0 +1,50 @@
+import threading
+
+import httpx
+
+from app.core.config import settings
+
+# One connection pool to Ollama for the whole process. ChatOllama instances
+# are built on the shared transport, and our own calls to the Ollama API go
+# through the shared client, so requests reuse warm keep-alive connections
+# instead of opening a new one each time.
+_transport = None
+_client = None
+# Also built from threads (the warm-up, chains compiled off the event loop)
+_lock = threading.Lock()
+
+
+def get_transport() -> httpx.AsyncHTTPTransport:
+    global _transport
+    with _lock:
+        if _transport is None:
+            _transport = httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(
+                    max_connections=settings.OLLAMA_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+                )
+            )
+    return _transport
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global _client
+    transport = get_transport()
+    with _lock:
+        if _client is None:
+            _client = httpx.AsyncClient(
+                base_url=settings.OLLAMA_BASE_URL,
+                transport=transport,
+                timeout=httpx.Timeout(30.0, read=None),
+            )
+    return _client
+
+
+async def close():
+    global _client, _transport
+    if _client is not None:
+        await _client.aclose()
+    elif _transport is not None:
+        await _transport.aclose()
+    _client = None
+    _transport = None
@@ -0,0 +1,125 @@
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Optional, Tuple
+
+from app.core.config import settings
+from app.services.extraction import CACHE_READ_PAGES, analyze, extract_page_range, get_page_cache, hash_file
+from app.services.metrics import record_span
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _worker_count() -> int:
+    return settings.INGEST_WORKERS or os.cpu_count() or 1
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    # One shared pool for the whole process; spawn keeps the workers free of
+    # the parent's threads (uvicorn, chromadb) and they only ever import
+    # fitz and the extraction code.
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=_worker_count(),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+    return _executor
+
+
+def page_count(file_path: str, file_hash: Optional[str] = None) -> int:
+    return analyze(file_path, file_hash or hash_file(file_path))[0]
+
+
+def _missing_ranges(page_count: int, cached, step: int) -> Iterator[Tuple[int, int]]:
+    # Runs of pages not in the cache, at most `step` pages each
+    start = None
+    for page_num in range(page_count + 1):
+        missing = page_num < page_count and page_num not in cached
+        if missing and start is None:
+            start = page_num
+        if start is not None and (not missing or page_num - start == step):
+            yield start, page_num
+            start = page_num if missing else None
+
+
+def iter_page_texts(file_path: str, file_hash: Optional[str] = None) -> Iterator[Tuple[int, str]]:
+    # Yields (page_num, text) in page order. Pages already in the extraction
+    # cache come straight from it; the rest are extracted in parallel, and
+    # cached as they arrive. At most two ranges per worker are in flight at
+    # once and cached pages are read CACHE_READ_PAGES at a time, so memory
+    # stays flat no matter how many pages the document has.
+    file_hash = file_hash or hash_file(file_path)
+    page_count, boilerplate = analyze(file_path, file_hash)
+    cache = get_page_cache()
+    cached = cache.cached_pages(file_hash) if cache is not None else set()
+    options = (boilerplate, settings.EXTRACTION_DETECT_TABLES)
+
+    step = max(1, settings.INGEST_PAGES_PER_TASK)
+    ranges = list(_missing_ranges(page_count, cached, step))
+
+    def extracted(timed):
+        pages, seconds = timed
+        record_span("ingest.extract", seconds)
+        if cache is not None:
+            cache.put_pages(file_hash, pages)
+        return pages
+
+    # Not worth shipping a short document to another process
+    if sum(end - start for start, end in ranges) <= step:
+        results = iter(
+            extracted(_timed_extract(file_path, start, end, *options)) for start, end in ranges
+        )
+    else:
+        results = _extract_in_pool(file_path, ranges, options, extracted)
+
+    window = {}
+
+    def from_cache(page_num):
+        nonlocal window
+        if page_num not in window:
+            window = cache.get_pages(file_hash, page_num, page_num + CACHE_READ_PAGES)
+        text = window.pop(page_num, None)
+        if text is None:
+            # Evicted since the cached page numbers were read
+            text = extract_page_range(file_path, page_num, page_num + 1, *options)[0][1]
+        return text
+
+    next_page = 0
+    for pages in results:
+        for page_num, text in pages:
+            while next_page < page_num:
+                yield next_page, from_cache(next_page)
+                next_page += 1
+            yield page_num, text
+            next_page = page_num + 1
+    while next_page < page_count:
+        yield next_page, from_cache(next_page)
+        next_page += 1
+
+
+def _timed_extract(file_path, start, end, *options):
+    # (pages, seconds); timed where it runs, since pool workers don't
+    # record metrics themselves
+    began = time.perf_counter()
+    pages = extract_page_range(file_path, start, end, *options)
+    return pages, time.perf_counter() - began
+
+
+def _extract_in_pool(file_path, ranges, options, extracted):
+    executor = _get_executor()
+    max_in_flight = _worker_count() * 2
+    pending = deque()
+
+    for start, end in ranges:
+        pending.append(executor.submit(_timed_extract, file_path, start, end, *options))
+        if len(pending) >= max_in_flight:
+            yield extracted(pending.popleft().result())
+
+    while pending:
+        yield extracted(pending.popleft().result())
@@ -0,0 +1,65 @@
+import asyncio
+import logging
+from typing import List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+QUESTION_PROMPT = """Based on the following document excerpt, generate 3 short, interesting questions that a user might ask to learn more about the content.
+    Return ONLY the questions, one per line.
+
+    Excerpt:
+    {text}
+    """
+
+_question_chain = None
+
+
+def question_chain():
+    # Built once per worker process; LangChain is only imported here
+    global _question_chain
+    if _question_chain is None:
+        from langchain_ollama import ChatOllama
+        from langchain_core.prompts import ChatPromptTemplate
+
+        llm = ChatOllama(
+            base_url=settings.OLLAMA_BASE_URL,
+            model=settings.CHAT_MODEL,
+            temperature=0.7
+        )
+        _question_chain = ChatPromptTemplate.from_template(QUESTION_PROMPT) | llm
+    return _question_chain
+
+
+def generate_questions(text: str) -> List[str]:
+    try:
+        response = question_chain().invoke({"text": text[:2000]})
+        return [q.strip() for q in response.content.split('\n') if q.strip()]
+    except Exception as e:
+        logger.warning("Generating questions failed: %s", e)
+        return []
+
+
+async def _page_sample(url: str) -> str:
+    from app.services.crawler import fetch, html_to_page, new_web_client
+
+    async with new_web_client() as client:
+        response = await fetch(client, url)
+    page, _ = html_to_page(response.url, response.body)
+    return page.text[:2000]
+
+
+def suggest_questions(text: str = "", url: Optional[str] = None, progress=None) -> dict:
+    # Job handler: suggested questions for a new upload, from a sample of
+    # its text or, for a web page, from the page itself. The page goes
+    # through the shared response cache, so the ingestion job queued after
+    # this one doesn't download it again.
+    if url is not None:
+        try:
+            text = asyncio.run(_page_sample(url))
+        except Exception as e:
+            logger.warning("Sampling %s failed: %s", url, e)
+            text = ""
+    questions = generate_questions(text) if text else []
+    return {"suggested_questions": questions[:3]}
@@ -0,0 +1,153 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+
+class ScoreCache:
+    # LRU of reranker scores keyed by (query, chunk). Chunk IDs are
+    # content-addressed, so a cached score stays valid across re-ingestion.
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(query: str, doc: Document) -> str:
+        chunk = doc.id or hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+        return hashlib.sha256(f"{query}\0{chunk}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> List[Optional[float]]:
+        with self._lock:
+            scores = []
+            for key in keys:
+                score = self._items.get(key)
+                if score is not None:
+                    self._items.move_to_end(key)
+                scores.append(score)
+            hits = sum(score is not None for score in scores)
+            self.hits += hits
+            self.misses += len(keys) - hits
+            return scores
+
+    def put_many(self, keys: List[str], scores: List[float]):
+        with self._lock:
+            for key, score in zip(keys, scores):
+                self._items[key] = score
+                self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._items),
+            }
+
+
+class CrossEncoderReranker:
+    # Scores (query, chunk) pairs with a small cross-encoder exported to ONNX
+    # (e.g. cross-encoder/ms-marco-MiniLM-L-6-v2) on the CPU. onnxruntime and
+    # tokenizers already come with chromadb. Candidates are split into
+    # batches that run concurrently on a thread pool; onnxruntime releases
+    # the GIL while it runs, so batches really do overlap.
+    #
+    # `model` is either a local directory holding tokenizer.json and the
+    # ONNX file, or a Hugging Face repo to download them from.
+
+    def __init__(self, model: str, onnx_file: str = "onnx/model.onnx", batch_size: int = 16,
+                 workers: int = 2, threads: int = 0, max_length: int = 512, cache_size: int = 10000):
+        self.model = model
+        self.onnx_file = onnx_file
+        self.batch_size = batch_size
+        self.threads = threads
+        self.max_length = max_length
+        self.cache = ScoreCache(cache_size)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="rerank")
+        self._session = None
+        self._tokenizer = None
+        self._load_lock = threading.Lock()
+
+    def _resolve(self, filename: str) -> str:
+        if os.path.isdir(self.model):
+            return os.path.join(self.model, filename)
+        from huggingface_hub import hf_hub_download
+        return hf_hub_download(self.model, filename)
+
+    def _load(self):
+        # Loaded on first use: the model is only needed once someone queries
+        with self._load_lock:
+            if self._session is not None:
+                return
+            import onnxruntime
+            from tokenizers import Tokenizer
+
+            tokenizer = Tokenizer.from_file(self._resolve("tokenizer.json"))
+            tokenizer.enable_truncation(max_length=self.max_length)
+            tokenizer.enable_padding()
+
+            options = onnxruntime.SessionOptions()
+            if self.threads:
+                options.intra_op_num_threads = self.threads
+            session = onnxruntime.InferenceSession(
+                self._resolve(self.onnx_file), options, providers=["CPUExecutionProvider"]
+            )
+            self._inputs = {item.name for item in session.get_inputs()}
+            self._tokenizer = tokenizer
+            self._session = session
+
+    def _score_batch(self, query: str, texts: List[str]) -> np.ndarray:
+        encodings = self._tokenizer.encode_batch([(query, text) for text in texts])
+        features = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        logits = self._session.run(None, {name: value for name, value in features.items() if name in self._inputs})[0]
+        return logits.reshape(len(texts), -1)[:, 0]
+
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        if not texts:
+            return []
+        self._load()
+        futures = [
+            self._executor.submit(self._score_batch, query, texts[i:i + self.batch_size])
+            for i in range(0, len(texts), self.batch_size)
+        ]
+        return [float(score) for future in futures for score in future.result()]
+
+    def rerank(self, query: str, documents: List[Document], k: int) -> List[Document]:
+        keys = [self.cache.make_key(query, doc) for doc in documents]
+        scores = self.cache.get_many(keys)
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            fresh = self.score(query, [documents[i].page_content for i in missing])
+            self.cache.put_many([keys[i] for i in missing], fresh)
+            for i, score in zip(missing, fresh):
+                scores[i] = score
+
+        order = sorted(range(len(documents)), key=lambda i: scores[i], reverse=True)[:k]
+        ranked = []
+        for i in order:
+            doc = documents[i]
+            doc.metadata["rerank_score"] = scores[i]
+            ranked.append(doc)
+        return ranked
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,27 @@
+from typing import Any, List, Optional
+
+from langchain_core.retrievers import BaseRetriever
+
+from app.services.document_registry import DEFAULT_TENANT
+from app.services.offload import offload
+
+
+class StoreRetriever(BaseRetriever):
+    # Goes through the service on every query instead of binding to one
+    # collection, so long-lived chains keep working across refresh/clear.
+    # tenant and doc_ids scope the search.
+    service: Any
+    k: int = 4
+    tenant: str = DEFAULT_TENANT
+    doc_ids: Optional[List[str]] = None
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        return self.service.retrieve(
+            query, k=self.k, tenant=self.tenant, doc_ids=self.doc_ids
+        )
+
+    async def _aget_relevant_documents(self, query, *, run_manager):
+        # Chat runs the chain async; keep the search off the event loop
+        return await offload(
+            "store", self.service.retrieve, query, k=self.k, tenant=self.tenant, doc_ids=self.doc_ids
+        )
@@ -0,0 +1,286 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, SystemMessage, messages_from_dict, messages_to_dict
+
+from app.core.config import settings
+from app.services.tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# (previous summary, messages to fold in) -> new summary
+Summarizer = Callable[[str, List[BaseMessage]], str]
+
+# Persisted sessions are swept for expiry at most this often, rather than
+# with a query on every chat request
+EXPIRE_INTERVAL_SECONDS = 60.0
+
+
+def _message_text(message: BaseMessage) -> str:
+    return message.content if isinstance(message.content, str) else json.dumps(message.content)
+
+
+class SessionHistory(BaseChatMessageHistory):
+    # Chat history for one session. `messages` (what the prompts see) is a
+    # token-budgeted window: the most recent turns that fit the budget,
+    # preceded by a running summary of everything older. Turns that fall out
+    # of the window are folded into that summary in the background, so both
+    # the prompt and the stored history stay bounded however long the
+    # conversation gets.
+
+    def __init__(self, session_id: str, store: "SessionStore", summary: str = "",
+                 turns: Optional[List[BaseMessage]] = None):
+        self.session_id = session_id
+        self.summary = summary
+        self.turns = turns or []
+        self.last_access = time.time()
+        self._store = store
+        self._lock = threading.Lock()
+        self._compacting = False
+        self._epoch = 0  # bumped by clear, so a compaction racing it is dropped
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        with self._lock:
+            window = self.turns[self._window_start():]
+            if self.summary:
+                return [SystemMessage(content=f"Summary of the earlier conversation: {self.summary}")] + window
+            return list(window)
+
+    def _window_start(self, budget: int = None) -> int:
+        budget = self._store.token_budget if budget is None else budget
+        used = 0
+        start = len(self.turns)
+        while start > 0:
+            cost = estimate_tokens(_message_text(self.turns[start - 1]))
+            # Always keep the latest message, even if it alone is over budget
+            if start < len(self.turns) and used + cost > budget:
+                break
+            used += cost
+            start -= 1
+        return start
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        with self._lock:
+            self.turns.extend(messages)
+            self.last_access = time.time()
+            overflow = self._window_start() > 0 and not self._compacting
+            if overflow:
+                self._compacting = True
+        self._store._persist_messages(self, messages)
+        if overflow:
+            self._store._schedule_compaction(self)
+
+    def compact(self):
+        # Fold older turns into the summary, keeping half the budget as
+        # recent turns so we summarize every few turns rather than every turn
+        with self._lock:
+            cutoff = self._window_start(self._store.token_budget // 2)
+            older = self.turns[:cutoff]
+            summary = self.summary
+            epoch = self._epoch
+        try:
+            if older and self._store.summarize is not None:
+                summary = self._store.summarize(summary, older)
+        except Exception:
+            logger.exception("Summarizing session %s failed; dropping old turns", self.session_id)
+        finally:
+            with self._lock:
+                self._compacting = False
+                # Cleared while we summarized: the summary and the turns it
+                # replaces are gone, and dropping turns now would drop new ones
+                if self._epoch == epoch:
+                    self.summary = summary
+                    self.turns = self.turns[len(older):]
+                    self._store._persist_compaction(self, len(older))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._epoch += 1
+            self.summary = ""
+            self.turns = []
+            self._store._delete(self.session_id)
+
+
+class SessionStore:
+    # Holds up to `max_sessions` histories in memory, least recently used
+    # first out, and expires sessions idle for longer than `ttl_seconds`.
+    # With a `path`, sessions are also written to SQLite: evicted sessions are
+    # reloaded on their next request and everything survives a restart.
+
+    def __init__(self, max_sessions: int, ttl_seconds: float, token_budget: int,
+                 path: str = "", summarize: Optional[Summarizer] = None):
+        if max_sessions < 1:
+            raise ValueError(f"SESSION_MAX_SESSIONS must be at least 1, not {max_sessions}")
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.token_budget = token_budget
+        self.summarize = summarize
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._swept = 0.0
+        self._compactor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-summary")
+
+        self._conn = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " session_id TEXT PRIMARY KEY,"
+                " summary TEXT NOT NULL DEFAULT '',"
+                " last_access REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " session_id TEXT NOT NULL,"
+                " message TEXT NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions (last_access)")
+            self._db_lock = threading.Lock()
+
+    def get(self, session_id: str) -> SessionHistory:
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            history = self._sessions.get(session_id)
+            if history is None:
+                history = self._load(session_id) or SessionHistory(session_id, self)
+                self._sessions[session_id] = history
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            self._sessions.move_to_end(session_id)
+            history.last_access = now
+            return history
+
+    def _expire(self, now: float):
+        # Ordered by last access, so expired sessions are all at the front
+        while self._sessions:
+            session_id, history = next(iter(self._sessions.items()))
+            if now - history.last_access <= self.ttl_seconds:
+                break
+            self._sessions.popitem(last=False)
+            self._delete(session_id)
+
+        if self._conn is not None and now - self._swept >= min(EXPIRE_INTERVAL_SECONDS, self.ttl_seconds):
+            self._swept = now
+            with self._db_lock:
+                expired = [row[0] for row in self._conn.execute(
+                    "SELECT session_id FROM sessions WHERE last_access < ?", (now - self.ttl_seconds,)
+                ).fetchall()]
+            for session_id in expired:
+                self._delete(session_id)
+
+    def _load(self, session_id: str) -> Optional[SessionHistory]:
+        if self._conn is None:
+            return None
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT summary, last_access FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            if time.time() - row[1] > self.ttl_seconds:
+                # Expired but not swept yet: start over rather than revive it
+                self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+                self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+                return None
+            rows = self._conn.execute(
+                "SELECT message FROM messages WHERE session_id = ? ORDER BY id", (session_id,)
+            ).fetchall()
+        turns = messages_from_dict([json.loads(message) for (message,) in rows])
+        return SessionHistory(session_id, self, summary=row[0], turns=turns)
+
+    def _persist_messages(self, history: SessionHistory, messages: Sequence[BaseMessage]):
+        if self._conn is None:
+            return
+        with self._db_lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, last_access) VALUES (?, ?)"
+                " ON CONFLICT (session_id) DO UPDATE SET last_access = excluded.last_access",
+                (history.session_id, history.last_access),
+            )
+            self._conn.executemany(
+                "INSERT INTO messages (session_id, message) VALUES (?, ?)",
+                [(history.session_id, json.dumps(data)) for data in messages_to_dict(list(messages))],
+            )
+            self._conn.execute("COMMIT")
+
+    def _persist_compaction(self, history: SessionHistory, dropped: int):
+        if self._conn is None:
+            return
+        with self._db_lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "UPDATE sessions SET summary = ? WHERE session_id = ?",
+                (history.summary, history.session_id),
+            )
+            self._conn.execute(
+                "DELETE FROM messages WHERE id IN"
+                " (SELECT id FROM messages WHERE session_id = ? ORDER BY id LIMIT ?)",
+                (history.session_id, dropped),
+            )
+            self._conn.execute("COMMIT")
+
+    def _schedule_compaction(self, history: SessionHistory):
+        self._compactor.submit(history.compact)
+
+    def _delete(self, session_id: str):
+        if self._conn is None:
+            return
+        with self._db_lock:
+            self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions_in_memory": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "ttl_seconds": self.ttl_seconds,
+                "token_budget": self.token_budget,
+                "persistent": self._conn is not None,
+            }
+
+
+_session_store = None
+_session_store_lock = threading.Lock()
+
+
+def _summarize(summary: str, messages: List[BaseMessage]) -> str:
+    from app.services.chains import get_chain_factory
+
+    return get_chain_factory().summarize(summary, messages)
+
+
+def get_session_store() -> SessionStore:
+    # Bounded session histories; older turns are summarized in the background
+    global _session_store
+    with _session_store_lock:
+        if _session_store is None:
+            _session_store = SessionStore(
+                max_sessions=settings.SESSION_MAX_SESSIONS,
+                ttl_seconds=settings.SESSION_TTL_SECONDS,
+                token_budget=settings.SESSION_HISTORY_TOKENS,
+                path=settings.SESSION_STORE_PATH,
+                summarize=_summarize
+            )
+    return _session_store
+
+
+def get_session_history(session_id: str) -> SessionHistory:
+    return get_session_store().get(session_id)
@@ -0,0 +1,339 @@
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Keeps identifiers such as "12.3", "acc-48213", "s/2024/17" and "brk.b" in
+# one piece, since those are exactly what dense retrieval tends to miss
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[._\-/][a-z0-9]+)*")
+
+STOPWORDS = frozenset(
+    "a about after all also an and any are as at be been but by can could did do does "
+    "for from had has have he her his how i if in into is it its me my no not of on or "
+    "our she so than that the their them then there these they this those to up us was "
+    "we were what when where which who whom why will with would you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], weights: Sequence[float], k: int = 60) -> List[str]:
+    # score(id) = sum of weight / (k + rank) over every ranking the id is in
+    scores: Dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + weight / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class _Postings:
+    __slots__ = ("rows", "tfs", "epoch")
+
+    def __init__(self):
+        self.rows = np.empty(0, dtype=np.int32)
+        self.tfs = np.empty(0, dtype=np.float32)
+        self.epoch = 0
+
+
+class SparseIndex:
+    # BM25 inverted index over the chunks in the vector store. SQLite holds
+    # the term counts of every chunk plus a log of deletions, so ingestion
+    # worker processes can write to it while the API process reads. Each
+    # reader keeps the postings in memory as numpy arrays and catches up by
+    # replaying whatever rows were added or deleted since its last sync.
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75, max_df: float = 0.5):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        # Terms in more than this share of chunks are skipped when the query
+        # has more selective ones: their idf is too low to change the ranking,
+        # and their postings are the only ones long enough to cost
+        # milliseconds to score
+        self.max_df = max_df
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " chunk_id TEXT NOT NULL UNIQUE,"
+            " doc_id TEXT NOT NULL,"
+            " length INTEGER NOT NULL,"
+            " terms TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS deletions ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " chunk_seq INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._conn.execute("INSERT OR IGNORE INTO meta VALUES ('generation', 0)")
+
+        self._reset(generation=None)
+
+    def _reset(self, generation):
+        self._generation = generation
+        self._chunk_seq = 0
+        self._deletion_seq = 0
+        self._size = 0
+        self._live = 0
+        self._total_length = 0
+        self._seqs = np.empty(1024, dtype=np.int64)
+        self._lengths = np.zeros(1024, dtype=np.float32)
+        self._alive = np.zeros(1024, dtype=bool)
+        self._doc_codes = np.zeros(1024, dtype=np.int32)
+        self._doc_index: Dict[str, int] = {}
+        self._norm = np.empty(0, dtype=np.float32)
+        self._scores = np.zeros(0, dtype=np.float32)
+        self._postings: Dict[str, _Postings] = {}
+        self._epoch = 0
+
+    # Writers
+
+    def add(self, chunk_ids: Sequence[str], texts: Sequence[str], doc_ids: Sequence[Optional[str]]):
+        rows = []
+        for chunk_id, text, doc_id in zip(chunk_ids, texts, doc_ids):
+            tokens = tokenize(text)
+            rows.append((chunk_id, doc_id or "", len(tokens), json.dumps(Counter(tokens), separators=(",", ":"))))
+        if not rows:
+            return
+        with self._lock:
+            # Chunk IDs are content-addressed, so an existing row already
+            # holds the same text
+            self._conn.executemany(
+                "INSERT INTO chunks (chunk_id, doc_id, length, terms) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (chunk_id) DO NOTHING",
+                rows,
+            )
+
+    def delete(self, chunk_ids: Sequence[str]):
+        chunk_ids = list(chunk_ids)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for i in range(0, len(chunk_ids), 500):
+                    part = chunk_ids[i:i + 500]
+                    placeholders = ",".join("?" * len(part))
+                    self._conn.execute(
+                        f"INSERT INTO deletions (chunk_seq) SELECT seq FROM chunks WHERE chunk_id IN ({placeholders})",
+                        part,
+                    )
+                    self._conn.execute(f"DELETE FROM chunks WHERE chunk_id IN ({placeholders})", part)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def clear(self):
+        # A new generation tells every reader to drop its postings and reload
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.execute("DELETE FROM deletions")
+            self._conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'generation'")
+            self._conn.execute("COMMIT")
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM chunks").fetchone()[0]
+
+    # Readers
+
+    def sync(self):
+        with self._lock:
+            self._sync()
+
+    def _sync(self):
+        generation, chunk_seq, deletion_seq = self._conn.execute(
+            "SELECT (SELECT value FROM meta WHERE key = 'generation'),"
+            " (SELECT max(seq) FROM chunks), (SELECT max(seq) FROM deletions)"
+        ).fetchone()
+        if generation != self._generation:
+            self._reset(generation)
+        elif (chunk_seq or 0) <= self._chunk_seq and (deletion_seq or 0) <= self._deletion_seq:
+            return
+
+        # Deletions first: a chunk added and deleted since the last sync is
+        # then never loaded at all
+        deleted = self._conn.execute(
+            "SELECT seq, chunk_seq FROM deletions WHERE seq > ? ORDER BY seq", (self._deletion_seq,)
+        ).fetchall()
+        if deleted:
+            self._deletion_seq = deleted[-1][0]
+            self._mark_deleted(np.asarray([row[1] for row in deleted], dtype=np.int64))
+
+        new_rows: Dict[str, Tuple[array, array]] = {}
+        cursor = self._conn.execute(
+            "SELECT seq, doc_id, length, terms FROM chunks WHERE seq > ? ORDER BY seq", (self._chunk_seq,)
+        )
+        while True:
+            batch = cursor.fetchmany(10000)
+            if not batch:
+                break
+            self._reserve(self._size + len(batch))
+            for seq, doc_id, length, terms in batch:
+                row = self._size
+                self._size += 1
+                self._seqs[row] = seq
+                self._doc_codes[row] = self._doc_index.setdefault(doc_id, len(self._doc_index))
+                self._lengths[row] = length
+                self._alive[row] = True
+                self._live += 1
+                self._total_length += length
+                for term, tf in json.loads(terms).items():
+                    postings = new_rows.get(term)
+                    if postings is None:
+                        postings = new_rows[term] = (array("i"), array("f"))
+                    postings[0].append(row)
+                    postings[1].append(tf)
+            self._chunk_seq = batch[-1][0]
+
+        for term, (rows, tfs) in new_rows.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = _Postings()
+                postings.epoch = self._epoch
+            postings.rows = np.concatenate([postings.rows, np.frombuffer(rows, dtype=np.int32)])
+            postings.tfs = np.concatenate([postings.tfs, np.frombuffer(tfs, dtype=np.float32)])
+
+        # The BM25 length normalisation only changes when the corpus does,
+        # so it is computed once per sync rather than once per query
+        average = self._total_length / self._live if self._live else 1.0
+        lengths = self._lengths[:self._size]
+        self._norm = (self.k1 * (1 - self.b + self.b * lengths / max(average, 1e-9))).astype(np.float32)
+        if len(self._scores) < self._size:
+            self._scores = np.zeros(len(self._seqs), dtype=np.float32)
+
+    def _reserve(self, size):
+        if size <= len(self._seqs):
+            return
+        capacity = max(size, len(self._seqs) * 2)
+        self._seqs = np.resize(self._seqs, capacity)
+        self._lengths = np.resize(self._lengths, capacity)
+        self._doc_codes = np.resize(self._doc_codes, capacity)
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self._size] = self._alive[:self._size]
+        self._alive = alive
+
+    def _mark_deleted(self, seqs):
+        # Rows are loaded in seq order, so seq -> row is a binary search
+        rows = np.searchsorted(self._seqs[:self._size], seqs)
+        loaded = rows < self._size
+        rows, seqs = rows[loaded], seqs[loaded]
+        rows = rows[self._seqs[rows] == seqs]
+        rows = rows[self._alive[rows]]
+        if not len(rows):
+            return
+        self._alive[rows] = False
+        self._live -= len(rows)
+        self._total_length -= int(self._lengths[rows].sum())
+        # Postings drop dead rows lazily, the next time a query touches them
+        self._epoch += 1
+
+    def _term_postings(self, term):
+        postings = self._postings.get(term)
+        if postings is None:
+            return None
+        if postings.epoch != self._epoch:
+            alive = self._alive[postings.rows]
+            if not alive.all():
+                postings.rows = postings.rows[alive]
+                postings.tfs = postings.tfs[alive]
+            postings.epoch = self._epoch
+        return postings
+
+    def search(self, query: str, k: int = 20, doc_ids: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        # doc_ids limits results to those documents; idf stays corpus-wide
+        terms = set(tokenize(query))
+        with self._lock:
+            self._sync()
+            doc_codes = None
+            if doc_ids is not None:
+                doc_codes = np.array(
+                    [self._doc_index[doc_id] for doc_id in doc_ids if doc_id in self._doc_index],
+                    dtype=np.int32
+                )
+                if not len(doc_codes):
+                    return []
+            rows, scores = self._score(terms, k, doc_codes)
+            if not len(rows):
+                return []
+            seqs = [int(seq) for seq in self._seqs[rows]]
+            placeholders = ",".join("?" * len(seqs))
+            chunk_ids = dict(self._conn.execute(
+                f"SELECT seq, chunk_id FROM chunks WHERE seq IN ({placeholders})", seqs
+            ).fetchall())
+        return [
+            (chunk_ids[seq], float(score))
+            for seq, score in zip(seqs, scores)
+            if seq in chunk_ids
+        ]
+
+    def _score(self, terms: Iterable[str], k: int, doc_codes: Optional[np.ndarray] = None):
+        empty = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if not self._live or k <= 0:
+            return empty
+
+        matched = [postings for postings in map(self._term_postings, terms)
+                   if postings is not None and len(postings.rows)]
+        selective = [postings for postings in matched if len(postings.rows) <= self.max_df * self._live]
+        if selective:
+            matched = selective
+
+        k1 = self.k1
+        parts = []
+        for postings in matched:
+            df = len(postings.rows)
+            idf = math.log(1 + (self._live - df + 0.5) / (df + 0.5))
+            tfs = postings.tfs
+            rows = postings.rows
+            if doc_codes is not None:
+                in_scope = np.isin(self._doc_codes[rows], doc_codes)
+                rows, tfs = rows[in_scope], tfs[in_scope]
+                if not len(rows):
+                    continue
+            contribution = tfs * np.float32(idf * (k1 + 1)) / (tfs + self._norm[rows])
+            parts.append((rows, contribution))
+        if not parts:
+            return empty
+
+        if len(parts) == 1:
+            candidates, scores = parts[0]
+        else:
+            # Accumulate into a reusable dense buffer and reset only the rows
+            # that were touched. A row can appear once per term, so the top
+            # k * terms entries always contain the top k distinct rows.
+            buffer = self._scores
+            for rows, contribution in parts:
+                buffer[rows] += contribution
+            candidates = np.concatenate([rows for rows, _ in parts])
+            scores = buffer[candidates]
+            buffer[candidates] = 0
+            limit = k * len(parts)
+            if len(candidates) > limit:
+                top = np.argpartition(scores, -limit)[-limit:]
+                candidates, scores = candidates[top], scores[top]
+            candidates, first = np.unique(candidates, return_index=True)
+            scores = scores[first]
+
+        if len(candidates) > k:
+            top = np.argpartition(scores, -k)[-k:]
+            candidates, scores = candidates[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return candidates[order], scores[order]
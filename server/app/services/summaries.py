@@ -0,0 +1,137 @@
+from typing import TYPE_CHECKING, List
+
+from app.core.config import settings
+from app.services.document_registry import document_registry, DEFAULT_TENANT
+from app.services.tokens import estimate_tokens
+from app.services.vector_store import get_vector_store
+
+if TYPE_CHECKING:
+    from langchain_ollama import ChatOllama
+
+# LangChain is imported by the summarizing job worker only, not by the
+# API, which just reads stored summaries
+MAP_PROMPT = """Summarize the following part of a document in a short paragraph.
+    Keep the main concepts, key facts and conclusions; leave out examples and details.
+
+    Part:
+    {text}
+    """
+
+REDUCE_PROMPT = """The following are summaries of consecutive parts of one document.
+    Combine them into a single summary of the whole document, at most 300 words,
+    covering its main concepts and key takeaways.
+
+    Summaries:
+    {text}
+    """
+
+# Each reduce round at least halves the partial summaries, so this bounds the
+# LLM calls however long they come out; the last round combines whatever is
+# left in one prompt
+MAX_REDUCE_ROUNDS = 6
+
+
+def group_texts(texts: List[str], max_tokens: int) -> List[str]:
+    # Packs consecutive texts into groups of up to max_tokens each
+    groups, current, size = [], [], 0
+    for text in texts:
+        tokens = estimate_tokens(text)
+        if current and size + tokens > max_tokens:
+            groups.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(text)
+        size += tokens
+    if current:
+        groups.append("\n\n".join(current))
+    return groups
+
+
+def reduce_parts(summaries: List[str], max_tokens: int) -> List[str]:
+    # Groups partial summaries for one reduce round. Summaries too long to
+    # share a group are paired up anyway, so every round makes progress.
+    parts = group_texts(summaries, max_tokens)
+    if len(parts) * 2 > len(summaries):
+        parts = ["\n\n".join(summaries[i:i + 2]) for i in range(0, len(summaries), 2)]
+    return parts
+
+
+def spread(items: list, count: int) -> list:
+    # `count` items evenly spaced over the list, first and last included
+    if len(items) <= count:
+        return items
+    if count == 1:
+        return items[:1]
+    step = (len(items) - 1) / (count - 1)
+    return [items[round(i * step)] for i in range(count)]
+
+
+def _llm() -> "ChatOllama":
+    from langchain_ollama import ChatOllama
+
+    return ChatOllama(
+        base_url=settings.OLLAMA_BASE_URL,
+        model=settings.SUMMARY_MODEL or settings.CHAT_MODEL,
+        temperature=0
+    )
+
+
+def map_reduce(texts: List[str], progress=None) -> str:
+    # Summarizes every group of chunks concurrently, then combines the
+    # partial summaries, in more rounds if they don't fit in one prompt.
+    # Very long documents are sampled down to SUMMARY_MAX_GROUPS groups.
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.output_parsers import StrOutputParser
+
+    llm = _llm()
+    map_chain = ChatPromptTemplate.from_template(MAP_PROMPT) | llm | StrOutputParser()
+    reduce_chain = ChatPromptTemplate.from_template(REDUCE_PROMPT) | llm | StrOutputParser()
+    config = {"max_concurrency": settings.SUMMARY_CONCURRENCY}
+
+    groups = spread(group_texts(texts, settings.SUMMARY_GROUP_TOKENS), settings.SUMMARY_MAX_GROUPS)
+    if progress is not None:
+        progress(groups_total=len(groups), groups_done=0)
+    summaries = map_chain.batch([{"text": group} for group in groups], config=config)
+    if progress is not None:
+        progress(groups_done=len(groups))
+
+    rounds = 0
+    while len(summaries) > 1:
+        rounds += 1
+        if rounds < MAX_REDUCE_ROUNDS:
+            parts = reduce_parts(summaries, settings.SUMMARY_GROUP_TOKENS)
+        else:
+            parts = ["\n\n".join(summaries)]
+        summaries = reduce_chain.batch([{"text": part} for part in parts], config=config)
+    return summaries[0].strip() if summaries else ""
+
+
+def summarize_document(doc_id: str, tenant: str = DEFAULT_TENANT, progress=None) -> dict:
+    # Job handler: computes and stores the summary of the document's current
+    # version. Skipped when that version already has one; not stored when the
+    # document changed or was removed while it was being summarized.
+    document = document_registry.get(doc_id)
+    if document is None or document["tenant"] != tenant:
+        return {"doc_id": doc_id, "status": "missing"}
+    if document_registry.get_summary(doc_id) is not None:
+        return {"doc_id": doc_id, "status": "unchanged"}
+
+    chunks = get_vector_store().get_document_chunks(document_registry.chunk_ids(doc_id), tenant=tenant)
+    summary = map_reduce([chunk.page_content for chunk in chunks], progress=progress)
+    if not summary:
+        return {"doc_id": doc_id, "status": "empty"}
+
+    if not document_registry.is_current(doc_id, document["content_hash"]):
+        return {"doc_id": doc_id, "status": "stale"}
+    document_registry.save_summary(doc_id, document["content_hash"], summary)
+    return {"doc_id": doc_id, "status": "summarized", "chunks": len(chunks)}
+
+
+def stored_summaries(documents: List[dict]) -> List[dict]:
+    # The documents that have a summary of their current version, each with
+    # the summary added under "summary"
+    found = []
+    for document in documents:
+        summary = document_registry.get_summary(document["doc_id"])
+        if summary is not None:
+            found.append({**document, "summary": summary["summary"]})
+    return found
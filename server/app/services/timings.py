@@ -0,0 +1,53 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import numpy as np
+
+from app.services.metrics import record_span
+
+
+class StageTimings:
+    # Rolling per-stage latencies of the retrieval pipeline (embed, dense,
+    # sparse, fusion, rerank, ...) over the last `window` calls of each stage.
+    # With a `span_prefix`, every stage is also recorded as a span
+    # ("<prefix>.<stage>") for /metrics and request traces.
+
+    def __init__(self, window: int = 1000, span_prefix: Optional[str] = None):
+        self.window = window
+        self.span_prefix = span_prefix
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self.window)
+            samples.append(seconds)
+        if self.span_prefix:
+            record_span(f"{self.span_prefix}.{stage}", seconds)
+
+    @contextmanager
+    def stage(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def stats(self) -> dict:
+        with self._lock:
+            snapshot = {stage: np.array(samples) for stage, samples in self._samples.items()}
+        return {
+            stage: {
+                "count": len(samples),
+                "mean_ms": round(float(samples.mean()) * 1000, 3),
+                "p50_ms": round(float(np.percentile(samples, 50)) * 1000, 3),
+                "p95_ms": round(float(np.percentile(samples, 95)) * 1000, 3),
+            }
+            for stage, samples in snapshot.items()
+            if len(samples)
+        }
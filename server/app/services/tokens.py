@@ -0,0 +1,61 @@
+import math
+import os
+import threading
+from typing import List, Optional
+
+import numpy as np
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English text with BPE/WordPiece
+    # vocabularies; good enough for budgeting prompt space
+    return math.ceil(len(text) / 4) if text else 0
+
+
+class TokenCounter:
+    # Counts tokens for many texts at once. With a tokenizer (the embedding
+    # model's tokenizer.json, from a local path or a Hugging Face repo) the
+    # counts are exact and encoded in parallel by the tokenizers library;
+    # without one they fall back to estimate_tokens, vectorized.
+
+    def __init__(self, tokenizer: str = ""):
+        self._tokenizer = None
+        if tokenizer:
+            from tokenizers import Tokenizer
+            if os.path.exists(tokenizer):
+                self._tokenizer = Tokenizer.from_file(tokenizer)
+            else:
+                self._tokenizer = Tokenizer.from_pretrained(tokenizer)
+            self._tokenizer.no_truncation()
+            self._tokenizer.no_padding()
+
+    @property
+    def exact(self) -> bool:
+        return self._tokenizer is not None
+
+    def count_many(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros(0, dtype=np.int64)
+        if self._tokenizer is not None:
+            encodings = self._tokenizer.encode_batch(texts, add_special_tokens=False)
+            return np.fromiter((len(e.ids) for e in encodings), dtype=np.int64, count=len(texts))
+        lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+        return (lengths + 3) // 4
+
+    def count(self, text: str) -> int:
+        return int(self.count_many([text])[0])
+
+
+_counters = {}
+_counters_lock = threading.Lock()
+
+
+def get_token_counter(tokenizer: Optional[str] = None) -> TokenCounter:
+    from app.core.config import settings
+
+    tokenizer = settings.CHUNK_TOKENIZER if tokenizer is None else tokenizer
+    with _counters_lock:
+        counter = _counters.get(tokenizer)
+        if counter is None:
+            counter = _counters[tokenizer] = TokenCounter(tokenizer)
+    return counter
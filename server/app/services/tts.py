@@ -0,0 +1,125 @@
+import importlib
+import io
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+import wave
+
+from app.core.config import settings
+
+
+class TTSBackend:
+    # Renders text to an audio file. `name` goes into audio cache keys, so
+    # two backends (or voices) never share a cached file.
+    name = ""
+    extension = "mp3"
+    media_type = "audio/mpeg"
+
+    def synthesize(self, text: str, path: str):
+        raise NotImplementedError
+
+    def synthesize_bytes(self, text: str) -> bytes:
+        fd, path = tempfile.mkstemp(suffix=f".{self.extension}")
+        os.close(fd)
+        try:
+            self.synthesize(text, path)
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            os.remove(path)
+
+    def stream_chunk(self, audio: bytes, first: bool) -> bytes:
+        # One sentence of a streamed response. MP3 frames can simply be
+        # concatenated; formats with a file header override this.
+        return audio
+
+
+class GTTSBackend(TTSBackend):
+    # Google Translate's TTS; needs network access
+    extension = "mp3"
+    media_type = "audio/mpeg"
+
+    def __init__(self, language: str = "en"):
+        self.language = language
+        self.name = f"gtts-{language}"
+
+    def synthesize(self, text: str, path: str):
+        from gtts import gTTS
+        gTTS(text=text, lang=self.language, slow=False).save(path)
+
+    def synthesize_bytes(self, text: str) -> bytes:
+        from gtts import gTTS
+        buffer = io.BytesIO()
+        gTTS(text=text, lang=self.language, slow=False).write_to_fp(buffer)
+        return buffer.getvalue()
+
+
+class EspeakBackend(TTSBackend):
+    # Local espeak-ng (or espeak) binary, for air-gapped deployments. Writes
+    # WAV, which every browser plays.
+    extension = "wav"
+    media_type = "audio/wav"
+
+    def __init__(self, voice: str = "en", binary: str = "espeak-ng", speed: int = 165):
+        self.binary = shutil.which(binary) or shutil.which("espeak")
+        if self.binary is None:
+            raise RuntimeError(f"TTS backend 'espeak' needs {binary} or espeak on the PATH")
+        self.voice = voice
+        self.speed = speed
+        self.name = f"espeak-{voice}-{speed}"
+
+    def _run(self, text: str, *output) -> bytes:
+        return subprocess.run(
+            [self.binary, "-v", self.voice, "-s", str(self.speed), *output, "--stdin"],
+            input=text.encode("utf-8"),
+            check=True,
+            capture_output=True,
+            timeout=300,
+        ).stdout
+
+    def synthesize(self, text: str, path: str):
+        self._run(text, "-w", path)
+
+    def synthesize_bytes(self, text: str) -> bytes:
+        return self._run(text, "--stdout")
+
+    def stream_chunk(self, audio: bytes, first: bool) -> bytes:
+        # A streamed WAV is one header with open-ended sizes followed by the
+        # PCM frames of every sentence
+        with wave.open(io.BytesIO(audio)) as wav:
+            channels, width, rate = wav.getnchannels(), wav.getsampwidth(), wav.getframerate()
+            frames = wav.readframes(wav.getnframes())
+        if not first:
+            return frames
+        header = b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVE"
+        header += b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, rate, rate * channels * width,
+                                        channels * width, width * 8)
+        header += b"data" + struct.pack("<I", 0xFFFFFFFF)
+        return header + frames
+
+
+# TTS_BACKEND is one of these names, or "module:Class" for a backend that
+# lives elsewhere (constructed without arguments)
+TTS_BACKENDS = {
+    "gtts": lambda: GTTSBackend(settings.TTS_LANGUAGE),
+    "espeak": lambda: EspeakBackend(settings.TTS_VOICE or settings.TTS_LANGUAGE, settings.TTS_ESPEAK_BINARY),
+}
+
+_backends = {}
+
+
+def get_tts_backend(name: str = None) -> TTSBackend:
+    name = name or settings.TTS_BACKEND
+    backend = _backends.get(name)
+    if backend is None:
+        if name in TTS_BACKENDS:
+            backend = TTS_BACKENDS[name]()
+        elif ":" in name:
+            module_name, class_name = name.split(":")
+            backend = getattr(importlib.import_module(module_name), class_name)()
+        else:
+            raise ValueError(f"Unknown TTS backend: {name}")
+        _backends[name] = backend
+    return backend
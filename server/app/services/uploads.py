@@ -0,0 +1,53 @@
+import hashlib
+import os
+import uuid
+
+from typing import Optional
+
+from fastapi import UploadFile
+
+from app.services.offload import offload
+
+# Uploads and downloads are moved in blocks of this size, so memory use
+# doesn't depend on the size of the file
+CHUNK_SIZE = 1024 * 1024
+TEMP_DIR = "temp_uploads"
+
+
+def temp_path_for(filename: str) -> str:
+    os.makedirs(TEMP_DIR, exist_ok=True)
+    # Unique name so concurrent uploads of the same file can't collide
+    return os.path.join(TEMP_DIR, f"{uuid.uuid4().hex}_{os.path.basename(filename)}")
+
+
+async def save_upload(upload: UploadFile, dest_path: str) -> str:
+    # Streams the upload to disk block by block, hashing on the way so
+    # ingestion never has to read the file again just to fingerprint it
+    digest = hashlib.sha256()
+    with open(dest_path, "wb") as f:
+        while True:
+            block = await upload.read(CHUNK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+            await offload("io", f.write, block)
+    return digest.hexdigest()
+
+
+async def download_to_file(client, url: str, dest_path: str) -> str:
+    digest = hashlib.sha256()
+    async with client.stream("GET", url, follow_redirects=True) as response:
+        response.raise_for_status()
+        with open(dest_path, "wb") as f:
+            async for block in response.aiter_bytes(CHUNK_SIZE):
+                digest.update(block)
+                await offload("io", f.write, block)
+    return digest.hexdigest()
+
+
+def sample_pdf_text(file_path: str, content_hash: Optional[str] = None, max_chars: int = 2000) -> str:
+    # Only extracts the pages the sample needs, and caches them so the
+    # ingestion job doesn't parse them again. Runs in the cpu pool's
+    # processes, so the API itself never imports PyMuPDF.
+    from app.services.extraction import sample_text
+    return sample_text(file_path, content_hash, max_chars)
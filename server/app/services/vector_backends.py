@@ -0,0 +1,252 @@
+import importlib
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from app.core.config import settings
+from app.services.document_registry import DEFAULT_TENANT
+
+DEFAULT_COLLECTION = "documind_collection"
+
+
+def collection_name(tenant):
+    # The default tenant keeps the collection that predates tenants
+    if tenant == DEFAULT_TENANT:
+        return DEFAULT_COLLECTION
+    return f"documind_tenant_{tenant}"
+
+
+class VectorBackend:
+    # Where VectorStoreService keeps each tenant's chunks and their vectors.
+    # Embedding, hybrid fusion, reranking and scoping by document stay in
+    # the service; a backend stores, fetches and runs the dense search.
+    # Distances are squared L2, so every backend ranks alike.
+    name = ""
+
+    def upsert(self, tenant: str, ids: List[str], embeddings, texts: List[str], metadatas: List[dict]):
+        raise NotImplementedError
+
+    def delete(self, tenant: str, ids: List[str]):
+        raise NotImplementedError
+
+    def query(self, tenant: str, embeddings, k: int,
+              doc_ids: Optional[Sequence[str]] = None) -> List[List[Document]]:
+        # One result list per query embedding, nearest first; doc_ids keeps
+        # only chunks of those documents
+        raise NotImplementedError
+
+    def get(self, tenant: str, ids: List[str]) -> List[Document]:
+        raise NotImplementedError
+
+    def get_embeddings(self, tenant: str, ids: List[str]) -> Tuple[List[str], list]:
+        # The ids found, and their vectors in the same order
+        raise NotImplementedError
+
+    def iter_chunks(self, tenant: str, batch_size: int = 5000) -> Iterator[Tuple[list, list, list]]:
+        # (ids, texts, metadatas) pages of everything stored for the tenant
+        raise NotImplementedError
+
+    def count(self, tenant: str) -> int:
+        raise NotImplementedError
+
+    def drop(self, tenant: str):
+        raise NotImplementedError
+
+    def reopen(self):
+        # Called once another process has changed the documents, for
+        # backends that don't see such writes on their own
+        pass
+
+
+class ReadWriteLock:
+    # Any number of readers, or one writer. A waiting writer holds off new
+    # readers, so a steady stream of searches can't starve it.
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting = 0
+
+    @contextmanager
+    def reading(self):
+        with self._cond:
+            while self._writer or self._waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def writing(self):
+        with self._cond:
+            self._waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class ChromaBackend(VectorBackend):
+    # A Chroma collection per tenant, in the local persistent store or on a
+    # Chroma server (CHROMA_SERVER_HOST). Every call holds the read side of
+    # _rw, so reopen() can swap the client once none is using the old one.
+    name = "chroma"
+
+    def __init__(self):
+        self._rw = ReadWriteLock()
+        self.client = self._connect()
+        self._collections = {}
+
+    def _connect(self):
+        import chromadb
+
+        if settings.CHROMA_SERVER_HOST:
+            return chromadb.HttpClient(
+                host=settings.CHROMA_SERVER_HOST,
+                port=settings.CHROMA_SERVER_PORT
+            )
+        return chromadb.PersistentClient(path=settings.CHROMA_PERSIST_DIRECTORY)
+
+    def collection(self, tenant):
+        collection = self._collections.get(tenant)
+        if collection is None:
+            collection = self._collections[tenant] = self.client.get_or_create_collection(
+                name=collection_name(tenant),
+                embedding_function=None
+            )
+        return collection
+
+    def upsert(self, tenant, ids, embeddings, texts, metadatas):
+        with self._rw.reading():
+            self.collection(tenant).upsert(ids=ids, embeddings=embeddings, documents=texts, metadatas=metadatas)
+
+    def delete(self, tenant, ids):
+        with self._rw.reading():
+            collection = self.collection(tenant)
+            for i in range(0, len(ids), 5000):
+                collection.delete(ids=ids[i:i + 5000])
+
+    def query(self, tenant, embeddings, k, doc_ids=None):
+        where = {"doc_id": {"$in": list(doc_ids)}} if doc_ids is not None else None
+        with self._rw.reading():
+            result = self.collection(tenant).query(
+                query_embeddings=[list(map(float, embedding)) for embedding in embeddings],
+                n_results=k,
+                where=where,
+                include=["documents", "metadatas"]
+            )
+        return [
+            [
+                Document(id=chunk_id, page_content=text, metadata=metadata or {})
+                for chunk_id, text, metadata in zip(ids, texts, metadatas)
+            ]
+            for ids, texts, metadatas in zip(result["ids"], result["documents"], result["metadatas"])
+        ]
+
+    def get(self, tenant, ids):
+        if not ids:
+            return []
+        with self._rw.reading():
+            found = self.collection(tenant).get(ids=ids, include=["documents", "metadatas"])
+        return [
+            Document(id=chunk_id, page_content=text, metadata=metadata or {})
+            for chunk_id, text, metadata in zip(found["ids"], found["documents"], found["metadatas"])
+        ]
+
+    def get_embeddings(self, tenant, ids):
+        found_ids, vectors = [], []
+        with self._rw.reading():
+            collection = self.collection(tenant)
+            for i in range(0, len(ids), 5000):
+                found = collection.get(ids=ids[i:i + 5000], include=["embeddings"])
+                found_ids.extend(found["ids"])
+                vectors.extend(found["embeddings"])
+        return found_ids, vectors
+
+    def iter_chunks(self, tenant, batch_size=5000):
+        offset = 0
+        while True:
+            # Not held across the yield, which may wait on the caller
+            with self._rw.reading():
+                page = self.collection(tenant).get(
+                    include=["documents", "metadatas"], limit=batch_size, offset=offset
+                )
+            if not page["ids"]:
+                return
+            yield page["ids"], page["documents"], page["metadatas"]
+            offset += len(page["ids"])
+
+    def count(self, tenant):
+        with self._rw.reading():
+            return self.collection(tenant).count()
+
+    def drop(self, tenant):
+        with self._rw.reading():
+            try:
+                self.client.delete_collection(collection_name(tenant))
+            except Exception:
+                # Never created, or already removed by another process
+                pass
+            self._collections.pop(tenant, None)
+
+    def reopen(self):
+        # A local persistent Chroma keeps its index in memory, so vectors
+        # written by ingestion worker processes only become visible after the
+        # collection is reopened. Collections also get recreated by a clear
+        # in another process.
+        old_system = None
+        if not settings.CHROMA_SERVER_HOST:
+            from chromadb.api.client import SharedSystemClient
+            old_system = self.client._system
+            # Otherwise the new client would share the old in-memory system
+            SharedSystemClient.clear_system_cache()
+        # Built before the swap, so searches keep running on the old client
+        # meanwhile; the swap itself waits for the ones in flight
+        client = self._connect()
+        with self._rw.writing():
+            self.client, self._collections = client, {}
+        if old_system is not None:
+            old_system.stop()
+
+
+def _mmap_backend():
+    from app.services.mmap_index import MmapVectorBackend
+
+    return MmapVectorBackend(
+        settings.VECTOR_INDEX_DIRECTORY,
+        dtype=settings.VECTOR_INDEX_DTYPE,
+        nprobe=settings.VECTOR_INDEX_NPROBE,
+        min_rows=settings.VECTOR_INDEX_MIN_ROWS
+    )
+
+
+# VECTOR_BACKEND is one of these names, or "module:Class" for a backend that
+# lives elsewhere (constructed without arguments)
+VECTOR_BACKENDS = {
+    "chroma": ChromaBackend,
+    "mmap": _mmap_backend,
+}
+
+
+def get_vector_backend(name: str = None) -> VectorBackend:
+    name = name or settings.VECTOR_BACKEND
+    if name in VECTOR_BACKENDS:
+        return VECTOR_BACKENDS[name]()
+    if ":" in name:
+        module_name, class_name = name.split(":")
+        return getattr(importlib.import_module(module_name), class_name)()
+    raise ValueError(f"Unknown vector backend: {name}")
@@ -1,8 +1,22 @@
-import chromadb
-from langchain_ollama import OllamaEmbeddings
-from langchain_community.vectorstores import Chroma
+from app.services.embedding_cache import EmbeddingCache, CachedEmbeddings
+from app.services.embedding_worker import EmbeddingWorker
+from app.services.document_registry import document_registry, DEFAULT_TENANT
+from app.services.answer_cache import SemanticAnswerCache
+from app.services.sparse_index import SparseIndex, reciprocal_rank_fusion
+from app.services.vector_backends import get_vector_backend
+from app.services.reranker import CrossEncoderReranker
+from app.services.timings import StageTimings
+from app.services.metrics import span
 from app.core.config import settings
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import numpy as np
 import os
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
 
 class VectorStoreService:
     _instance = None
@@ -14,32 +28,317 @@ class VectorStoreService:
         return cls._instance
 
     def initialize(self):
+        from langchain_ollama import OllamaEmbeddings
+
         self.embeddings = OllamaEmbeddings(
             base_url=settings.OLLAMA_BASE_URL,
             model=settings.EMBEDDING_MODEL
         )
+
+        # Batched, concurrent requests to Ollama with a bounded backlog
+        self.embedding_worker = EmbeddingWorker(
+            self.embeddings,
+            batch_size=settings.EMBED_BATCH_SIZE,
+            concurrency=settings.EMBED_CONCURRENCY,
+            max_pending=settings.EMBED_MAX_PENDING
+        )
+        self.embeddings = self.embedding_worker
+
+        # Serve repeat chunks and queries from the on-disk cache; this wraps
+        # both add_documents and retrieval
+        self.embedding_cache = None
+        if settings.EMBEDDING_CACHE_ENABLED:
+            self.embedding_cache = EmbeddingCache(
+                settings.EMBEDDING_CACHE_PATH,
+                max_bytes=settings.EMBEDDING_CACHE_MAX_MB * 1024 * 1024
+            )
+            self.embeddings = CachedEmbeddings(
+                self.embeddings,
+                self.embedding_cache,
+                model=settings.EMBEDDING_MODEL
+            )
         
+        # Previous answers, matched by question embedding and invalidated
+        # whenever the document set changes
+        self.answer_cache = None
+        if settings.ANSWER_CACHE_ENABLED:
+            self.answer_cache = SemanticAnswerCache(
+                self,
+                max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+                threshold=settings.ANSWER_CACHE_THRESHOLD
+            )
+
+        # Optional second stage: score an over-fetched candidate set with a
+        # cross-encoder and keep the best k
+        self.reranker = None
+        if settings.RERANK_ENABLED:
+            self.reranker = CrossEncoderReranker(
+                settings.RERANK_MODEL,
+                onnx_file=settings.RERANK_ONNX_FILE,
+                batch_size=settings.RERANK_BATCH_SIZE,
+                workers=settings.RERANK_WORKERS,
+                threads=settings.RERANK_THREADS,
+                max_length=settings.RERANK_MAX_LENGTH,
+                cache_size=settings.RERANK_CACHE_SIZE
+            )
+        self.timings = StageTimings(span_prefix="retrieval")
+
         # Ensure the persist directory exists
         os.makedirs(settings.CHROMA_PERSIST_DIRECTORY, exist_ok=True)
-        
-        self.vector_db = Chroma(
-            persist_directory=settings.CHROMA_PERSIST_DIRECTORY,
-            embedding_function=self.embeddings,
-            collection_name="documind_collection"
+
+        # Each tenant gets its own collection and BM25 index, so a query
+        # only ever touches the data of the tenant it is scoped to. Where
+        # the collections live is up to VECTOR_BACKEND.
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._sparse_indexes = {}
+        self.backend = get_vector_backend()
+        self._version = document_registry.version()
+
+    def sparse_index(self, tenant=DEFAULT_TENANT):
+        # Lexical side of hybrid retrieval, kept in step with the collection
+        with self._lock:
+            index = self._sparse_indexes.get(tenant)
+            if index is None:
+                filename = "sparse.sqlite3" if tenant == DEFAULT_TENANT else f"sparse_{tenant}.sqlite3"
+                index = SparseIndex(
+                    os.path.join(settings.CHROMA_PERSIST_DIRECTORY, filename),
+                    k1=settings.BM25_K1,
+                    b=settings.BM25_B
+                )
+                if settings.HYBRID_SEARCH_ENABLED:
+                    self._backfill_sparse_index(index, tenant)
+                self._sparse_indexes[tenant] = index
+            return index
+
+    def _backfill_sparse_index(self, index, tenant):
+        # Collections indexed before the sparse index existed would otherwise
+        # only ever be searched densely
+        if index.count() or not self.backend.count(tenant):
+            return
+        for ids, texts, metadatas in self.backend.iter_chunks(tenant):
+            index.add(ids, texts, [(metadata or {}).get("doc_id") for metadata in metadatas])
+
+    def version(self):
+        # Changes whenever any process adds, replaces or removes documents
+        return document_registry.version()
+
+    def refresh(self):
+        # Job workers write to the backend behind the API's back (and with a
+        # Chroma server or mmap, behind each other's); the registry version
+        # tells us when to reopen it, so their vectors become visible and a
+        # collection dropped by a clear elsewhere isn't used through a stale
+        # handle
+        if document_registry.version() == self._version:
+            return
+        # Searches run on several threads at once; only one of them reopens
+        with self._refresh_lock:
+            version = document_registry.version()
+            if version == self._version:
+                return
+            self.backend.reopen()
+            self._version = version
+
+    def add_documents(self, documents, tenant=DEFAULT_TENANT):
+        texts = [doc.page_content for doc in documents]
+        return self._write(documents, self.embeddings.embed_documents(texts), tenant)
+
+    def add_document_batches(self, batches, on_write=None, tenant=DEFAULT_TENANT):
+        # Embeds the next batch while the previous one is being written, so
+        # the embedding endpoint isn't left idle during vector store writes
+        ids = []
+
+        def embed(texts):
+            with span("ingest.embed"):
+                return self.embeddings.embed_documents(texts)
+
+        def write(documents, embeddings):
+            with span("ingest.write"):
+                ids.extend(self._write(documents, embeddings, tenant))
+            if on_write is not None:
+                on_write(len(documents))
+
+        with ThreadPoolExecutor(max_workers=1) as prefetch:
+            pending = None
+            for batch in batches:
+                future = prefetch.submit(embed, [doc.page_content for doc in batch])
+                if pending is not None:
+                    write(pending[0], pending[1].result())
+                pending = (batch, future)
+
+            if pending is not None:
+                write(pending[0], pending[1].result())
+        return ids
+
+    def _write(self, documents, embeddings, tenant=DEFAULT_TENANT):
+        if not documents:
+            return []
+        ids = [doc.id or str(uuid.uuid4()) for doc in documents]
+        self.refresh()
+        self.backend.upsert(
+            tenant,
+            ids,
+            embeddings,
+            [doc.page_content for doc in documents],
+            [doc.metadata or {} for doc in documents]
         )
+        self.sparse_index(tenant).add(
+            ids,
+            [doc.page_content for doc in documents],
+            [(doc.metadata or {}).get("doc_id") for doc in documents]
+        )
+        return ids
 
-    def add_documents(self, documents):
-        return self.vector_db.add_documents(documents)
+    def delete(self, ids, tenant=DEFAULT_TENANT):
+        self.refresh()
+        self.backend.delete(tenant, list(ids))
+        self.sparse_index(tenant).delete(ids)
 
-    def as_retriever(self):
-        return self.vector_db.as_retriever()
-    
-    def clear(self):
-        self.vector_db.delete_collection()
-        self.vector_db = Chroma(
-            persist_directory=settings.CHROMA_PERSIST_DIRECTORY,
-            embedding_function=self.embeddings,
-            collection_name="documind_collection"
+    def embedding_cache_stats(self):
+        if self.embedding_cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.embedding_cache.stats()}
+
+    def retrieve(self, query, k=4, tenant=DEFAULT_TENANT, doc_ids=None):
+        # What the chat and audio pipelines call: search, then rerank
+        with self.timings.stage("retrieve"):
+            if self.reranker is None:
+                return self.similarity_search(query, k=k, tenant=tenant, doc_ids=doc_ids)
+
+            candidates = self.similarity_search(
+                query, k=max(k, settings.RERANK_CANDIDATES), tenant=tenant, doc_ids=doc_ids
+            )
+            with self.timings.stage("rerank"):
+                try:
+                    return self.reranker.rerank(query, candidates, k)
+                except Exception:
+                    logger.exception("Reranking failed; keeping retrieval order")
+                    return candidates[:k]
+
+    def retrieval_stats(self):
+        stats = {"stages": self.timings.stats(), "rerank": {"enabled": self.reranker is not None}}
+        if self.reranker is not None:
+            stats["rerank"].update(self.reranker.cache.stats())
+        return stats
+
+    def similarity_search(self, query, k=4, tenant=DEFAULT_TENANT, doc_ids=None):
+        self.refresh()
+        if doc_ids is not None and not doc_ids:
+            return []
+
+        # Over-fetch from both sides and fuse by reciprocal rank, so exact
+        # terms (clause numbers, tickers, account IDs) that the embedding
+        # misses still surface
+        hybrid = settings.HYBRID_SEARCH_ENABLED
+        fetch = max(k, settings.HYBRID_CANDIDATES) if hybrid else k
+        docs = self._dense_search(query, fetch, tenant, doc_ids)
+        if not hybrid:
+            return docs
+
+        docs = {doc.id: doc for doc in docs}
+        with self.timings.stage("sparse"):
+            sparse = [
+                chunk_id
+                for chunk_id, _ in self.sparse_index(tenant).search(query, fetch, doc_ids=doc_ids)
+            ]
+
+        with self.timings.stage("fusion"):
+            ranked = reciprocal_rank_fusion(
+                [list(docs), sparse],
+                [settings.HYBRID_DENSE_WEIGHT, settings.HYBRID_SPARSE_WEIGHT],
+                k=settings.HYBRID_RRF_K
+            )[:k]
+
+            missing = [chunk_id for chunk_id in ranked if chunk_id not in docs]
+            docs.update((doc.id, doc) for doc in self._get_documents(tenant, missing))
+        return [docs[chunk_id] for chunk_id in ranked if chunk_id in docs]
+
+    def _dense_search(self, query, k, tenant, doc_ids):
+        with self.timings.stage("embed"):
+            embedding = self.embeddings.embed_query(query)
+
+        with self.timings.stage("dense"):
+            return self._dense_query(embedding, k, tenant, doc_ids)
+
+    def _dense_query(self, embedding, k, tenant, doc_ids):
+        scope = None
+        if doc_ids is not None:
+            documents = document_registry.scoped(tenant, doc_ids)
+            if not documents:
+                return []
+            # A small scope is cheaper to scan exactly than to search the
+            # tenant's whole index for matches that pass the filter
+            if sum(document["chunk_count"] for document in documents) <= settings.SCOPED_EXACT_SEARCH_MAX_CHUNKS:
+                chunk_ids = [
+                    chunk_id
+                    for document in documents
+                    for chunk_id in document_registry.chunk_ids(document["doc_id"])
+                ]
+                return self._exact_search(embedding, chunk_ids, k, tenant)
+            scope = [document["doc_id"] for document in documents]
+
+        return self.backend.query(tenant, [embedding], k, doc_ids=scope)[0]
+
+    def _exact_search(self, embedding, chunk_ids, k, tenant):
+        if not chunk_ids:
+            return []
+        ids, vectors = self.backend.get_embeddings(tenant, chunk_ids)
+        if not len(ids):
+            return []
+
+        # Same ordering as the backends' L2 distance
+        matrix = np.asarray(vectors, dtype=np.float32)
+        query = np.asarray(embedding, dtype=np.float32)
+        distances = np.einsum("ij,ij->i", matrix, matrix) - 2 * (matrix @ query)
+        if len(ids) > k:
+            top = np.argpartition(distances, k)[:k]
+        else:
+            top = np.arange(len(ids))
+        top = top[np.argsort(distances[top])]
+        by_id = {doc.id: doc for doc in self._get_documents(tenant, [ids[i] for i in top])}
+        return [by_id[ids[i]] for i in top if ids[i] in by_id]
+
+    def _get_documents(self, tenant, chunk_ids):
+        if not chunk_ids:
+            return []
+        return self.backend.get(tenant, chunk_ids)
+
+    def get_document_chunks(self, chunk_ids, tenant=DEFAULT_TENANT):
+        # A document's chunks in reading order (by page)
+        chunk_ids = list(chunk_ids)
+        chunks = []
+        for i in range(0, len(chunk_ids), 1000):
+            chunks.extend(self._get_documents(tenant, chunk_ids[i:i + 1000]))
+        return sorted(chunks, key=lambda doc: doc.metadata.get("page") or 0)
+
+    def as_retriever(self, k=None, tenant=DEFAULT_TENANT, doc_ids=None):
+        from app.services.retrievers import StoreRetriever
+
+        return StoreRetriever(
+            service=self,
+            k=k or settings.RETRIEVAL_K,
+            tenant=tenant,
+            doc_ids=doc_ids
         )
+    
+    def clear(self, tenant=DEFAULT_TENANT):
+        document_registry.clear(tenant)
+        self.sparse_index(tenant).clear()
+        self.refresh()
+        self.backend.drop(tenant)
+
+
+_vector_store = None
+_vector_store_lock = threading.Lock()
+
 
-vector_store = VectorStoreService()
+def get_vector_store() -> VectorStoreService:
+    # Opened on first use rather than at import: the backend, the caches and
+    # the embedding client take seconds to set up, which the API would
+    # otherwise spend before it can answer anything
+    global _vector_store
+    if _vector_store is None:
+        with _vector_store_lock:
+            if _vector_store is None:
+                _vector_store = VectorStoreService()
+    return _vector_store
@@ -0,0 +1,62 @@
+import asyncio
+import logging
+import time
+
+from app.core.config import settings
+from app.services.document_registry import DEFAULT_TENANT
+from app.services.metrics import span
+from app.services.model_registry import model_registry
+from app.services.offload import offload
+from app.services.ollama_client import get_http_client
+
+logger = logging.getLogger(__name__)
+
+# Step name -> "running", "ok" or "failed", shown on /api/health
+status = {}
+
+
+def open_vector_store():
+    from app.services.vector_store import get_vector_store
+
+    vector_store = get_vector_store()
+    # Opens the default tenant's collection and BM25 index
+    vector_store.backend.count(DEFAULT_TENANT)
+    vector_store.sparse_index(DEFAULT_TENANT)
+
+
+def build_chat_chain():
+    from app.services.chains import get_chain_factory
+
+    get_chain_factory().get_chat_chain(settings.CHAT_MODEL)
+
+
+async def _step(name: str, run):
+    status[name] = "running"
+    start = time.perf_counter()
+    try:
+        with span(f"warmup.{name}"):
+            await run()
+    except Exception as e:
+        # Left to the first request that needs it, e.g. when Ollama isn't up yet
+        status[name] = "failed"
+        logger.warning("Warm-up of %s failed: %s", name, e)
+    else:
+        status[name] = "ok"
+        logger.info("Warmed up %s in %.0f ms", name, (time.perf_counter() - start) * 1000)
+
+
+async def warm_up():
+    # Loads what the first requests would otherwise wait for. Runs in the
+    # background after startup; a step that fails never stops the API.
+    # The shared Ollama client loads the CA bundle when it's created, which
+    # would otherwise happen on the event loop
+    await offload("io", get_http_client)
+    await asyncio.gather(
+        _step("vector_store", lambda: offload("store", open_vector_store)),
+        _step("chat_chain", lambda: offload("store", build_chat_chain)),
+        _step("model_catalog", model_registry.catalog.get),
+        # Ollama loads a model on its first request, which can take longer
+        # than answering; have it do that now
+        _step("chat_model", lambda: model_registry.load(settings.CHAT_MODEL)),
+        _step("embedding_model", lambda: model_registry.load(settings.EMBEDDING_MODEL, embedding=True)),
+    )
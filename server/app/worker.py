@@ -0,0 +1,22 @@
+# Runs ingestion job workers outside the API process:
+#
+#   python -m app.worker
+#
+# Use together with JOB_WORKERS=0 on the API side to keep all ingestion work
+# off the machines (or containers) serving requests.
+import signal
+
+from app.core.config import settings
+from app.services.jobs import WorkerPool
+
+if __name__ == "__main__":
+    pool = WorkerPool(max(1, settings.JOB_WORKERS))
+    pool.start()
+
+    def shutdown(*_):
+        pool.stop()
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    signal.pause()
@@ -0,0 +1,105 @@
+# Time-to-first-audio of /audio-summary/stream against the whole pipeline.
+#
+# "full" writes the complete script, then synthesizes it in one call, which
+# is what a client waits for before playback without streaming. "stream"
+# feeds sentences to TTS while the script is still being generated and
+# reports when the first audio chunk and the last one are ready. The LLM is
+# a local fake Ollama server streaming a multi-sentence script; TTS is
+# simulated with a fixed cost per call plus a cost per character.
+#
+#   python -m benchmarks.audio_stream --runs 5 --concurrency 1,2,4
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.fake_ollama import FakeOllama
+
+SCRIPT = " ".join(
+    f"Sentence number {i} of the summary explains one more idea from the document." for i in range(12)
+)
+
+
+class SimulatedTTS:
+    # Loaded through TTS_BACKEND="module:Class"; same interface as TTSBackend
+    name = "simulated"
+    extension = "mp3"
+    media_type = "audio/mpeg"
+    call_latency = 0.15
+    char_latency = 0.002
+
+    def synthesize(self, text: str, path: str):
+        with open(path, "wb") as f:
+            f.write(self.synthesize_bytes(text))
+
+    def synthesize_bytes(self, text: str) -> bytes:
+        time.sleep(self.call_latency + self.char_latency * len(text))
+        return text.encode("utf-8")
+
+    def stream_chunk(self, audio: bytes, first: bool) -> bytes:
+        return audio
+
+
+async def full_pipeline():
+    from starlette.concurrency import run_in_threadpool
+    from app.services.audio_summary import generate_script
+    from app.services.tts import get_tts_backend
+
+    start = time.perf_counter()
+    script = await run_in_threadpool(generate_script, "")
+    await run_in_threadpool(get_tts_backend().synthesize_bytes, script)
+    return time.perf_counter() - start
+
+
+async def streamed():
+    from app.services.audio_summary import stream_audio_summary
+
+    start = time.perf_counter()
+    first = None
+    async for _ in stream_audio_summary():
+        if first is None:
+            first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+async def run(args):
+    # One event loop throughout: the LLM client is shared and bound to it
+    from app.core.config import settings
+    from app.services import offload
+
+    full = [await full_pipeline() for _ in range(args.runs)]
+    print(f"full pipeline: {statistics.median(full) * 1000:.0f} ms to first audio")
+    print(f"{'concurrency':>12} {'first audio ms':>15} {'all audio ms':>13}")
+    for concurrency in args.concurrency:
+        settings.TTS_STREAM_CONCURRENCY = concurrency
+        offload.shutdown()  # TTS pool is sized from the setting when created
+        runs = [await streamed() for _ in range(args.runs)]
+        print(
+            f"{concurrency:>12}"
+            f" {statistics.median(r[0] for r in runs) * 1000:>15.0f}"
+            f" {statistics.median(r[1] for r in runs) * 1000:>13.0f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--concurrency", default="1,2,4")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    args = parser.parse_args()
+    args.concurrency = [int(v) for v in args.concurrency.split(",")]
+
+    with FakeOllama(embed_dim=64, reply=SCRIPT, tokens_per_second=args.tokens_per_second) as fake, \
+            tempfile.TemporaryDirectory() as data_dir:
+        # Settings are read at import time, so configure before importing app
+        os.environ["OLLAMA_BASE_URL"] = fake.base_url
+        os.environ["CHROMA_PERSIST_DIRECTORY"] = os.path.join(data_dir, "chroma")
+        os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(data_dir, "embeddings.sqlite3")
+        os.environ["TTS_BACKEND"] = "benchmarks.audio_stream:SimulatedTTS"
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
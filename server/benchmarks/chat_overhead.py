@@ -0,0 +1,120 @@
+# Per-request overhead of /chat before and after chain caching.
+#
+# "before" builds ChatOllama, the prompts, the history-aware retriever and the
+# RunnableWithMessageHistory on every request, like chat() used to; "after"
+# takes the cached chain from ChainFactory. Reports construction time per
+# request and time-to-first-token over sequential requests against a local
+# fake Ollama server.
+#
+#   python -m benchmarks.chat_overhead --requests 50
+import argparse
+import asyncio
+import contextlib
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.fake_ollama import FakeOllama
+
+
+def build_chain_per_request(model_name, get_session_history):
+    from langchain_ollama import ChatOllama
+    from langchain_classic.chains.history_aware_retriever import create_history_aware_retriever
+    from langchain_classic.chains.retrieval import create_retrieval_chain
+    from langchain_classic.chains.combine_documents import create_stuff_documents_chain
+    from langchain_core.runnables.history import RunnableWithMessageHistory
+    from app.services.chains import contextualize_q_prompt, qa_prompt
+    from app.services.vector_store import get_vector_store
+    from app.core.config import settings
+
+    llm = ChatOllama(base_url=settings.OLLAMA_BASE_URL, model=model_name, temperature=0.7)
+    history_aware_retriever = create_history_aware_retriever(
+        llm, get_vector_store().as_retriever(), contextualize_q_prompt
+    )
+    question_answer_chain = create_stuff_documents_chain(llm, qa_prompt)
+    rag_chain = create_retrieval_chain(history_aware_retriever, question_answer_chain)
+    return RunnableWithMessageHistory(
+        rag_chain,
+        get_session_history,
+        input_messages_key="input",
+        history_messages_key="chat_history",
+        output_messages_key="answer",
+    )
+
+
+async def time_to_first_token(get_chain, session_id):
+    start = time.perf_counter()
+    chain = get_chain()
+    events = chain.astream_events(
+        {"input": "What does the document say?"},
+        config={"configurable": {"session_id": session_id}},
+        version="v2",
+    )
+    async with contextlib.aclosing(events):
+        async for event in events:
+            if event["event"] == "on_chat_model_stream" and event["data"]["chunk"].content:
+                return time.perf_counter() - start
+    return time.perf_counter() - start
+
+
+def summarize(label, samples):
+    samples = sorted(samples)
+    p50 = statistics.median(samples) * 1000
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000
+    print(f"{label:<28} p50 {p50:8.3f} ms   p99 {p99:8.3f} ms")
+
+
+async def run(args):
+    from langchain_community.chat_message_histories import ChatMessageHistory
+    from app.services.chains import ChainFactory
+
+    # Fresh history per request keeps every run on the same code path
+    def get_session_history(session_id):
+        return ChatMessageHistory()
+
+    factory = ChainFactory(get_session_history)
+    model = "fake-chat:latest"
+
+    build_before, build_after = [], []
+    for _ in range(args.requests):
+        start = time.perf_counter()
+        build_chain_per_request(model, get_session_history)
+        build_before.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        factory.get_chat_chain(model)
+        build_after.append(time.perf_counter() - start)
+
+    ttft_before, ttft_after = [], []
+    for i in range(args.requests):
+        ttft_before.append(await time_to_first_token(
+            lambda: build_chain_per_request(model, get_session_history), f"before-{i}"
+        ))
+        ttft_after.append(await time_to_first_token(
+            lambda: factory.get_chat_chain(model), f"after-{i}"
+        ))
+
+    summarize("chain setup (before)", build_before)
+    summarize("chain setup (after)", build_after)
+    summarize("time to first token (before)", ttft_before)
+    summarize("time to first token (after)", ttft_after)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--first-token-latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    with FakeOllama(first_token_latency=args.first_token_latency, embed_dim=64) as fake, \
+            tempfile.TemporaryDirectory() as data_dir:
+        # Settings are read at import time, so configure before importing app
+        os.environ["OLLAMA_BASE_URL"] = fake.base_url
+        os.environ["CHROMA_PERSIST_DIRECTORY"] = os.path.join(data_dir, "chroma")
+        os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(data_dir, "embeddings.sqlite3")
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+# /chat latency while PDFs are being uploaded and web pages submitted.
+#
+# The API runs under uvicorn in this process, against a local fake Ollama.
+# Chat clients stream answers back to back and record time-to-first-token;
+# meanwhile upload clients post generated PDFs to /api/ingest and pages of a
+# local fake site to /api/ingest-url. Ingestion jobs are only queued
+# (JOB_WORKERS=0), so what is measured is the endpoints' own work.
+#
+# "idle" is chat alone. "inline" runs the endpoints' blocking calls (PDF
+# sampling, HTML parsing, SQLite, Chroma) directly on the event loop, as the
+# handlers used to; "offload" sends them through the offload pools.
+#
+#   python -m benchmarks.chat_under_ingest --seconds 10 --chat-clients 4 --upload-clients 2
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.fake_ollama import FakeOllama
+from benchmarks.fake_site import FakeSite
+
+
+def make_pdf(pages: int, tag: str) -> bytes:
+    import fitz
+
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 40), f"Quarterly Report {tag}", fontsize=9)
+        y = 90
+        for line in range(40):
+            page.insert_text((72, y), f"Line {line} of page {page_num}: revenue, costs and the balance for {tag}.", fontsize=10)
+            y += 16
+        page.insert_text((72, 800), f"Page {page_num + 1}", fontsize=9)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+async def inline(workload, func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
+def set_offload(replacement):
+    # Every module that imported offload() gets the replacement
+    from app.services import offload
+
+    original = offload.offload
+    for module in list(sys.modules.values()):
+        if getattr(module, "offload", None) in (original, inline):
+            module.offload = replacement
+
+
+async def chat_client(base_url, deadline, samples):
+    import httpx
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        n = 0
+        while time.perf_counter() < deadline:
+            n += 1
+            start = time.perf_counter()
+            body = {"message": f"What does the report say about item {n}?", "session_id": f"s{id(samples)}-{n}"}
+            first = None
+            async with client.stream("POST", "/api/chat", json=body) as response:
+                async for line in response.aiter_lines():
+                    if first is None and '"token"' in line:
+                        first = time.perf_counter() - start
+            if first is not None:
+                samples.append(first)
+
+
+async def upload_client(base_url, deadline, pdfs, site, counts):
+    import httpx
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        n = 0
+        while time.perf_counter() < deadline and pdfs:
+            n += 1
+            files = [("files", (f"report-{n}.pdf", pdfs.pop(), "application/pdf"))]
+            (await client.post("/api/ingest", files=files)).raise_for_status()
+            counts["uploads"] += 1
+            url = f"{site.base_url}/docs/page-{n % site.pages}.html"
+            (await client.post("/api/ingest-url", json={"url": url})).raise_for_status()
+            counts["urls"] += 1
+
+
+def serve(app, port):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+async def load(base_url, args, site, pdfs):
+    deadline = time.perf_counter() + args.seconds
+    samples, counts = [], {"uploads": 0, "urls": 0}
+    clients = [chat_client(base_url, deadline, samples) for _ in range(args.chat_clients)]
+    clients += [upload_client(base_url, deadline, pdfs, site, counts) for _ in range(args.upload_clients if pdfs else 0)]
+    await asyncio.gather(*clients)
+    return samples, counts
+
+
+def run(args, site):
+    from app.main import app
+    from app.services import offload
+    from app.services.ingestion import process_pdf
+
+    # Something for chat to retrieve
+    path = os.path.join(os.environ["BENCH_DIR"], "indexed.pdf")
+    with open(path, "wb") as f:
+        f.write(make_pdf(20, "indexed"))
+    process_pdf(path, "indexed.pdf", progress=lambda **_: None)
+
+    # Made up front so the clients don't compete with the server for the
+    # CPU; each upload is a different file, so the extraction cache never
+    # has it yet
+    import fitz
+    base = fitz.open(stream=make_pdf(args.pages, "upload"), filetype="pdf")
+    uploads = []
+    for n in range(args.uploads):
+        base.set_metadata({"title": f"upload {n}"})
+        uploads.append(base.tobytes())
+
+    print(f"{'mode':<8} {'chats':>6} {'uploads':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+          f" {'lag p95':>8} {'lag max':>8} {'stalls':>7}")
+    # One server for all modes: clients it holds (Ollama, web) stay on its loop
+    server, thread = serve(app, args.port)
+    try:
+        for mode, with_uploads, replacement in (
+            ("idle", False, offload.offload),
+            ("inline", True, inline),
+            ("offload", True, offload.offload),
+        ):
+            set_offload(replacement)
+            offload.loop_monitor.reset()
+            pdfs = uploads[:] if with_uploads else []
+            samples, counts = asyncio.run(load(f"http://127.0.0.1:{args.port}", args, site, pdfs))
+            samples.sort()
+            lag = offload.loop_monitor.stats()
+            p = lambda q: samples[min(len(samples) - 1, int(len(samples) * q))] * 1000
+            print(
+                f"{mode:<8} {len(samples):>6} {counts['uploads']:>8} {statistics.median(samples) * 1000:>8.0f}"
+                f" {p(0.95):>8.0f} {p(0.99):>8.0f} {lag.get('p95_ms', 0):>8.0f} {lag['max_lag_ms']:>8.0f}"
+                f" {lag['stalls']:>7}"
+            )
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--chat-clients", type=int, default=4)
+    parser.add_argument("--upload-clients", type=int, default=2)
+    parser.add_argument("--pages", type=int, default=200, help="pages per uploaded PDF")
+    parser.add_argument("--uploads", type=int, default=40, help="most PDFs uploaded per mode")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    with FakeOllama(embed_dim=64, reply="The report covers revenue and costs.", tokens_per_second=400) as fake, \
+            FakeSite(pages=50, paragraphs=400, latency=0.0) as site, \
+            tempfile.TemporaryDirectory() as data_dir:
+        # Settings are read at import time, so configure before importing app
+        os.environ["BENCH_DIR"] = data_dir
+        os.environ["OLLAMA_BASE_URL"] = fake.base_url
+        os.environ["CHROMA_PERSIST_DIRECTORY"] = os.path.join(data_dir, "chroma")
+        for name, file in (("EMBEDDING_CACHE_PATH", "embeddings"), ("EXTRACTION_CACHE_PATH", "extraction"),
+                           ("CRAWL_CACHE_PATH", "web"), ("JOBS_DB_PATH", "jobs")):
+            os.environ[name] = os.path.join(data_dir, f"{file}.sqlite3")
+        os.environ["JOB_WORKERS"] = "0"
+        os.environ["SUMMARY_ENABLED"] = "false"
+        os.environ["ANSWER_CACHE_ENABLED"] = "false"
+        os.chdir(data_dir)
+        run(args, site)
+
+
+if __name__ == "__main__":
+    main()
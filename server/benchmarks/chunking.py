@@ -0,0 +1,96 @@
+# Chunking speed and chunk shape: the per-page RecursiveCharacterTextSplitter
+# ingestion used to run (1000 characters, 200 overlap) against TextChunker.
+# The input is a synthetic document of --pages pages of paragraphs and
+# numbered headings, where the last paragraph of every page runs on to the
+# next one, like text extracted from a real PDF.
+#
+# Reports time, chunk count, chunk sizes in tokens (estimated, or exact with
+# --tokenizer), and the share of chunks that start mid-sentence.
+#
+#   python -m benchmarks.chunking --pages 1000
+import argparse
+import random
+import statistics
+import time
+
+WORDS = (
+    "agreement party clause term payment notice liability account balance report quarter "
+    "revenue section schedule termination interest rate invoice tax period the of and to in"
+).split()
+
+
+def sentence(rng):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 24))]
+    return words[0].capitalize() + " " + " ".join(words[1:]) + "."
+
+
+def make_pages(count, seed=0):
+    rng = random.Random(seed)
+    pages = []
+    carry = ""
+    for page_num in range(count):
+        paragraphs = []
+        if carry:
+            paragraphs.append(carry)
+        if page_num % 5 == 0:
+            paragraphs.append(f"{page_num // 5 + 1}. {rng.choice(WORDS).capitalize()} Overview")
+        for _ in range(rng.randint(3, 5)):
+            paragraphs.append(" ".join(sentence(rng) for _ in range(rng.randint(2, 6))))
+        # The last paragraph breaks off mid-sentence and continues overleaf
+        tail = " ".join(sentence(rng) for _ in range(3))
+        cut = tail.rfind(" ", 0, len(tail) // 2)
+        paragraphs.append(tail[:cut])
+        carry = tail[cut + 1:]
+        pages.append((page_num, "\n\n".join(paragraphs)))
+    return pages
+
+
+def old_splitter(pages):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, length_function=len)
+    return [chunk for _, text in pages for chunk in splitter.split_text(text)]
+
+
+def new_chunker(chunker, pages):
+    return [text for text, _, _, _ in chunker.split_pages(pages)]
+
+
+def report(name, chunks, seconds, counter, budget):
+    tokens = counter.count_many(chunks)
+    mid_sentence = sum(1 for chunk in chunks if chunk[:1].islower()) / len(chunks)
+    print(
+        f"{name:<10} {seconds * 1000:>9.1f} {len(chunks):>8} {statistics.mean(tokens):>9.1f}"
+        f" {int(tokens.max()):>8} {int((tokens > budget).sum()):>8} {mid_sentence:>10.1%}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--chunk-tokens", type=int, default=256)
+    parser.add_argument("--overlap-tokens", type=int, default=48)
+    parser.add_argument("--tokenizer", default="", help="tokenizer.json path or Hugging Face repo")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    from app.services.chunking import TextChunker
+    from app.services.tokens import TokenCounter
+
+    counter = TokenCounter(args.tokenizer)
+    chunker = TextChunker(args.chunk_tokens, args.overlap_tokens, counter=counter)
+    pages = make_pages(args.pages)
+
+    print(f"{args.pages} pages, {sum(len(t) for _, t in pages)} chars, tokens {'exact' if counter.exact else 'estimated'}")
+    print(f"{'splitter':<10} {'ms':>9} {'chunks':>8} {'mean tok':>9} {'max tok':>8} {'> budget':>8} {'mid-sent.':>10}")
+    for name, split in (("recursive", old_splitter), ("chunker", lambda p: new_chunker(chunker, p))):
+        samples = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            chunks = split(pages)
+            samples.append(time.perf_counter() - start)
+        report(name, chunks, statistics.median(samples), counter, args.chunk_tokens)
+
+
+if __name__ == "__main__":
+    main()
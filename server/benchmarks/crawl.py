@@ -0,0 +1,84 @@
+# Crawl time for a multi-page site: the old sequential fetch (one
+# WebBaseLoader-style request after another, no cache) against crawl() with
+# CRAWL_CONCURRENCY requests in flight, cold and then again with a warm
+# response cache, both while it is fresh (no requests) and once it has gone
+# stale (conditional requests answered 304). The site is a local fake with
+# a fixed latency per request.
+#
+#   python -m benchmarks.crawl --pages 100 --depth 3 --latency 0.05
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.fake_site import FakeSite
+
+
+def sequential(site, depth, max_pages):
+    # Breadth-first, one blocking request at a time
+    import httpx
+    from urllib.parse import urldefrag, urljoin
+    from app.services.crawler import _in_scope, html_to_page
+
+    seen, pages, frontier = {site.start_url}, [], [site.start_url]
+    with httpx.Client() as client:
+        for level in range(depth + 1):
+            next_frontier = []
+            for url in frontier:
+                page, links = html_to_page(url, client.get(url).content, level)
+                pages.append(page)
+                for link in links:
+                    link = urldefrag(urljoin(url, link))[0]
+                    if link not in seen and _in_scope(link, site.start_url) and len(seen) < max_pages:
+                        seen.add(link)
+                        next_frontier.append(link)
+            frontier = next_frontier
+    return pages
+
+
+def timed(site, label, run):
+    before = dict(site.counts)
+    start = time.perf_counter()
+    pages = run()
+    seconds = time.perf_counter() - start
+    full = site.counts["200"] - before["200"]
+    not_modified = site.counts["304"] - before["304"]
+    print(f"{label:<22} {seconds * 1000:>9.0f} {len(pages):>6} {full:>8} {not_modified:>6}")
+
+
+def run(site, args):
+    from app.core.config import settings
+    from app.services.crawler import crawl
+
+    def crawled():
+        return asyncio.run(crawl(site.start_url, depth=args.depth, max_pages=args.max_pages))
+
+    print(f"{'':<22} {'ms':>9} {'pages':>6} {'200s':>8} {'304s':>6}")
+    timed(site, "sequential", lambda: sequential(site, args.depth, args.max_pages))
+    timed(site, f"crawl x{settings.CRAWL_CONCURRENCY}, cold", crawled)
+    timed(site, "crawl, fresh cache", crawled)
+    settings.CRAWL_CACHE_FRESH_SECONDS = 0
+    timed(site, "crawl, revalidated", crawled)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--fanout", type=int, default=4)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--max-pages", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    with FakeSite(pages=args.pages, fanout=args.fanout, latency=args.latency) as site, \
+            tempfile.TemporaryDirectory() as data_dir:
+        # Settings are read at import time, so configure before importing app
+        os.environ["CRAWL_CACHE_PATH"] = os.path.join(data_dir, "web.sqlite3")
+        os.environ["CRAWL_CONCURRENCY"] = str(args.concurrency)
+        run(site, args)
+
+
+if __name__ == "__main__":
+    main()
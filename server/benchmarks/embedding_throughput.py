@@ -0,0 +1,58 @@
+# Reports embedding throughput (chunks/sec) of EmbeddingWorker at different
+# batch sizes and concurrency levels, against a local fake Ollama server.
+#
+#   python -m benchmarks.embedding_throughput --chunks 2000
+import argparse
+import itertools
+import time
+
+from langchain_ollama import OllamaEmbeddings
+
+from app.services.embedding_worker import EmbeddingWorker
+from benchmarks.fake_ollama import FakeOllama
+
+
+def run(base_url, texts, batch_size, concurrency, max_pending):
+    worker = EmbeddingWorker(
+        OllamaEmbeddings(base_url=base_url, model="fake-embed"),
+        batch_size=batch_size,
+        concurrency=concurrency,
+        max_pending=max_pending,
+    )
+    try:
+        start = time.perf_counter()
+        vectors = worker.embed_documents(texts)
+        elapsed = time.perf_counter() - start
+    finally:
+        worker.shutdown()
+    assert len(vectors) == len(texts)
+    return len(texts) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=1000)
+    parser.add_argument("--batch-sizes", default="8,16,32,64")
+    parser.add_argument("--concurrency", default="1,2,4,8")
+    parser.add_argument("--server-parallel", type=int, default=4)
+    parser.add_argument("--request-latency", type=float, default=0.02)
+    parser.add_argument("--per-item-latency", type=float, default=0.002)
+    args = parser.parse_args()
+
+    texts = [f"chunk {i} " + "lorem ipsum dolor sit amet " * 20 for i in range(args.chunks)]
+    batch_sizes = [int(v) for v in args.batch_sizes.split(",")]
+    concurrencies = [int(v) for v in args.concurrency.split(",")]
+
+    with FakeOllama(
+        request_latency=args.request_latency,
+        per_item_latency=args.per_item_latency,
+        parallel=args.server_parallel,
+    ) as fake:
+        print(f"{'batch':>6} {'conc':>5} {'chunks/s':>10}")
+        for batch_size, concurrency in itertools.product(batch_sizes, concurrencies):
+            rate = run(fake.base_url, texts, batch_size, concurrency, max_pending=concurrency * 2)
+            print(f"{batch_size:>6} {concurrency:>5} {rate:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+import hashlib
+import json
+import struct
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _seconds(keep_alive, default):
+    # Ollama's keep_alive: seconds, or a duration like "5m"; negative = forever
+    if keep_alive is None:
+        return default
+    if isinstance(keep_alive, str):
+        units = {"s": 1, "m": 60, "h": 3600}
+        if keep_alive[-1:] in units:
+            keep_alive = float(keep_alive[:-1]) * units[keep_alive[-1]]
+        keep_alive = float(keep_alive)
+    return float("inf") if keep_alive < 0 else keep_alive
+
+
+class FakeOllama:
+    # Deterministic local stand-in for the Ollama HTTP API, for benchmarks.
+    # Embeddings are derived from a hash of the input text, so the same text
+    # always maps to the same vector. Latency is modelled as a fixed cost per
+    # request plus a cost per input, and `parallel` caps how many requests are
+    # served at once, like OLLAMA_NUM_PARALLEL does on a real server. Chat
+    # replies stream a fixed answer after `first_token_latency`, at
+    # `tokens_per_second`; `model_latency` overrides the first-token latency
+    # per model name, to stand in for models of different sizes. The first
+    # request for each model also waits `load_latency`, like Ollama loading
+    # it into memory; an empty /api/generate request only loads the model.
+    # A model stays loaded for `keep_alive` seconds after its last request
+    # (or the request's own "keep_alive"), and /api/ps lists loaded models.
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        embed_dim: int = 768,
+        request_latency: float = 0.02,
+        per_item_latency: float = 0.002,
+        parallel: int = 4,
+        first_token_latency: float = 0.05,
+        tokens_per_second: float = 200.0,
+        reply: str = "This is a deterministic answer generated by the fake Ollama server.",
+        models=("fake-chat:latest", "fake-embed:latest"),
+        model_latency=None,
+        load_latency: float = 0.0,
+        keep_alive: float = 300.0,
+    ):
+        self.embed_dim = embed_dim
+        self.request_latency = request_latency
+        self.per_item_latency = per_item_latency
+        self.first_token_latency = first_token_latency
+        self.tokens_per_second = tokens_per_second
+        self.reply = reply
+        self.models = list(models)
+        self.model_latency = dict(model_latency or {})
+        self.load_latency = load_latency
+        self.keep_alive = keep_alive
+        self.loads = 0
+        self._loaded = {}
+        self.requests = 0
+        self._slots = threading.BoundedSemaphore(max(1, parallel))
+        self._lock = threading.Lock()
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with fake._lock:
+                    fake.requests += 1
+                if self.path == "/api/tags":
+                    return self._send(200, fake._tags())
+                if self.path == "/api/ps":
+                    return self._send(200, fake._ps())
+                self._send(404, {"error": "not found"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                route = fake._routes().get(self.path)
+                if route is None:
+                    return self._send(404, {"error": "not found"})
+                with fake._lock:
+                    fake.requests += 1
+                with fake._slots:
+                    if self.path == "/api/chat" and body.get("stream", True):
+                        return self._stream(route(body))
+                    status, payload = route(body)
+                self._send(status, payload)
+
+            def _stream(self, lines):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for line in lines:
+                        data = json.dumps(line).encode() + b"\n"
+                        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                        self.wfile.flush()
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # Client stopped reading, e.g. after the first token
+                    self.close_connection = True
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _routes(self):
+        return {
+            "/api/embed": self._embed,
+            "/api/chat": self._chat,
+            "/api/generate": self._generate,
+        }
+
+    def _load(self, model, keep_alive=None):
+        # Requests that arrive while the model loads wait for it too.
+        # model -> [loaded event, unload time]
+        with self._lock:
+            entry = self._loaded.get(model)
+            first = entry is None or entry[1] < time.monotonic()
+            if first:
+                entry = self._loaded[model] = [threading.Event(), float("inf")]
+                self.loads += 1
+        if first:
+            time.sleep(self.load_latency)
+            entry[0].set()
+        entry[0].wait()
+        with self._lock:
+            entry[1] = time.monotonic() + _seconds(keep_alive, self.keep_alive)
+
+    def embed_text(self, text: str):
+        # Stretch a sha256 digest into embed_dim floats in [-1, 1)
+        values = []
+        counter = 0
+        while len(values) < self.embed_dim:
+            digest = hashlib.sha256(f"{counter}:{text}".encode()).digest()
+            values.extend(v / 32768.0 for v in struct.unpack("<16h", digest))
+            counter += 1
+        return values[:self.embed_dim]
+
+    def _embed(self, body):
+        self._load(body.get("model", ""), body.get("keep_alive"))
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        time.sleep(self.request_latency + self.per_item_latency * len(inputs))
+        return 200, {
+            "model": body.get("model", ""),
+            "embeddings": [self.embed_text(text) for text in inputs],
+        }
+
+    def _tags(self):
+        time.sleep(self.request_latency)
+        return {
+            "models": [
+                {"name": name, "model": name, "size": 0, "digest": hashlib.sha256(name.encode()).hexdigest()}
+                for name in self.models
+            ]
+        }
+
+    def _ps(self):
+        time.sleep(self.request_latency)
+        now = time.monotonic()
+        with self._lock:
+            loaded = [
+                (model, min(entry[1] - now, 10 ** 9))
+                for model, entry in self._loaded.items()
+                if entry[0].is_set() and entry[1] >= now
+            ]
+        return {
+            "models": [
+                {
+                    "name": model,
+                    "model": model,
+                    "size": 0,
+                    "size_vram": 0,
+                    "expires_at": (datetime.now(timezone.utc) + timedelta(seconds=remaining)).isoformat(),
+                }
+                for model, remaining in loaded
+            ]
+        }
+
+    def _chat_tokens(self):
+        return [word + " " for word in self.reply.split()]
+
+    def _chat(self, body):
+        model = body.get("model", "")
+        self._load(model, body.get("keep_alive"))
+        tokens = self._chat_tokens()
+        first_token_latency = self.model_latency.get(model, self.first_token_latency)
+
+        def message(content, done):
+            line = {
+                "model": model,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "message": {"role": "assistant", "content": content},
+                "done": done,
+            }
+            if done:
+                line.update({"done_reason": "stop", "eval_count": len(tokens)})
+            return line
+
+        if not body.get("stream", True):
+            time.sleep(first_token_latency + len(tokens) / self.tokens_per_second)
+            return 200, message("".join(tokens), True)
+
+        def stream():
+            time.sleep(first_token_latency)
+            for token in tokens:
+                yield message(token, False)
+                time.sleep(1 / self.tokens_per_second)
+            yield message("", True)
+
+        return stream()
+
+    def _generate(self, body):
+        model = body.get("model", "")
+        self._load(model, body.get("keep_alive"))
+        if body.get("prompt"):
+            return 400, {"error": "only empty (model loading) requests are supported"}
+        return 200, {
+            "model": model,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "response": "",
+            "done": True,
+            "done_reason": "load",
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,111 @@
+import hashlib
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "install configure server client request response cache token index query "
+    "document page section example option default value the of and to in"
+).split()
+
+
+class FakeSite:
+    # Local documentation site for crawler benchmarks: `pages` HTML pages
+    # under /docs/ linked as a tree, `fanout` children per page, plus nav links
+    # the crawler should skip. Every page has a stable ETag and
+    # Last-Modified and answers conditional requests with 304. `latency` is
+    # added to every request, standing in for a remote server.
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, pages: int = 100, fanout: int = 4,
+                 paragraphs: int = 8, latency: float = 0.05):
+        self.pages = pages
+        self.fanout = fanout
+        self.paragraphs = paragraphs
+        self.latency = latency
+        self.last_modified = formatdate(time.time() - 86400, usegmt=True)
+        self.counts = {"200": 0, "304": 0, "404": 0}
+        self._lock = threading.Lock()
+
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                time.sleep(site.latency)
+                body = site.page(self.path)
+                if body is None:
+                    return self._send(404, b"not found", "text/plain")
+                etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+                if self.headers.get("If-None-Match") == etag:
+                    return self._send(304, b"", None, etag)
+                self._send(200, body, "text/html; charset=utf-8", etag)
+
+            def _send(self, status, body, content_type, etag=None):
+                with site._lock:
+                    site.counts[str(status)] += 1
+                self.send_response(status)
+                if content_type:
+                    self.send_header("Content-Type", content_type)
+                if etag:
+                    self.send_header("ETag", etag)
+                    self.send_header("Last-Modified", site.last_modified)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def start_url(self) -> str:
+        return f"{self.base_url}/docs/page-0.html"
+
+    def page(self, path: str):
+        if not path.startswith("/docs/page-") or not path.endswith(".html"):
+            return None
+        try:
+            number = int(path[len("/docs/page-"):-len(".html")])
+        except ValueError:
+            return None
+        if not 0 <= number < self.pages:
+            return None
+
+        words = [WORDS[(number * 7 + i * 3) % len(WORDS)] for i in range(60)]
+        paragraphs = "".join(
+            f"<p>{' '.join(words[i:] + words[:i]).capitalize()}.</p>" for i in range(self.paragraphs)
+        )
+        children = [(number * self.fanout + i) % self.pages for i in range(1, self.fanout + 1)]
+        links = "".join(f'<li><a href="page-{child}.html">Page {child}</a></li>' for child in children)
+        return (
+            f"<html><head><title>Page {number}</title></head><body>"
+            f'<nav><a href="/">Home</a><a href="/blog/">Blog</a></nav>'
+            f"<main><h1>Page {number}</h1>{paragraphs}<ul>{links}</ul></main>"
+            f'<footer><a href="/static/logo.png">logo</a></footer>'
+            f"</body></html>"
+        ).encode("utf-8")
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
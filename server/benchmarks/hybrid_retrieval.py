@@ -0,0 +1,143 @@
+# Recall and latency of hybrid (BM25 + dense, fused by RRF) retrieval over a
+# synthetic corpus. Every chunk carries an account-style identifier; chunk
+# text is Zipf-distributed filler plus words from one of a few hundred
+# topics. The dense side is simulated with topic vectors that cannot see
+# identifiers, which is how real embeddings fail on exact terms.
+#
+# Two query sets:
+#   identifier  topic words from the chunk + the chunk's identifier
+#   semantic    topic words only, with a dense vector close to the chunk's
+#               own (a paraphrase the embedding understands)
+#
+#   python -m benchmarks.hybrid_retrieval --chunks 1000000
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.sparse_index import SparseIndex, reciprocal_rank_fusion
+
+
+def make_vocabulary(rng, size):
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(letters, rng.integers(4, 10))))
+    return np.array(sorted(words))
+
+
+def make_corpus(rng, args):
+    vocabulary = make_vocabulary(rng, args.vocabulary)
+    topic_words = rng.choice(len(vocabulary), size=(args.topics, 20), replace=False)
+    topics = rng.integers(0, args.topics, args.chunks)
+
+    zipf = 1.0 / np.arange(1, len(vocabulary) + 1) ** 1.1
+    zipf /= zipf.sum()
+    filler = rng.choice(len(vocabulary), size=(args.chunks, args.chunk_tokens), p=zipf)
+    picks = rng.integers(0, 20, size=(args.chunks, 8))
+
+    texts = []
+    for i in range(args.chunks):
+        words = vocabulary[filler[i]].tolist()
+        words += vocabulary[topic_words[topics[i], picks[i]]].tolist()
+        words.append(f"ACC-{i:07d}")
+        texts.append(" ".join(words))
+    return vocabulary, topic_words, topics, picks, texts
+
+
+def recall(results, targets):
+    return sum(target in ranked for ranked, target in zip(results, targets)) / len(targets)
+
+
+def percentile(values, q):
+    return statistics.quantiles(values, n=100)[q - 1] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=1_000_000)
+    parser.add_argument("--chunk-tokens", type=int, default=60)
+    parser.add_argument("--vocabulary", type=int, default=50_000)
+    parser.add_argument("--topics", type=int, default=300)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--dim", type=int, default=32)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    start = time.perf_counter()
+    vocabulary, topic_words, topics, picks, texts = make_corpus(rng, args)
+    chunk_ids = [f"c{i}" for i in range(args.chunks)]
+    doc_ids = [f"d{i // 100}" for i in range(args.chunks)]
+    print(f"generated {args.chunks} chunks in {time.perf_counter() - start:.1f}s")
+
+    with tempfile.TemporaryDirectory() as directory:
+        index = SparseIndex(os.path.join(directory, "sparse.sqlite3"))
+        start = time.perf_counter()
+        for i in range(0, args.chunks, 10_000):
+            index.add(chunk_ids[i:i + 10_000], texts[i:i + 10_000], doc_ids[i:i + 10_000])
+        written = time.perf_counter() - start
+        start = time.perf_counter()
+        index.sync()
+        loaded = time.perf_counter() - start
+        print(f"indexed in {written:.1f}s, loaded postings in {loaded:.1f}s")
+        del texts
+
+        centroids = rng.normal(size=(args.topics, args.dim)).astype(np.float32)
+        vectors = centroids[topics] + 0.8 * rng.normal(size=(args.chunks, args.dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+        targets = rng.choice(args.chunks, args.queries, replace=False)
+        query_sets = {}
+        for name in ("identifier", "semantic"):
+            queries = []
+            for target in targets:
+                if name == "identifier":
+                    # Words the chunk itself contains, as a user quoting it would
+                    words = vocabulary[topic_words[topics[target], picks[target, :4]]].tolist()
+                    words.append(f"ACC-{target:07d}")
+                    vector = centroids[topics[target]] + 0.8 * rng.normal(size=args.dim)
+                else:
+                    words = vocabulary[rng.choice(topic_words[topics[target]], 4, replace=False)].tolist()
+                    vector = vectors[target] + 0.1 * rng.normal(size=args.dim)
+                queries.append((" ".join(words), vector.astype(np.float32)))
+            query_sets[name] = queries
+
+        print(f"\n{'queries':<11} {'dense':>7} {'bm25':>7} {'hybrid':>7}   recall@{args.k}")
+        sparse_times, fusion_times = [], []
+        for name, queries in query_sets.items():
+            dense_results, sparse_results, hybrid_results = [], [], []
+            for text, vector in queries:
+                scores = vectors @ vector
+                top = np.argpartition(scores, -args.candidates)[-args.candidates:]
+                dense = [chunk_ids[i] for i in top[np.argsort(-scores[top])]]
+
+                start = time.perf_counter()
+                sparse = [chunk_id for chunk_id, _ in index.search(text, args.candidates)]
+                sparse_times.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                hybrid = reciprocal_rank_fusion([dense, sparse], [1.0, 1.0])[:args.k]
+                fusion_times.append(time.perf_counter() - start)
+
+                dense_results.append(dense[:args.k])
+                sparse_results.append(sparse[:args.k])
+                hybrid_results.append(hybrid)
+
+            wanted = [chunk_ids[i] for i in targets]
+            print(
+                f"{name:<11} {recall(dense_results, wanted):>7.3f}"
+                f" {recall(sparse_results, wanted):>7.3f} {recall(hybrid_results, wanted):>7.3f}"
+            )
+
+        print(f"\n{'stage':<11} {'p50 ms':>8} {'p99 ms':>8}")
+        print(f"{'bm25':<11} {percentile(sparse_times, 50):>8.3f} {percentile(sparse_times, 99):>8.3f}")
+        print(f"{'fusion':<11} {percentile(fusion_times, 50):>8.3f} {percentile(fusion_times, 99):>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
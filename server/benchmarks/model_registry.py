@@ -0,0 +1,115 @@
+# The model registry against a local fake Ollama:
+#
+#   catalog    --clients concurrent /models calls, --rounds times: upstream
+#              /api/tags requests and latency, for a request per call (what
+#              /models used to do), coalescing only (MODEL_CATALOG_TTL=0) and
+#              the cached catalog
+#   keep-warm  a model used once, then left idle for --idle seconds, longer
+#              than the fake server keeps it loaded (--keep-alive): latency of
+#              the next request, which pays --load-latency unless keep-alive
+#              pings kept the model loaded
+#
+#   python -m benchmarks.model_registry --clients 20 --rounds 10 --idle 6
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from benchmarks.fake_ollama import FakeOllama
+
+
+async def bench_catalog(fake, args):
+    from app.api.endpoints import models
+    from app.services.model_registry import ModelRegistry
+    from app.services.ollama_client import get_http_client
+
+    async def per_request():
+        # The old /models: one /api/tags request per call
+        response = await get_http_client().get("/api/tags")
+        response.raise_for_status()
+        return response.json()
+
+    cases = (
+        ("per request", per_request),
+        ("coalesced", None),
+        ("cached", None),
+    )
+    print(f"{'':<12} {'upstream':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for label, call in cases:
+        if call is None:
+            registry = ModelRegistry(
+                catalog_ttl=0 if label == "coalesced" else 60, keep_warm=0, interval=60, keep_alive="5m"
+            )
+            models.model_registry = registry
+            call = models.list_models
+        before = fake.requests
+        samples = []
+
+        async def timed():
+            start = time.perf_counter()
+            await call()
+            samples.append(time.perf_counter() - start)
+
+        for _ in range(args.rounds):
+            await asyncio.gather(*(timed() for _ in range(args.clients)))
+        samples.sort()
+        print(
+            f"{label:<12} {fake.requests - before:>9} {statistics.median(samples) * 1000:>8.1f}"
+            f" {samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000:>8.1f}"
+        )
+
+
+async def bench_keep_warm(fake, args):
+    from app.services.model_registry import ModelRegistry
+    from app.services.ollama_client import get_http_client
+
+    print(f"\n{'':<12} {'after idle ms':>14} {'loads':>6} {'pings':>6}")
+    for label, keep_warm in (("no pings", False), ("keep-warm", True)):
+        # A model name per case, so each starts unloaded
+        model = f"{label}:latest"
+        registry = ModelRegistry(
+            catalog_ttl=60, keep_warm=600, interval=args.keep_alive / 4, keep_alive=f"{args.keep_alive}s"
+        )
+        loads = fake.loads
+        await get_http_client().post("/api/generate", json={"model": model})
+        if keep_warm:
+            registry.touch(model)
+            registry.start()
+        await asyncio.sleep(args.idle)
+        await registry.stop()
+
+        start = time.perf_counter()
+        response = await get_http_client().post(
+            "/api/chat", json={"model": model, "messages": [{"role": "user", "content": "hi"}], "stream": False}
+        )
+        response.raise_for_status()
+        after_idle = time.perf_counter() - start
+        print(f"{label:<12} {after_idle * 1000:>14.0f} {fake.loads - loads:>6} {registry.pings:>6}")
+
+
+async def run(fake, args):
+    await bench_catalog(fake, args)
+    await bench_keep_warm(fake, args)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=20, help="concurrent /models calls")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.02, help="fake Ollama: seconds per request")
+    parser.add_argument("--load-latency", type=float, default=2.0, help="fake Ollama: seconds to load a model")
+    parser.add_argument("--keep-alive", type=float, default=2.0, help="fake Ollama: seconds a model stays loaded")
+    parser.add_argument("--idle", type=float, default=6.0, help="seconds between uses of the model")
+    args = parser.parse_args()
+
+    with FakeOllama(
+        request_latency=args.latency, load_latency=args.load_latency, keep_alive=args.keep_alive
+    ) as fake:
+        # Settings are read at import time, so configure before importing app
+        os.environ["OLLAMA_BASE_URL"] = fake.base_url
+        asyncio.run(run(fake, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# Latency of the rerank stage on this machine's CPU, for tuning
+# RERANK_CANDIDATES, RERANK_BATCH_SIZE and RERANK_WORKERS. Scores N
+# chunk-sized passages per query with the configured cross-encoder, cold
+# (every pair scored) and warm (served from the score cache).
+#
+# Needs the ONNX model: a Hugging Face repo (downloaded on first run) or a
+# local directory with tokenizer.json and the ONNX file.
+#
+#   python -m benchmarks.rerank_latency --candidates 10,20,40 --batch-sizes 4,8,16 --workers 1,2
+import argparse
+import itertools
+import random
+import statistics
+import time
+
+from langchain_core.documents import Document
+
+from app.core.config import settings
+from app.services.reranker import CrossEncoderReranker
+
+WORDS = (
+    "agreement party clause term payment notice liability account balance report "
+    "quarter revenue section schedule termination interest rate invoice tax period"
+).split()
+
+
+def passages(rng, count, chars=1000):
+    docs = []
+    for i in range(count):
+        words = []
+        while sum(len(w) + 1 for w in words) < chars:
+            words.append(rng.choice(WORDS))
+        docs.append(Document(id=f"chunk-{i}", page_content=" ".join(words)))
+    return docs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=settings.RERANK_MODEL)
+    parser.add_argument("--onnx-file", default=settings.RERANK_ONNX_FILE)
+    parser.add_argument("--candidates", default="10,20,40")
+    parser.add_argument("--batch-sizes", default="4,8,16")
+    parser.add_argument("--workers", default="1,2")
+    parser.add_argument("--threads", type=int, default=settings.RERANK_THREADS)
+    parser.add_argument("--queries", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    candidates = [int(v) for v in args.candidates.split(",")]
+    docs = passages(rng, max(candidates))
+    queries = [" ".join(rng.sample(WORDS, 4)) for _ in range(args.queries)]
+
+    print(f"{'N':>4} {'batch':>6} {'workers':>8} {'cold p50 ms':>12} {'warm p50 ms':>12}")
+    for batch_size, workers in itertools.product(
+        [int(v) for v in args.batch_sizes.split(",")],
+        [int(v) for v in args.workers.split(",")],
+    ):
+        reranker = CrossEncoderReranker(
+            args.model,
+            onnx_file=args.onnx_file,
+            batch_size=batch_size,
+            workers=workers,
+            threads=args.threads,
+        )
+        reranker.rerank("warm up", docs[:batch_size], k=4)
+        try:
+            for n in candidates:
+                cold, warm = [], []
+                for query in queries:
+                    query = f"{query} {n} {batch_size} {workers}"
+                    start = time.perf_counter()
+                    reranker.rerank(query, docs[:n], k=4)
+                    cold.append(time.perf_counter() - start)
+                    start = time.perf_counter()
+                    reranker.rerank(query, docs[:n], k=4)
+                    warm.append(time.perf_counter() - start)
+                print(
+                    f"{n:>4} {batch_size:>6} {workers:>8}"
+                    f" {statistics.median(cold) * 1000:>12.1f} {statistics.median(warm) * 1000:>12.3f}"
+                )
+        finally:
+            reranker.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# Latency of scoped retrieval as the store grows. A "big" tenant grows to each
+# of --sizes chunks (documents of 100 chunks each) next to a "small" tenant
+# of 1000 chunks. Reports similarity_search latency for:
+#
+#   tenant          the big tenant, unscoped
+#   1 doc           one document of the big tenant (exact scan of its chunks)
+#   N docs          enough documents to pass SCOPED_EXACT_SEARCH_MAX_CHUNKS
+#                   (metadata filter pushed down into the Chroma query)
+#   small tenant    the other tenant, unscoped
+#
+# Vectors are random and written straight to the store; the query goes
+# through a local fake Ollama server once and is then served from the
+# embedding cache, so only retrieval is timed.
+#
+#   python -m benchmarks.scoped_retrieval --sizes 10000,50000,100000
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.fake_ollama import FakeOllama
+
+DIM = 64
+CHUNKS_PER_DOC = 100
+
+
+def add_documents(vector_store, registry, rng, tenant, start, count):
+    from langchain_core.documents import Document
+
+    for d in range(start, start + count):
+        source = f"{tenant}-{d}.pdf"
+        doc_id = registry.doc_id_for(source, tenant)
+        words = rng.integers(0, 5000, size=(CHUNKS_PER_DOC, 30))
+        docs = [
+            Document(
+                id=f"{doc_id}-{i}",
+                page_content=" ".join(f"w{w}" for w in words[i]),
+                metadata={"source": source, "page": i + 1, "doc_id": doc_id}
+            )
+            for i in range(CHUNKS_PER_DOC)
+        ]
+        vectors = rng.normal(size=(CHUNKS_PER_DOC, DIM)).astype(np.float32)
+        vector_store._write(docs, vectors.tolist(), tenant)
+        registry.save(doc_id, source, "hash", [doc.id for doc in docs], tenant=tenant)
+
+
+def measure(vector_store, queries, **scope):
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        vector_store.similarity_search(query, k=4, **scope)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def run(args):
+    from app.core.config import settings
+    from app.services.document_registry import document_registry
+    from app.services.vector_store import get_vector_store
+
+    vector_store = get_vector_store()
+
+    rng = np.random.default_rng(0)
+    queries = [f"w{i} w{i + 1} w{i + 2}" for i in range(args.queries)]
+    for query in queries:
+        vector_store.embeddings.embed_query(query)
+
+    add_documents(vector_store, document_registry, rng, "small", 0, 1000 // CHUNKS_PER_DOC)
+    many = settings.SCOPED_EXACT_SEARCH_MAX_CHUNKS // CHUNKS_PER_DOC + 1
+
+    print(f"{'chunks':>8} {'tenant':>9} {'1 doc':>9} {f'{many} docs':>9} {'small':>9}   p50 ms")
+    docs = 0
+    for size in args.sizes:
+        target = size // CHUNKS_PER_DOC
+        add_documents(vector_store, document_registry, rng, "big", docs, target - docs)
+        docs = target
+
+        doc_ids = [document_registry.doc_id_for(f"big-{d}.pdf", "big") for d in range(many)]
+        # First query after a write reopens the collection and syncs BM25
+        vector_store.similarity_search(queries[0], tenant="big")
+        vector_store.similarity_search(queries[0], tenant="small")
+        print(
+            f"{size:>8}"
+            f" {measure(vector_store, queries, tenant='big'):>9.2f}"
+            f" {measure(vector_store, queries, tenant='big', doc_ids=doc_ids[:1]):>9.2f}"
+            f" {measure(vector_store, queries, tenant='big', doc_ids=doc_ids):>9.2f}"
+            f" {measure(vector_store, queries, tenant='small'):>9.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,50000,100000")
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+    args.sizes = [int(v) for v in args.sizes.split(",")]
+
+    with FakeOllama(embed_dim=DIM) as fake, tempfile.TemporaryDirectory() as data_dir:
+        # Settings are read at import time, so configure before importing app
+        os.environ["OLLAMA_BASE_URL"] = fake.base_url
+        os.environ["CHROMA_PERSIST_DIRECTORY"] = os.path.join(data_dir, "chroma")
+        os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(data_dir, "embeddings.sqlite3")
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# Cold start of the API: every run is a fresh process, against a local fake
+# Ollama whose first request for each model waits --load-latency, like a real
+# server loading the model into memory. Reported per run:
+#
+#   import s       importing app.main
+#   ready s        process start until uvicorn accepts connections
+#   health ms      the first /api/health
+#   warm-up s      startup until the background warm-up finished (warm-up only)
+#   1st ttft ms    time-to-first-token of the first /api/chat
+#   1st total ms   the whole first answer
+#   2nd ttft ms    the next /api/chat, for comparison
+#
+# "lazy" starts with WARMUP_ENABLED=false, so the first chat loads LangChain,
+# the vector store, the chain and both models; "warm-up" waits for the
+# warm-up before chatting.
+#
+#   python -m benchmarks.startup --runs 3 --load-latency 2
+import argparse
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.fake_ollama import FakeOllama
+
+MODES = (("lazy", False), ("warm-up", True))
+
+
+def chat(client):
+    start = time.perf_counter()
+    first = None
+    body = {"message": "What does the report say?", "session_id": "startup"}
+    with client.stream("POST", "/api/chat", json=body) as response:
+        for line in response.iter_lines():
+            if first is None and '"token"' in line:
+                first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+def measure(base_url, data_dir, port, warmup, results):
+    # Runs in a fresh process, so nothing is imported or opened yet
+    start = time.perf_counter()
+    # Settings are read at import time, so configure before importing app
+    os.environ["OLLAMA_BASE_URL"] = base_url
+    os.environ["CHAT_MODEL"] = "fake-chat:latest"
+    os.environ["EMBEDDING_MODEL"] = "fake-embed:latest"
+    os.environ["WARMUP_ENABLED"] = "true" if warmup else "false"
+    os.environ["ANSWER_CACHE_ENABLED"] = "false"
+    os.chdir(data_dir)
+    import httpx
+
+    from app.main import app
+    results["import_s"] = time.perf_counter() - start
+
+    from benchmarks.chat_under_ingest import serve
+    server, thread = serve(app, port)
+    results["ready_s"] = time.perf_counter() - start
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=600) as client:
+            health_start = time.perf_counter()
+            client.get("/api/health").raise_for_status()
+            results["health_ms"] = (time.perf_counter() - health_start) * 1000
+
+            if warmup:
+                while True:
+                    status = client.get("/api/health").json()["warmup"]
+                    if status and "running" not in status.values():
+                        break
+                    time.sleep(0.02)
+                results["warmup_s"] = time.perf_counter() - start
+                results["warmup_ok"] = all(value == "ok" for value in status.values())
+
+            results["first_ttft_ms"], results["first_total_ms"] = (v * 1000 for v in chat(client))
+            results["second_ttft_ms"] = chat(client)[0] * 1000
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--load-latency", type=float, default=2.0, help="fake Ollama: seconds to load a model")
+    parser.add_argument("--port", type=int, default=8767)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    print(f"{'':<8} {'import s':>9} {'ready s':>8} {'health ms':>10} {'warm-up s':>10}"
+          f" {'1st ttft ms':>12} {'1st total ms':>13} {'2nd ttft ms':>12}")
+    for label, warmup in MODES:
+        runs = []
+        for _ in range(args.runs):
+            # A new fake Ollama per run, so the models start unloaded
+            with FakeOllama(embed_dim=64, load_latency=args.load_latency) as fake, \
+                    tempfile.TemporaryDirectory() as data_dir, context.Manager() as manager:
+                results = manager.dict()
+                process = context.Process(target=measure, args=(fake.base_url, data_dir, args.port, warmup, results))
+                process.start()
+                process.join()
+                runs.append(dict(results))
+            if warmup and not runs[-1].get("warmup_ok"):
+                print(f"warning: a warm-up step failed in run {len(runs)}")
+
+        median = lambda key: statistics.median(run[key] for run in runs) if key in runs[0] else float("nan")
+        print(
+            f"{label:<8} {median('import_s'):>9.2f} {median('ready_s'):>8.2f} {median('health_ms'):>10.1f}"
+            f" {median('warmup_s'):>10.2f} {median('first_ttft_ms'):>12.0f} {median('first_total_ms'):>13.0f}"
+            f" {median('second_ttft_ms'):>12.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+# Offline benchmark suite: the whole API, in this process, against a local
+# fake Ollama server (/api/embed, /api/chat, /api/tags) with a fixed latency
+# and token rate, so runs on the same machine are comparable. Measures:
+#
+#   ingest   generated PDFs of --pdf-pages pages uploaded to /api/ingest and
+#            followed on /api/jobs/{id}/events until indexed (pages/s, chunks/s)
+#   chat     /api/chat with --sessions sessions asking at once, several turns
+#            each (time-to-first-token and full answer, p50/p99)
+#   vector   similarity_search as a tenant grows to --corpus-sizes chunks of
+#            random vectors (p50/p99); queries are embedded once up front, so
+#            only retrieval is timed
+#
+# Results are written as JSON to --output; --compare prints the change of
+# every metric against an earlier results file.
+#
+#   python -m benchmarks.suite --output results.json
+#   python -m benchmarks.suite --only chat --compare results.json
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks.chat_under_ingest import make_pdf, serve
+from benchmarks.fake_ollama import FakeOllama
+
+SECTIONS = ("ingest", "chat", "vector")
+DIM = 64
+CHUNKS_PER_DOC = 100
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    p = lambda q: samples[min(len(samples) - 1, int(len(samples) * q))]
+    return {
+        "p50_ms": round(statistics.median(samples) * 1000, 3),
+        "p99_ms": round(p(0.99) * 1000, 3),
+        "samples": len(samples),
+    }
+
+
+async def ingest_pdf(client, pages, tag):
+    files = [("files", (f"{tag}.pdf", make_pdf(pages, tag), "application/pdf"))]
+    start = time.perf_counter()
+    response = await client.post("/api/ingest", files=files)
+    response.raise_for_status()
+    job_id = response.json()["job_ids"][0]
+    job = None
+    async with client.stream("GET", f"/api/jobs/{job_id}/events") as events:
+        async for line in events.aiter_lines():
+            if line:
+                job = json.loads(line)
+    seconds = time.perf_counter() - start
+    if job is None or job["status"] != "completed":
+        raise RuntimeError(f"Ingesting {tag}.pdf failed: {job}")
+    return seconds, job
+
+
+async def bench_ingest(client, args):
+    # The first job also pays for the worker importing the app
+    await ingest_pdf(client, 2, "warmup")
+    results = []
+    print(f"{'pages':>6} {'seconds':>9} {'pages/s':>9} {'chunks':>7} {'chunks/s':>9}")
+    for pages in args.pdf_pages:
+        seconds, job = await ingest_pdf(client, pages, f"report-{pages}")
+        chunks = job["result"]["added"]
+        results.append({
+            "pages": pages,
+            "seconds": round(seconds, 3),
+            "pages_per_second": round(pages / seconds, 2),
+            "chunks": chunks,
+            "chunks_per_second": round(chunks / seconds, 2),
+        })
+        print(f"{pages:>6} {seconds:>9.2f} {pages / seconds:>9.1f} {chunks:>7} {chunks / seconds:>9.1f}")
+    return results
+
+
+async def chat_session(client, session_id, turns, ttft, total):
+    for turn in range(turns):
+        body = {"message": f"What does the report say about item {turn}?", "session_id": session_id}
+        start = time.perf_counter()
+        first = None
+        async with client.stream("POST", "/api/chat", json=body) as response:
+            async for line in response.aiter_lines():
+                if first is None and '"token"' in line:
+                    first = time.perf_counter() - start
+        if first is not None:
+            ttft.append(first)
+            total.append(time.perf_counter() - start)
+
+
+async def bench_chat(client, args):
+    results = []
+    print(f"{'sessions':>8} {'ttft p50':>9} {'ttft p99':>9} {'total p50':>10} {'total p99':>10}")
+    for sessions in args.sessions:
+        ttft, total = [], []
+        await asyncio.gather(*(
+            chat_session(client, f"bench-{sessions}-{n}", args.turns, ttft, total) for n in range(sessions)
+        ))
+        result = {"sessions": sessions, "ttft": percentiles(ttft), "total": percentiles(total)}
+        results.append(result)
+        print(
+            f"{sessions:>8} {result['ttft']['p50_ms']:>9.0f} {result['ttft']['p99_ms']:>9.0f}"
+            f" {result['total']['p50_ms']:>10.0f} {result['total']['p99_ms']:>10.0f}"
+        )
+    return results
+
+
+def bench_vector(args):
+    from langchain_core.documents import Document
+    from app.services.document_registry import document_registry
+    from app.services.vector_store import get_vector_store
+
+    vector_store = get_vector_store()
+    tenant = "bench-vector"
+    rng = np.random.default_rng(0)
+    queries = [f"w{i} w{i + 1} w{i + 2}" for i in range(args.queries)]
+    for query in queries:
+        vector_store.embeddings.embed_query(query)
+
+    results = []
+    print(f"{'chunks':>8} {'p50 ms':>9} {'p99 ms':>9}")
+    docs = 0
+    for size in args.corpus_sizes:
+        target = size // CHUNKS_PER_DOC
+        for d in range(docs, target):
+            source = f"corpus-{d}.pdf"
+            doc_id = document_registry.doc_id_for(source, tenant)
+            words = rng.integers(0, 5000, size=(CHUNKS_PER_DOC, 30))
+            chunks = [
+                Document(
+                    id=f"{doc_id}-{i}",
+                    page_content=" ".join(f"w{w}" for w in words[i]),
+                    metadata={"source": source, "page": i + 1, "doc_id": doc_id},
+                )
+                for i in range(CHUNKS_PER_DOC)
+            ]
+            vectors = rng.normal(size=(CHUNKS_PER_DOC, DIM)).astype(np.float32)
+            vector_store._write(chunks, vectors.tolist(), tenant)
+            document_registry.save(doc_id, source, "hash", [chunk.id for chunk in chunks], tenant=tenant)
+        docs = target
+
+        # First query after a write reopens the collection and syncs BM25
+        vector_store.similarity_search(queries[0], tenant=tenant)
+        samples = []
+        for query in queries:
+            start = time.perf_counter()
+            vector_store.similarity_search(query, k=4, tenant=tenant)
+            samples.append(time.perf_counter() - start)
+        result = {"chunks": size, **percentiles(samples)}
+        results.append(result)
+        print(f"{size:>8} {result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f}")
+    return results
+
+
+async def bench_api(base_url, args, results):
+    import httpx
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=600) as client:
+        if "ingest" in args.only:
+            print("\n# ingest")
+            results["ingest"] = await bench_ingest(client, args)
+        if "chat" in args.only:
+            if "ingest" not in args.only:
+                # Something for chat to retrieve
+                await ingest_pdf(client, 20, "indexed")
+            print("\n# chat")
+            results["chat"] = await bench_chat(client, args)
+
+
+def metadata(args):
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "started": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "args": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+    }
+
+
+def flatten(results):
+    # {"chat.sessions=4.ttft.p99_ms": 123.4, ...}: one key per number that
+    # should stay comparable between runs
+    flat = {}
+    keys = {"ingest": "pages", "chat": "sessions", "vector": "chunks"}
+    for section, rows in results.items():
+        for row in rows:
+            prefix = f"{section}.{keys[section]}={row[keys[section]]}"
+            for name, value in row.items():
+                if isinstance(value, dict):
+                    for inner, number in value.items():
+                        if inner != "samples":
+                            flat[f"{prefix}.{name}.{inner}"] = number
+                elif name not in (keys[section], "samples"):
+                    flat[f"{prefix}.{name}"] = value
+    return flat
+
+
+def compare(results, path):
+    with open(path) as f:
+        baseline = json.load(f)
+    before, after = flatten(baseline["results"]), flatten(results)
+    print(f"\n# compared with {path} (commit {baseline['meta'].get('commit')})")
+    print(f"{'metric':<44} {'before':>10} {'after':>10} {'change':>8}")
+    for key in sorted(after.keys() & before.keys()):
+        old, new = before[key], after[key]
+        change = f"{(new - old) / old * 100:+.1f}%" if old else ""
+        print(f"{key:<44} {old:>10} {new:>10} {change:>8}")
+
+
+def run(args, fake):
+    from app.main import app
+
+    results = {}
+    if "ingest" in args.only or "chat" in args.only:
+        server, thread = serve(app, args.port)
+        try:
+            asyncio.run(bench_api(f"http://127.0.0.1:{args.port}", args, results))
+        finally:
+            server.should_exit = True
+            thread.join()
+    if "vector" in args.only:
+        print("\n# vector")
+        results["vector"] = bench_vector(args)
+
+    meta = metadata(args)
+    meta["ollama_requests"] = fake.requests
+    with open(args.output, "w") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+    print(f"\nResults written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--only", default=",".join(SECTIONS), help="sections to run, of " + ", ".join(SECTIONS))
+    parser.add_argument("--pdf-pages", default="10,50,200", help="pages of each PDF ingested")
+    parser.add_argument("--sessions", default="1,4,8", help="concurrent chat sessions")
+    parser.add_argument("--turns", type=int, default=5, help="questions asked per chat session")
+    parser.add_argument("--corpus-sizes", default="1000,10000,50000", help="chunks in the store")
+    parser.add_argument("--queries", type=int, default=50, help="queries per corpus size")
+    parser.add_argument("--latency", type=float, default=0.02, help="fake Ollama: seconds per request")
+    parser.add_argument("--first-token-latency", type=float, default=0.05, help="fake Ollama: seconds to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="fake Ollama: chat token rate")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+    args.only = [name.strip() for name in args.only.split(",") if name.strip()]
+    unknown = set(args.only) - set(SECTIONS)
+    if unknown:
+        parser.error(f"unknown sections: {', '.join(sorted(unknown))}")
+    args.pdf_pages = [int(v) for v in args.pdf_pages.split(",")]
+    args.sessions = [int(v) for v in args.sessions.split(",")]
+    args.corpus_sizes = [int(v) for v in args.corpus_sizes.split(",")]
+    # The run happens in a temporary directory
+    args.output = os.path.abspath(args.output)
+    args.compare = os.path.abspath(args.compare) if args.compare else None
+
+    with FakeOllama(
+        embed_dim=DIM,
+        request_latency=args.latency,
+        first_token_latency=args.first_token_latency,
+        tokens_per_second=args.tokens_per_second,
+        reply=" ".join(["The report covers revenue, costs and the balance for the quarter."] * 4),
+    ) as fake, tempfile.TemporaryDirectory() as data_dir:
+        # Settings are read at import time, so configure before importing
+        # app; relative paths (caches, uploads, the job queue) land in data_dir
+        os.environ["OLLAMA_BASE_URL"] = fake.base_url
+        os.environ["CHROMA_PERSIST_DIRECTORY"] = os.path.join(data_dir, "chroma")
+        os.environ["JOB_WORKERS"] = "1"
+        # Workers and /events poll the job queue; keep that out of the timings
+        os.environ["JOB_POLL_INTERVAL"] = "0.02"
+        os.environ["SUMMARY_ENABLED"] = "false"
+        os.environ["ANSWER_CACHE_ENABLED"] = "false"
+        os.chdir(data_dir)
+        run(args, fake)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# Chroma against the memory-mapped IVF backend (int8 and float16) at each of
+# --sizes chunks. Embeddings are synthetic but clustered, like real ones:
+# unit vectors scattered around --clusters centres. For every backend and
+# size the store is written once, then reopened in a fresh process, which
+# reports:
+#
+#   open ms     constructing the backend and answering the first query
+#   RSS MB      resident memory of that process after the queries
+#   p50/p99 ms  one query at a time
+#   batch q/s   --batch queries per call
+#   par q/s     single queries from --threads threads at once
+#   recall@10   overlap with the exact float32 top 10
+#
+#   python -m benchmarks.vector_backends --sizes 20000,100000 --dim 384
+import argparse
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+BACKENDS = (("chroma", "chroma", None), ("mmap int8", "mmap", "int8"), ("mmap float16", "mmap", "float16"))
+K = 10
+
+
+def make_vectors(rng, count, centres, spread=0.35):
+    vectors = centres[rng.integers(0, len(centres), count)] + spread * rng.normal(size=(count, centres.shape[1]))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def exact_top_k(vectors, queries):
+    norms = np.einsum("ij,ij->i", vectors, vectors)
+    return np.stack([np.argsort(norms - 2 * (vectors @ q))[:K] for q in queries])
+
+
+def configure(data_dir, backend, dtype):
+    # Settings are read at import time, so configure before importing app
+    os.environ["VECTOR_BACKEND"] = backend
+    os.environ["CHROMA_PERSIST_DIRECTORY"] = os.path.join(data_dir, "chroma")
+    os.environ["VECTOR_INDEX_DIRECTORY"] = os.path.join(data_dir, "vector_index")
+    if dtype:
+        os.environ["VECTOR_INDEX_DTYPE"] = dtype
+
+
+def write(data_dir, backend, dtype, vectors, batch=5000):
+    configure(data_dir, backend, dtype)
+    from app.services.vector_backends import get_vector_backend
+
+    store = get_vector_backend()
+    for start in range(0, len(vectors), batch):
+        end = min(len(vectors), start + batch)
+        store.upsert(
+            "default",
+            [f"c{i}" for i in range(start, end)],
+            vectors[start:end].tolist() if backend == "chroma" else vectors[start:end],
+            [f"chunk {i}" for i in range(start, end)],
+            [{"doc_id": f"d{i // 100}", "page": i % 100} for i in range(start, end)],
+        )
+
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def measure(data_dir, backend, dtype, queries_path, truth_path, args, results):
+    # Runs in a fresh process, so memory and open time start from nothing
+    configure(data_dir, backend, dtype)
+    queries, truth = np.load(queries_path), np.load(truth_path)
+
+    start = time.perf_counter()
+    from app.services.vector_backends import get_vector_backend
+    store = get_vector_backend()
+    store.query("default", queries[:1], K)
+    open_ms = (time.perf_counter() - start) * 1000
+
+    samples, found = [], []
+    for query in queries:
+        start = time.perf_counter()
+        docs = store.query("default", [query], K)[0]
+        samples.append(time.perf_counter() - start)
+        found.append({int(doc.id[1:]) for doc in docs})
+    recall = statistics.mean(len(f & set(t.tolist())) / K for f, t in zip(found, truth))
+    samples.sort()
+
+    start = time.perf_counter()
+    for i in range(0, len(queries), args.batch):
+        store.query("default", queries[i:i + args.batch], K)
+    batch_qps = len(queries) / (time.perf_counter() - start)
+
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        start = time.perf_counter()
+        list(pool.map(lambda q: store.query("default", [q], K), queries))
+        parallel_qps = len(queries) / (time.perf_counter() - start)
+
+    results.update(
+        open_ms=open_ms, rss_mb=rss_mb(), recall=recall, batch_qps=batch_qps, parallel_qps=parallel_qps,
+        p50_ms=statistics.median(samples) * 1000,
+        p99_ms=samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000,
+    )
+
+
+def disk_mb(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names
+    ) / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="20000,100000")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centres = rng.normal(size=(args.clusters, args.dim))
+    context = multiprocessing.get_context("spawn")
+    print(f"{'':<13} {'chunks':>8} {'write s':>8} {'disk MB':>8} {'open ms':>8} {'RSS MB':>7}"
+          f" {'p50 ms':>7} {'p99 ms':>7} {'batch q/s':>10} {'par q/s':>8} {'recall@10':>10}")
+    for size in (int(v) for v in args.sizes.split(",")):
+        vectors = make_vectors(rng, size, centres)
+        queries = make_vectors(rng, args.queries, centres)
+        truth = exact_top_k(vectors, queries)
+        for label, backend, dtype in BACKENDS:
+            with tempfile.TemporaryDirectory() as data_dir:
+                queries_path, truth_path = os.path.join(data_dir, "q.npy"), os.path.join(data_dir, "t.npy")
+                np.save(queries_path, queries)
+                np.save(truth_path, truth)
+
+                # Each write in its own process too: Chroma keeps its clients
+                # per process, and the measuring process shouldn't inherit them
+                start = time.perf_counter()
+                writer = context.Process(target=write, args=(data_dir, backend, dtype, vectors))
+                writer.start()
+                writer.join()
+                write_seconds = time.perf_counter() - start
+
+                with context.Manager() as manager:
+                    results = manager.dict()
+                    reader = context.Process(
+                        target=measure, args=(data_dir, backend, dtype, queries_path, truth_path, args, results)
+                    )
+                    reader.start()
+                    reader.join()
+                    r = dict(results)
+                print(
+                    f"{label:<13} {size:>8} {write_seconds:>8.1f} {disk_mb(data_dir):>8.0f} {r['open_ms']:>8.0f}"
+                    f" {r['rss_mb']:>7.0f} {r['p50_ms']:>7.2f} {r['p99_ms']:>7.2f} {r['batch_qps']:>10.0f}"
+                    f" {r['parallel_qps']:>8.0f} {r['recall']:>10.3f}"
+                )
+
+
+if __name__ == "__main__":
+    main()